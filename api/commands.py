@@ -13,6 +13,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from configs import dify_config
 from constants.languages import languages
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.plugin.entities.plugin import ToolProviderID
 from core.rag.datasource.vdb.vector_factory import Vector
 from core.rag.datasource.vdb.vector_type import VectorType
@@ -140,6 +141,7 @@ def reset_encrypt_key_pair():
         db.session.query(Provider).where(Provider.provider_type == "custom", Provider.tenant_id == tenant.id).delete()
         db.session.query(ProviderModel).where(ProviderModel.tenant_id == tenant.id).delete()
         db.session.commit()
+        ProviderConfigurationsCache.invalidate([tenant.id])
 
         click.echo(
             click.style(
@@ -1268,3 +1270,66 @@ def _run_alembic_command_extend(command, *args):
             cmd_func(alembic_cfg, *args)
         else:
             cmd_func(alembic_cfg)
+
+
+@click.command("keyword-store-migrate", help="将 jieba 关键词表迁移到关键词倒排索引（二开）")
+def keyword_store_migrate():
+    """
+    把每个数据集的 JSON 关键词表写入 DatasetKeywordPostingExtend，
+    迁移完成后将 KEYWORD_STORE 设置为 jieba_inverted_index。可重复执行。
+    """
+    from core.rag.datasource.keyword.jieba.jieba_inverted_index_extend import JiebaInvertedIndexExtend
+    from models.dataset import DatasetKeywordTable
+
+    click.echo(click.style("Starting keyword store migration.", fg="green"))
+    migrated_count = 0
+    last_id = None
+    while True:
+        stmt = select(DatasetKeywordTable).order_by(DatasetKeywordTable.id).limit(50)
+        if last_id:
+            stmt = stmt.where(DatasetKeywordTable.id > last_id)
+        keyword_tables = db.session.scalars(stmt).all()
+        if not keyword_tables:
+            break
+        for keyword_table in keyword_tables:
+            last_id = keyword_table.id
+            try:
+                dataset = db.session.get(Dataset, keyword_table.dataset_id)
+                keyword_table_dict = keyword_table.keyword_table_dict
+                if not dataset or not keyword_table_dict:
+                    continue
+                JiebaInvertedIndexExtend(dataset).add_keyword_table(keyword_table_dict["__data__"]["table"])
+                migrated_count += 1
+                click.echo(f"Migrated keyword table of dataset {dataset.id}.")
+            except Exception as e:
+                db.session.rollback()
+                click.echo(
+                    click.style(
+                        f"Failed to migrate keyword table of dataset {keyword_table.dataset_id}: {e}", fg="red"
+                    )
+                )
+    click.echo(click.style(f"Keyword store migration completed, {migrated_count} datasets migrated.", fg="green"))
+
+
+@click.command("sync-all-models-extend", help="把全量同步的模型同步到工作区（二开）")
+@click.option("--tenant-id", "tenant_ids", multiple=True, help="工作区id，可多次指定，默认同步到所有正常状态的工作区")
+@click.option("--job-id", help="只查询该同步任务的进度")
+def sync_all_models_extend(tenant_ids: tuple[str, ...], job_id: Optional[str]):
+    """
+    派发模型同步任务，由 extend_low 队列的 Celery worker 执行，再用 --job-id 查询进度。
+    """
+    from services.model_service_extend import ModelExtendService
+
+    if job_id:
+        progress = ModelExtendService.get_sync_progress(job_id)
+        if progress is None:
+            click.echo(click.style(f"Model sync job {job_id} not found.", fg="red"))
+            return
+        click.echo(
+            f"Model sync job {job_id} {progress['status']}: "
+            f"{progress['synced']} synced, {progress['failed']} failed, {progress['total']} workspaces in total."
+        )
+        return
+
+    job_id = ModelExtendService.dispatch_sync_all_models(list(tenant_ids) or None)
+    click.echo(click.style(f"Model sync job {job_id} started.", fg="green"))
@@ -1,7 +1,7 @@
 import decimal
 from typing import Optional
 
-from pydantic import Field
+from pydantic import Field, PositiveInt
 from pydantic_settings import BaseSettings
 
 
@@ -52,6 +52,91 @@ class ExtendInfo(BaseSettings):
         default="15",
     )
 
+    BILLING_LEDGER_EXTEND_ENABLED: bool = Field(
+        description="是否启用计费流水模式：费用先写入Redis Stream，由定时任务批量聚合到额度表",
+        default=True,
+    )
+
+    BILLING_LEDGER_EXTEND_FLUSH_INTERVAL: PositiveInt = Field(
+        description="计费流水聚合间隔（秒）",
+        default=10,
+    )
+
+    BILLING_LEDGER_EXTEND_BATCH_SIZE: PositiveInt = Field(
+        description="计费流水每批聚合的最大条数",
+        default=1000,
+    )
+
+    BILLING_LEDGER_EXTEND_MAX_BATCHES_PER_FLUSH: PositiveInt = Field(
+        description="计费流水每次聚合最多处理的批次数",
+        default=100,
+    )
+
+    BILLING_LEDGER_EXTEND_FLUSH_LOCK_TIMEOUT: PositiveInt = Field(
+        description="计费流水聚合锁超时时间（秒）",
+        default=300,
+    )
+
+    PAYER_RESOLUTION_CACHE_MAX_SIZE: PositiveInt = Field(
+        description="付费账号解析缓存的最大条目数",
+        default=100000,
+    )
+
+    PAYER_RESOLUTION_CACHE_TTL: PositiveInt = Field(
+        description="付费账号解析缓存的过期时间（秒）",
+        default=600,
+    )
+
+    QUOTA_ROLLOVER_EXTEND_CHUNK_SIZE: PositiveInt = Field(
+        description="额度快照 / 重置任务每个事务处理的行数",
+        default=5000,
+    )
+
+    QUOTA_ROLLOVER_EXTEND_LOCK_TIMEOUT: PositiveInt = Field(
+        description="额度快照 / 重置任务锁超时时间（秒）",
+        default=3600,
+    )
+
+    QUOTA_ADMISSION_EXTEND_BALANCE_TTL: PositiveInt = Field(
+        description="额度准入缓存余额的过期时间（秒），到期后从数据库重新加载",
+        default=60,
+    )
+
+    QUOTA_ADMISSION_EXTEND_RESERVATION: decimal.Decimal = Field(
+        description="额度准入时每次调用预占的金额（美元），为0时不预占",
+        default=decimal.Decimal("0.02"),
+    )
+
+    QUOTA_ADMISSION_EXTEND_RESERVATION_TTL: PositiveInt = Field(
+        description="额度预占的最长保留时间（秒）",
+        default=600,
+    )
+
+    APP_USAGE_EXTEND_FLUSH_INTERVAL: PositiveInt = Field(
+        description="应用使用次数从Redis合并写入数据库的间隔（秒）",
+        default=60,
+    )
+
+    APP_USAGE_EXTEND_FLUSH_LOCK_TIMEOUT: PositiveInt = Field(
+        description="应用使用次数合并写入锁超时时间（秒）",
+        default=300,
+    )
+
+    MODEL_SYNC_EXTEND_TASK_CHUNK_SIZE: PositiveInt = Field(
+        description="模型同步到工作区时，每个异步任务处理的工作区数",
+        default=200,
+    )
+
+    MODEL_SYNC_EXTEND_BATCH_SIZE: PositiveInt = Field(
+        description="模型同步到工作区时，每个事务处理的工作区数",
+        default=50,
+    )
+
+    MODEL_SYNC_EXTEND_PROGRESS_TTL: PositiveInt = Field(
+        description="模型同步任务进度在Redis中的保留时间（秒）",
+        default=86400,
+    )
+
     DEFAULT_LANGUAGE: Optional[str] = Field(
         description="默认语言",
         default="zh-Hans",
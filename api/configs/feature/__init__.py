@@ -74,6 +74,18 @@ class AppExecutionConfig(BaseSettings):
         description="Maximum number of requests per app per day",
         default=5000,
     )
+    STREAM_CHUNK_COALESCING_ENABLED: bool = Field(
+        description="Merge consecutive text deltas of streaming responses into fewer SSE events",
+        default=False,
+    )
+    STREAM_CHUNK_COALESCING_WINDOW_MS: NonNegativeInt = Field(
+        description="Maximum time in milliseconds text deltas are buffered before they are sent when coalescing",
+        default=20,
+    )
+    STREAM_CHUNK_COALESCING_MAX_BYTES: PositiveInt = Field(
+        description="Maximum size in bytes of buffered text deltas before they are sent when coalescing",
+        default=256,
+    )
 
 
 class CodeExecutionSandboxConfig(BaseSettings):
@@ -106,6 +118,32 @@ class CodeExecutionSandboxConfig(BaseSettings):
         default=10.0,
     )
 
+    CODE_EXECUTION_JINJA2_ENGINE: Literal["local", "sandbox"] = Field(
+        description="Engine that renders Jinja2 templates, 'sandbox' sends them to the code execution service,"
+        " 'local' renders them in local child processes limited in CPU time and memory",
+        default="sandbox",
+    )
+
+    CODE_EXECUTION_JINJA2_LOCAL_CPU_TIME_LIMIT: PositiveFloat = Field(
+        description="Maximum CPU time in seconds for rendering a Jinja2 template with the local engine",
+        default=1.0,
+    )
+
+    CODE_EXECUTION_JINJA2_LOCAL_MAX_OUTPUT_LENGTH: PositiveInt = Field(
+        description="Maximum length in characters of a Jinja2 template rendered with the local engine",
+        default=1_000_000,
+    )
+
+    CODE_EXECUTION_JINJA2_LOCAL_MAX_MEMORY: PositiveInt = Field(
+        description="Maximum memory in MB a local Jinja2 render process may allocate on top of its own",
+        default=256,
+    )
+
+    CODE_EXECUTION_JINJA2_LOCAL_PROCESSES: PositiveInt = Field(
+        description="Maximum number of local Jinja2 render processes per API process",
+        default=4,
+    )
+
     CODE_MAX_NUMBER: PositiveInt = Field(
         description="Maximum allowed numeric value in code execution",
         default=9223372036854775807,
@@ -162,6 +200,36 @@ class PluginConfig(BaseSettings):
         default="plugin-api-key",
     )
 
+    PLUGIN_DAEMON_POOL_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of keep-alive connections to the plugin daemon",
+        default=100,
+    )
+
+    PLUGIN_DAEMON_UNIX_SOCKET: Optional[str] = Field(
+        description="Path of a unix socket to reach a co-located plugin daemon through, instead of TCP",
+        default=None,
+    )
+
+    PLUGIN_MODEL_CACHE_ENABLED: bool = Field(
+        description="Cache plugin model providers and model schemas across requests, in process and in Redis",
+        default=True,
+    )
+
+    PLUGIN_MODEL_CACHE_TTL: PositiveInt = Field(
+        description="Seconds a cached plugin model provider or model schema is served without refreshing it",
+        default=300,
+    )
+
+    PLUGIN_MODEL_CACHE_STALE_TTL: NonNegativeInt = Field(
+        description="Seconds after the TTL a cached entry is still served while it is refreshed in the background",
+        default=600,
+    )
+
+    PLUGIN_MODEL_CACHE_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of plugin model providers lists and model schemas cached per process",
+        default=4096,
+    )
+
     INNER_API_KEY_FOR_PLUGIN: str = Field(description="Inner api key for plugin", default="inner-api-key")
 
     PLUGIN_REMOTE_INSTALL_HOST: str = Field(
@@ -397,6 +465,26 @@ class HttpConfig(BaseSettings):
         default=5,
     )
 
+    SSRF_POOL_MAX_CONNECTIONS: PositiveInt = Field(
+        description="Maximum number of concurrent connections of each pooled client for network requests (SSRF)",
+        default=100,
+    )
+
+    SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS: NonNegativeInt = Field(
+        description="Maximum number of idle keep-alive connections of each pooled client for network requests (SSRF)",
+        default=20,
+    )
+
+    SSRF_POOL_KEEPALIVE_EXPIRY: PositiveFloat = Field(
+        description="Time in seconds idle keep-alive connections are kept for network requests (SSRF)",
+        default=5.0,
+    )
+
+    SSRF_POOL_HTTP2_ENABLED: bool = Field(
+        description="Enable HTTP/2 for network requests (SSRF), requires the h2 package",
+        default=False,
+    )
+
     RESPECT_XFORWARD_HEADERS_ENABLED: bool = Field(
         description="Enable handling of X-Forwarded-For, X-Forwarded-Proto, and X-Forwarded-Port headers"
         " when the app is behind a single trusted reverse proxy.",
@@ -476,6 +564,39 @@ class ModelLoadBalanceConfig(BaseSettings):
         default=False,
     )
 
+    LOCAL_TOKEN_COUNTING_FALLBACK_ENABLED: bool = Field(
+        description="Estimate tokens with the local GPT-2 tokenizer when plugin based token counting is disabled,"
+        " so that conversation memory can still be pruned by max token limit.",
+        default=False,
+    )
+
+    PROVIDER_CONFIGURATIONS_CACHE_ENABLED: bool = Field(
+        description="Cache the model provider configurations of each workspace per process,"
+        " until a provider or credential row of the workspace changes",
+        default=True,
+    )
+
+    PROVIDER_CONFIGURATIONS_CACHE_TTL: PositiveInt = Field(
+        description="Seconds the cached model provider configurations of a workspace are used at most",
+        default=120,
+    )
+
+    PROVIDER_CONFIGURATIONS_CACHE_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of workspaces whose model provider configurations are cached per process",
+        default=1024,
+    )
+
+    MODEL_LB_LOCAL_SCHEDULER_ENABLED: bool = Field(
+        description="Pick load balancing configs with a round-robin index kept per process and cooldowns broadcast"
+        " through Redis pub/sub, instead of reading Redis for every model invocation",
+        default=True,
+    )
+
+    MODEL_LB_LOCAL_SCHEDULER_MAX_SIZE: PositiveInt = Field(
+        description="Maximum number of load balanced models and cooldowns tracked per process",
+        default=10000,
+    )
+
 
 class BillingConfig(BaseSettings):
     """
@@ -540,6 +661,23 @@ class WorkflowNodeExecutionConfig(BaseSettings):
         default=100,
     )
 
+    WORKFLOW_PARALLEL_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of parallel branches of a single workflow run executed at the same time",
+        default=10,
+    )
+
+    WORKFLOW_SCHEDULER_MAX_WORKERS: PositiveInt = Field(
+        description="Maximum number of threads shared by parallel branches and iterations of all workflow runs"
+        " in one API process",
+        default=200,
+    )
+
+    WORKFLOW_SCHEDULER_MAX_QUEUED_TASKS: PositiveInt = Field(
+        description="Maximum number of parallel branch and iteration tasks waiting for a thread in one API process,"
+        " further tasks are rejected",
+        default=10000,
+    )
+
     WORKFLOW_NODE_EXECUTION_STORAGE: str = Field(
         default="rdbms",
         description="Storage backend for WorkflowNodeExecution. Options: 'rdbms', 'hybrid'",
@@ -817,6 +955,27 @@ class IndexingConfig(BaseSettings):
         default=50,
     )
 
+    DOCUMENT_EMBEDDING_CACHE_MAX_SIZE: NonNegativeInt = Field(
+        description="Maximum number of document embeddings kept in the per-process cache, 0 to disable",
+        default=1024,
+    )
+
+    DOCUMENT_EMBEDDING_CACHE_REDIS_TTL: NonNegativeInt = Field(
+        description="Time in seconds document embeddings are cached in Redis in front of the embeddings table,"
+        " 0 to disable",
+        default=600,
+    )
+
+    EMBEDDING_MAX_CONCURRENT_BATCHES: PositiveInt = Field(
+        description="Maximum number of document embedding batches in flight per model credential",
+        default=4,
+    )
+
+    EMBEDDING_RATE_LIMIT_MAX_RETRIES: NonNegativeInt = Field(
+        description="Maximum number of retries with backoff for a rate limited document embedding batch",
+        default=5,
+    )
+
 
 class MultiModalTransferConfig(BaseSettings):
     MULTIMODAL_SEND_FORMAT: Literal["base64", "url"] = Field(
@@ -98,7 +98,8 @@ class VectorStoreConfig(BaseSettings):
 class KeywordStoreConfig(BaseSettings):
     KEYWORD_STORE: str = Field(
         description="Method for keyword extraction and storage."
-        " Default is 'jieba', a Chinese text segmentation library.",
+        " Default is 'jieba', a Chinese text segmentation library."
+        " 'jieba_inverted_index' stores one row per keyword and segment instead of one JSON table per dataset.",
         default="jieba",
     )
 
@@ -183,6 +183,7 @@ from .workspace import (
     load_balancing_config,
     members,
     model_providers,
+    model_sync_extend,  # 二开部分：新增模型同步到所有工作区
     models,
     plugin,
     tool_providers,
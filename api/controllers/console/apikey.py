@@ -15,6 +15,7 @@ from libs.login import login_required
 from models.api_token_money_extend import ApiTokenMoneyExtend  # 二开部分 - 密钥额度限制
 from models.dataset import Dataset
 from models.model import ApiToken, App
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend  # 二开部分 - 额度准入
 
 from . import api
 from .wraps import account_initialization_required, setup_required
@@ -206,6 +207,9 @@ class BaseApiKeyListResource(Resource):
                 api_token_money_extend.month_limit_quota = data['month_limit_quota']
 
         db.session.commit()
+        # 额度限制变更后失效准入余额
+        QuotaAdmissionServiceExtend.invalidate(QuotaAdmissionServiceExtend.API_TOKEN_DAY, [api_key_id])
+        QuotaAdmissionServiceExtend.invalidate(QuotaAdmissionServiceExtend.API_TOKEN_MONTH, [api_key_id])
 
         # 重新查询以获取更新后的数据
         updated_key = (
@@ -0,0 +1,51 @@
+from flask_login import current_user
+from flask_restful import Resource, reqparse
+from werkzeug.exceptions import Forbidden, NotFound
+
+from controllers.console import api
+from controllers.console.wraps import account_initialization_required, setup_required
+from libs.login import login_required
+from services.account_service_extend import TenantExtendService
+from services.model_service_extend import ModelExtendService
+
+
+def _check_super_admin():
+    # 只有超级管理员可以把模型同步到所有工作区
+    if TenantExtendService.get_super_admin_id().id != current_user.id:
+        raise Forbidden()
+
+
+class ModelSyncApi(Resource):
+    @setup_required
+    @login_required
+    @account_initialization_required
+    def post(self):
+        """把全量同步的模型同步到工作区，返回同步任务id"""
+        _check_super_admin()
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("tenant_ids", type=list, required=False, location="json")
+        args = parser.parse_args()
+
+        job_id = ModelExtendService.dispatch_sync_all_models(args["tenant_ids"] or None)
+
+        return {"job_id": job_id}, 202
+
+
+class ModelSyncProgressApi(Resource):
+    @setup_required
+    @login_required
+    @account_initialization_required
+    def get(self, job_id):
+        """查询同步任务进度"""
+        _check_super_admin()
+
+        progress = ModelExtendService.get_sync_progress(str(job_id))
+        if progress is None:
+            raise NotFound("Model sync job not found.")
+
+        return progress, 200
+
+
+api.add_resource(ModelSyncApi, "/workspaces/current/models/sync-extend")
+api.add_resource(ModelSyncProgressApi, "/workspaces/current/models/sync-extend/<uuid:job_id>")
@@ -15,6 +15,11 @@ from controllers.service_api.app.error import (
     ProviderNotInitializeError,
     ProviderQuotaExceededError,
 )
+from controllers.service_api.app.error_extend import (  # 二开部分  额度限制，API调用计费
+    AccountNoMoneyErrorExtend,
+    ApiTokenDayNoMoneyErrorExtend,
+    ApiTokenMonthNoMoneyErrorExtend,
+)
 from controllers.service_api.wraps import FetchUserArg, WhereisUserArg, validate_app_token
 from controllers.web.error import InvokeRateLimitError as InvokeRateLimitHttpError
 from core.app.apps.base_app_queue_manager import AppQueueManager
@@ -36,6 +41,11 @@ from repositories.factory import DifyAPIRepositoryFactory
 from services.app_generate_service import AppGenerateService
 from services.errors.app import IsDraftWorkflowError, WorkflowIdFormatError, WorkflowNotFoundError
 from services.errors.llm import InvokeRateLimitError
+from services.errors.quota_extend import (  # 二开部分  额度限制，API调用计费
+    AccountQuotaExceededErrorExtend,
+    ApiTokenDayQuotaExceededErrorExtend,
+    ApiTokenMonthQuotaExceededErrorExtend,
+)
 from services.workflow_app_service import WorkflowAppService
 
 logger = logging.getLogger(__name__)
@@ -108,6 +118,14 @@ class WorkflowRunApi(Resource):
             raise ProviderNotInitializeError(ex.description)
         except QuotaExceededError:
             raise ProviderQuotaExceededError()
+        # ---------------------二开部分Begin  额度限制，API调用计费 ---------------------
+        except AccountQuotaExceededErrorExtend:
+            raise AccountNoMoneyErrorExtend()
+        except ApiTokenDayQuotaExceededErrorExtend:
+            raise ApiTokenDayNoMoneyErrorExtend()
+        except ApiTokenMonthQuotaExceededErrorExtend:
+            raise ApiTokenMonthNoMoneyErrorExtend()
+        # ---------------------二开部分End  额度限制，API调用计费 ---------------------
         except ModelCurrentlyNotSupportError:
             raise ProviderModelCurrentlyNotSupportError()
         except InvokeRateLimitError as ex:
@@ -166,6 +184,14 @@ class WorkflowRunByIdApi(Resource):
             raise ProviderNotInitializeError(ex.description)
         except QuotaExceededError:
             raise ProviderQuotaExceededError()
+        # ---------------------二开部分Begin  额度限制，API调用计费 ---------------------
+        except AccountQuotaExceededErrorExtend:
+            raise AccountNoMoneyErrorExtend()
+        except ApiTokenDayQuotaExceededErrorExtend:
+            raise ApiTokenDayNoMoneyErrorExtend()
+        except ApiTokenMonthQuotaExceededErrorExtend:
+            raise ApiTokenMonthNoMoneyErrorExtend()
+        # ---------------------二开部分End  额度限制，API调用计费 ---------------------
         except ModelCurrentlyNotSupportError:
             raise ProviderModelCurrentlyNotSupportError()
         except InvokeRateLimitError as ex:
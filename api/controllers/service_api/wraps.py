@@ -1,5 +1,4 @@
 import time
-import logging  # ---------------------二开部分  密钥额度限制 ---------------------
 from collections.abc import Callable
 from datetime import timedelta
 from enum import Enum
@@ -25,15 +24,17 @@ from libs.datetime_utils import naive_utc_now
 from libs.login import _get_user
 from models.account import Account, Tenant, TenantAccountJoin, TenantStatus, TenantAccountRole # 二开部分  额度限制，API调用计费，新增TenantAccountRole
 from models.dataset import Dataset, RateLimitLog
-from models.account_money_extend import AccountMoneyExtend
-from models.api_token_money_extend import (
-    ApiTokenMoneyExtend,  # 二开部分  密钥额度限制
-)
 from models.model import ApiToken, App, EndUser
 from models.model_extend import (
     EndUserAccountJoinsExtend,  # 二开部分  额度限制，API调用计费
 )
+from services.errors.quota_extend import (  # 二开部分  额度限制，API调用计费
+    AccountQuotaExceededErrorExtend,
+    ApiTokenDayQuotaExceededErrorExtend,
+    ApiTokenMonthQuotaExceededErrorExtend,
+)
 from services.feature_service import FeatureService
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend  # 二开部分  额度限制，API调用计费
 
 
 class WhereisUserArg(Enum):
@@ -95,33 +96,16 @@ def validate_app_token(view: Optional[Callable] = None, *, fetch_user_arg: Optio
                 raise Unauthorized("Tenant does not exist.")
 
             # ---------------------二开部分Begin  额度限制，API调用计费 ---------------------
-            # TODO 需要写入缓存，读缓存
-            account_money = (
-                db.session.query(AccountMoneyExtend)
-                .filter(AccountMoneyExtend.account_id == ta.account_id)
-                .first()
-            )
-            if account_money and account_money.used_quota >= account_money.total_quota:
-                raise AccountNoMoneyErrorExtend()
-
-            # 密钥额度判断
+            # 账号额度、密钥日/月额度判断，余额缓存在 Redis 中
             kwargs["api_token"] = api_token  # API token消息数据传递下去
-            api_token_money = (
-                db.session.query(ApiTokenMoneyExtend).filter(ApiTokenMoneyExtend.app_token_id == api_token.id).first()
-            )
-            if api_token_money:
-                if (
-                    api_token_money.day_limit_quota != -1
-                    and api_token_money.day_used_quota >= api_token_money.day_limit_quota
-                ):
-                    raise ApiTokenDayNoMoneyErrorExtend()
-                if (
-                    api_token_money.month_limit_quota != -1
-                    and api_token_money.month_used_quota >= api_token_money.month_limit_quota
-                ):
-                    raise ApiTokenMonthNoMoneyErrorExtend()
-            else:
-                logging.warning("数据异常，该密钥没有额度数据: %s", api_token.id)
+            try:
+                QuotaAdmissionServiceExtend.check(account_id=ta.account_id, app_token_id=api_token.id)
+            except AccountQuotaExceededErrorExtend:
+                raise AccountNoMoneyErrorExtend()
+            except ApiTokenDayQuotaExceededErrorExtend:
+                raise ApiTokenDayNoMoneyErrorExtend()
+            except ApiTokenMonthQuotaExceededErrorExtend:
+                raise ApiTokenMonthNoMoneyErrorExtend()
             # ---------------------二开部分End  额度限制，API调用计费 ---------------------
 
             kwargs["app_model"] = app_model
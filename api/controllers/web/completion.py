@@ -30,13 +30,11 @@ from core.errors.error import (
     QuotaExceededError,
 )
 from core.model_runtime.errors.invoke import InvokeError
-from extensions.ext_database import db
 from libs import helper
 from libs.helper import uuid_value
 from libs.passport import (
     PassportService,  # ----------------- start You must log in to access your account extend ---------------
 )
-from models.account_money_extend import AccountMoneyExtend
 from models.model import AppMode
 from services.account_service import (
     AccountService,  # ----------------- start You must log in to access your account extend ---------------
@@ -44,6 +42,8 @@ from services.account_service import (
 from services.app_generate_service import AppGenerateService
 from services.app_generate_service_extend import AppGenerateServiceExtend
 from services.errors.llm import InvokeRateLimitError
+from services.errors.quota_extend import QuotaExceededErrorExtend
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend
 
 
 # ----------------- start You must log in to access your account extend ---------------
@@ -69,15 +69,8 @@ def is_end_login(end_user):
 # ----------------- 二开部分Begin - 额度限制 ---------------
 def is_money_limit(end_user) -> bool:
     try:
-        # TODO 需要写入缓存，读缓存
-        account_money = (
-            db.session.query(AccountMoneyExtend).filter(AccountMoneyExtend.account_id == end_user.id).first()
-        )
-        if not account_money:
-            return False
-
-        if account_money.used_quota >= account_money.total_quota:
-            return True
+        # 余额缓存在 Redis 中
+        QuotaAdmissionServiceExtend.check(account_id=end_user.id)
         return False
     except:
         return True
@@ -137,6 +130,10 @@ class CompletionApi(WebApiResource):
             raise ProviderNotInitializeError(ex.description)
         except QuotaExceededError:
             raise ProviderQuotaExceededError()
+        # ----------------- 二开部分Begin - 余额判断-----------------
+        except QuotaExceededErrorExtend:
+            raise AccountNoMoneyErrorExtend()
+        # ----------------- 二开部分End - 余额判断-----------------
         except ModelCurrentlyNotSupportError:
             raise ProviderModelCurrentlyNotSupportError()
         except InvokeError as e:
@@ -212,6 +209,10 @@ class ChatApi(WebApiResource):
             raise ProviderNotInitializeError(ex.description)
         except QuotaExceededError:
             raise ProviderQuotaExceededError()
+        # ----------------- 二开部分Begin - 余额判断-----------------
+        except QuotaExceededErrorExtend:
+            raise AccountNoMoneyErrorExtend()
+        # ----------------- 二开部分End - 余额判断-----------------
         except ModelCurrentlyNotSupportError:
             raise ProviderModelCurrentlyNotSupportError()
         except InvokeRateLimitError as ex:
@@ -30,6 +30,7 @@ from libs import helper
 from models.model import App, AppMode, EndUser
 from services.app_generate_service import AppGenerateService
 from services.errors.llm import InvokeRateLimitError
+from services.errors.quota_extend import QuotaExceededErrorExtend
 from services.app_generate_service_extend import (
     AppGenerateServiceExtend,  # Extend: App Center - Recommended list sorted by usage frequency
 )
@@ -77,6 +78,10 @@ class WorkflowRunApi(WebApiResource):
             raise ProviderNotInitializeError(ex.description)
         except QuotaExceededError:
             raise ProviderQuotaExceededError()
+        # ----------------- 二开部分Begin - 余额判断-----------------
+        except QuotaExceededErrorExtend:
+            raise AccountNoMoneyErrorExtend()
+        # ----------------- 二开部分End - 余额判断-----------------
         except ModelCurrentlyNotSupportError:
             raise ProviderModelCurrentlyNotSupportError()
         except InvokeError as e:
@@ -8,6 +8,7 @@ from typing import Any, Optional, Union
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from configs import dify_config
 from constants.tts_auto_play_timeout import TTS_AUTO_PLAY_TIMEOUT, TTS_AUTO_PLAY_YIELD_CPU_TIME
 from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
 from core.app.apps.common.workflow_response_converter import WorkflowResponseConverter
@@ -61,6 +62,7 @@ from core.app.entities.task_entities import (
 )
 from core.app.task_pipeline.based_generate_task_pipeline import BasedGenerateTaskPipeline
 from core.app.task_pipeline.message_cycle_manager import MessageCycleManager
+from core.app.task_pipeline.stream_chunk_coalescer import StreamChunkCoalescer
 from core.base.tts import AppGeneratorTTSPublisher, AudioTrunk
 from core.model_runtime.entities.llm_entities import LLMUsage
 from core.ops.ops_trace_manager import TraceQueueManager
@@ -215,6 +217,9 @@ class AdvancedChatAppGenerateTaskPipeline:
         To stream response.
         :return:
         """
+        if dify_config.STREAM_CHUNK_COALESCING_ENABLED:
+            generator = StreamChunkCoalescer.from_config(self._application_generate_entity.task_id).coalesce(generator)
+
         for stream_response in generator:
             yield ChatbotAppStreamResponse(
                 conversation_id=self._conversation_id,
@@ -2,22 +2,41 @@ import queue
 import time
 from abc import abstractmethod
 from enum import Enum
-from typing import Any, Optional
+from typing import Any, Optional, get_args
 
 from sqlalchemy.orm import DeclarativeMeta
 
 from configs import dify_config
+from core.app.apps.stop_signal import task_stop_signal
 from core.app.entities.app_invoke_entities import InvokeFrom
 from core.app.entities.queue_entities import (
     AppQueueEvent,
     MessageQueueMessage,
     QueueErrorEvent,
+    QueueLLMChunkEvent,
     QueuePingEvent,
     QueueStopEvent,
+    QueueTextChunkEvent,
     WorkflowQueueMessage,
 )
 from extensions.ext_redis import redis_client
 
+# put into the queue to wake up `listen` when a stop signal arrives
+_STOP_SIGNAL_WAKEUP = object()
+
+_CHUNK_EVENT_TYPES = frozenset({QueueTextChunkEvent, QueueLLMChunkEvent})
+
+# event classes whose field declarations have been checked for SQLAlchemy models
+_checked_event_types: set[type[AppQueueEvent]] = set()
+
+
+def _annotation_has_sqlalchemy_model(annotation: Any) -> bool:
+    if isinstance(annotation, type) and (
+        isinstance(annotation, DeclarativeMeta) or hasattr(annotation, "_sa_class_manager")
+    ):
+        return True
+    return any(_annotation_has_sqlalchemy_model(arg) for arg in get_args(annotation))
+
 
 class PublishFrom(Enum):
     APPLICATION_MANAGER = 1
@@ -25,6 +44,10 @@ class PublishFrom(Enum):
 
 
 class AppQueueManager:
+    # seconds between two checks of the stop flag in Redis while the stop signal subscription is down,
+    # publish and listen call `_is_stopped` for every event
+    STOP_FLAG_CHECK_INTERVAL = 1.0
+
     def __init__(self, task_id: str, user_id: str, invoke_from: InvokeFrom) -> None:
         if not user_id:
             raise ValueError("user is required")
@@ -41,6 +64,9 @@ class AppQueueManager:
         q: queue.Queue[WorkflowQueueMessage | MessageQueueMessage | None] = queue.Queue()
 
         self._q = q
+        self._stopped = False
+        self._stop_flag_checked_at = 0.0
+        task_stop_signal.register(self._task_id, self)
 
     def listen(self):
         """
@@ -53,7 +79,15 @@ class AppQueueManager:
         last_ping_time: int | float = 0
         while True:
             try:
-                message = self._q.get(timeout=1)
+                if task_stop_signal.subscribed:
+                    # stop signals wake the queue up, only wait until the next ping or the listen timeout
+                    elapsed_time = time.time() - start_time
+                    timeout = max(min((last_ping_time + 1) * 10, listen_timeout) - elapsed_time, 0.01)
+                else:
+                    timeout = 1
+                message = self._q.get(timeout=timeout)
+                if message is _STOP_SIGNAL_WAKEUP:
+                    continue
                 if message is None:
                     break
 
@@ -73,6 +107,15 @@ class AppQueueManager:
                     self.publish(QueuePingEvent(), PublishFrom.TASK_PIPELINE)
                     last_ping_time = elapsed_time // 10
 
+    def on_stop_signal(self) -> None:
+        """
+        Called from the stop signal subscriber when the task is stopped
+        :return:
+        """
+        self._stopped = True
+        # wake up the listen loop, which publishes the stop event
+        self._q.put(_STOP_SIGNAL_WAKEUP)  # type: ignore[arg-type]
+
     def stop_listen(self) -> None:
         """
         Stop listen to queue
@@ -96,7 +139,11 @@ class AppQueueManager:
         :param pub_from:
         :return:
         """
-        self._check_for_sqlalchemy_models(event.model_dump())
+        # streamed chunks carry no models, skip any checks on the hottest path
+        if type(event) not in _CHUNK_EVENT_TYPES:
+            self._check_event_type(type(event))
+            if dify_config.DEBUG:
+                self._check_for_sqlalchemy_models(event.model_dump())
         self._publish(event, pub_from)
 
     @abstractmethod
@@ -125,15 +172,28 @@ class AppQueueManager:
 
         stopped_cache_key = cls._generate_stopped_cache_key(task_id)
         redis_client.setex(stopped_cache_key, 600, 1)
+        task_stop_signal.publish(task_id)
 
     def _is_stopped(self) -> bool:
         """
         Check if task is stopped
         :return:
         """
+        if self._stopped:
+            return True
+        if task_stop_signal.subscribed:
+            return False
+
+        # the stop flag is read from Redis at most once per interval, a stopped task stays stopped
+        now = time.monotonic()
+        if now - self._stop_flag_checked_at < self.STOP_FLAG_CHECK_INTERVAL:
+            return False
+        self._stop_flag_checked_at = now
+
         stopped_cache_key = AppQueueManager._generate_stopped_cache_key(self._task_id)
         result = redis_client.get(stopped_cache_key)
         if result is not None:
+            self._stopped = True
             return True
 
         return False
@@ -156,6 +216,22 @@ class AppQueueManager:
         """
         return f"generate_task_stopped:{task_id}"
 
+    @classmethod
+    def _check_event_type(cls, event_type: type[AppQueueEvent]) -> None:
+        """
+        Check once per event class that none of its fields is declared as a SQLAlchemy model.
+        Values of loosely typed fields are only scanned in debug mode.
+        """
+        if event_type in _checked_event_types:
+            return
+        for field_name, field in event_type.model_fields.items():
+            if _annotation_has_sqlalchemy_model(field.annotation):
+                raise TypeError(
+                    f"Critical Error: {event_type.__name__}.{field_name} is a SQLAlchemy model, "
+                    "passing SQLAlchemy Model instances that cause thread safety issues is not allowed."
+                )
+        _checked_event_types.add(event_type)
+
     def _check_for_sqlalchemy_models(self, data: Any):
         # from entity to dict or list
         if isinstance(data, dict):
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+import weakref
+from typing import Protocol
+
+from extensions.ext_redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class StopSignalListener(Protocol):
+    def on_stop_signal(self) -> None: ...
+
+
+class TaskStopSignal:
+    """
+    Delivers stop requests of generate tasks to the process that runs them.
+
+    Each process keeps one Redis pub/sub subscription. `publish` sends the task id on the channel, and the
+    subscriber notifies the listener registered for that task in this process. While the subscription is down
+    listeners cannot rely on it and read the stop flag key instead; after every (re)subscribe the keys of all
+    registered tasks are checked once, so stop requests sent while disconnected are not lost.
+    """
+
+    CHANNEL = "generate_task_stopped"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # listeners are owned by their queue managers, finished tasks drop out on their own
+        self._listeners: weakref.WeakValueDictionary[str, StopSignalListener] = weakref.WeakValueDictionary()
+        self._subscribed = False
+        self._subscriber_started = False
+
+    @property
+    def subscribed(self) -> bool:
+        return self._subscribed
+
+    def register(self, task_id: str, listener: StopSignalListener) -> None:
+        with self._lock:
+            self._listeners[task_id] = listener
+        self._ensure_subscriber()
+
+    def publish(self, task_id: str) -> None:
+        try:
+            redis_client.publish(self.CHANNEL, task_id)
+        except Exception:
+            # the stop flag key is still set, listeners fall back to reading it
+            logger.exception("Failed to publish stop signal of task %s", task_id)
+
+    def _notify(self, task_id: str) -> None:
+        with self._lock:
+            listener = self._listeners.get(task_id)
+        if listener is not None:
+            listener.on_stop_signal()
+
+    def _ensure_subscriber(self) -> None:
+        if self._subscriber_started:
+            return
+        with self._lock:
+            if self._subscriber_started:
+                return
+            self._subscriber_started = True
+        threading.Thread(target=self._listen, name="generate-task-stop-signal", daemon=True).start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub()
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "subscribe":
+                        self._subscribed = True
+                        self._check_missed_signals()
+                    elif message.get("type") == "message":
+                        data = message["data"]
+                        self._notify(data.decode() if isinstance(data, bytes) else data)
+            except Exception:
+                logger.exception("Generate task stop signal subscriber disconnected")
+            self._subscribed = False
+            time.sleep(1)
+
+    def _check_missed_signals(self) -> None:
+        from core.app.apps.base_app_queue_manager import AppQueueManager
+
+        with self._lock:
+            task_ids = list(self._listeners.keys())
+        if not task_ids:
+            return
+        keys = [AppQueueManager._generate_stopped_cache_key(task_id) for task_id in task_ids]
+        for task_id, stopped in zip(task_ids, redis_client.mget(keys)):
+            if stopped is not None:
+                self._notify(task_id)
+
+
+task_stop_signal = TaskStopSignal()
@@ -6,6 +6,7 @@ from typing import Any, Optional, Union
 
 from sqlalchemy.orm import Session
 
+from configs import dify_config
 from constants.tts_auto_play_timeout import TTS_AUTO_PLAY_TIMEOUT, TTS_AUTO_PLAY_YIELD_CPU_TIME
 from core.app.apps.base_app_queue_manager import AppQueueManager
 from core.app.apps.common.workflow_response_converter import WorkflowResponseConverter
@@ -55,6 +56,7 @@ from core.app.entities.task_entities import (
     WorkflowStartStreamResponse,
 )
 from core.app.task_pipeline.based_generate_task_pipeline import BasedGenerateTaskPipeline
+from core.app.task_pipeline.stream_chunk_coalescer import StreamChunkCoalescer
 from core.base.tts import AppGeneratorTTSPublisher, AudioTrunk
 from core.ops.ops_trace_manager import TraceQueueManager
 from core.workflow.entities.workflow_execution import WorkflowExecution, WorkflowExecutionStatus, WorkflowType
@@ -190,6 +192,9 @@ class WorkflowAppGenerateTaskPipeline:
         To stream response.
         :return:
         """
+        if dify_config.STREAM_CHUNK_COALESCING_ENABLED:
+            generator = StreamChunkCoalescer.from_config(self._application_generate_entity.task_id).coalesce(generator)
+
         workflow_run_id = None
         for stream_response in generator:
             if isinstance(stream_response, WorkflowStartStreamResponse):
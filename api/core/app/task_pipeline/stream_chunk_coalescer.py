@@ -0,0 +1,180 @@
+import contextvars
+import logging
+import queue
+import threading
+import time
+from collections.abc import Generator, Iterable
+from typing import Optional
+
+from opentelemetry.metrics import get_meter
+
+from configs import dify_config
+from core.app.entities.task_entities import (
+    MessageStreamResponse,
+    StreamEvent,
+    StreamResponse,
+    TextChunkStreamResponse,
+)
+
+logger = logging.getLogger(__name__)
+
+_meter = get_meter("stream_chunk_coalescer")
+_events_saved_counter = _meter.create_counter(
+    "stream.coalescing.events_saved",
+    description="Text chunk events merged away by stream chunk coalescing",
+    unit="{event}",
+)
+_bytes_saved_counter = _meter.create_counter(
+    "stream.coalescing.bytes_saved",
+    description="Estimated SSE envelope bytes saved by stream chunk coalescing",
+    unit="By",
+)
+
+
+class StreamChunkCoalescer:
+    """
+    Merges consecutive text deltas of a stream into fewer stream responses.
+
+    Deltas of the same message and variable selector are buffered until `window` seconds have passed since the
+    first buffered delta or `max_bytes` of text are buffered. Any other response flushes the buffer before it is
+    yielded, so the order of the stream is kept and text never crosses a node boundary.
+
+    The upstream responses are pulled by a producer thread, so a buffered delta is flushed when the window ends
+    even if the next response takes longer to arrive.
+    """
+
+    def __init__(self, task_id: str, window: float, max_bytes: int) -> None:
+        self.task_id = task_id
+        self.window = window
+        self.max_bytes = max_bytes
+        self.events_saved = 0
+        self.bytes_saved = 0
+        self._buffer: list[str] = []
+        self._buffer_bytes = 0
+        self._buffer_started_at = 0.0
+        self._buffer_response: Optional[StreamResponse] = None
+        self._buffer_key: Optional[tuple] = None
+        self._envelope_bytes: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, task_id: str) -> "StreamChunkCoalescer":
+        return cls(
+            task_id=task_id,
+            window=dify_config.STREAM_CHUNK_COALESCING_WINDOW_MS / 1000,
+            max_bytes=dify_config.STREAM_CHUNK_COALESCING_MAX_BYTES,
+        )
+
+    def coalesce(self, responses: Iterable[StreamResponse]) -> Generator[StreamResponse, None, None]:
+        # upstream responses, then an exception raised by the upstream or None at its end
+        pending: queue.Queue[StreamResponse | BaseException | None] = queue.Queue()
+        stopped = threading.Event()
+        # the upstream keeps the flask and other context variables of the consumer
+        producer = threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._produce, responses, pending, stopped),
+            name=f"StreamChunkCoalescer-{self.task_id}",
+            daemon=True,
+        )
+        producer.start()
+        try:
+            while True:
+                timeout = None
+                if self._buffer_response is not None:
+                    timeout = max(self._buffer_started_at + self.window - time.monotonic(), 0)
+                try:
+                    response = pending.get(timeout=timeout)
+                except queue.Empty:
+                    yield self._flush()
+                    continue
+                if response is None:
+                    break
+                if isinstance(response, BaseException):
+                    raise response
+
+                key, text = self._text_delta(response)
+                if key is None or key != self._buffer_key:
+                    if self._buffer_response is not None:
+                        yield self._flush()
+                    if key is None:
+                        yield response
+                        continue
+                    self._buffer_response = response
+                    self._buffer_key = key
+                    self._buffer_started_at = time.monotonic()
+
+                self._buffer.append(text)
+                self._buffer_bytes += len(text.encode())
+                if self._buffer_bytes >= self.max_bytes or time.monotonic() - self._buffer_started_at >= self.window:
+                    yield self._flush()
+
+            if self._buffer_response is not None:
+                yield self._flush()
+        finally:
+            # the producer stops at the next upstream response when the consumer goes away
+            stopped.set()
+            self._report()
+
+    @staticmethod
+    def _produce(
+        responses: Iterable[StreamResponse],
+        pending: queue.Queue[StreamResponse | BaseException | None],
+        stopped: threading.Event,
+    ) -> None:
+        iterator = iter(responses)
+        try:
+            for response in iterator:
+                if stopped.is_set():
+                    break
+                pending.put(response)
+            else:
+                pending.put(None)
+        except BaseException as e:
+            pending.put(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    @staticmethod
+    def _text_delta(response: StreamResponse) -> tuple[Optional[tuple], str]:
+        if isinstance(response, MessageStreamResponse) and response.event == StreamEvent.MESSAGE:
+            selector = tuple(response.from_variable_selector or ())
+            return (StreamEvent.MESSAGE, response.id, selector), response.answer
+        if isinstance(response, TextChunkStreamResponse):
+            selector = tuple(response.data.from_variable_selector or ())
+            return (StreamEvent.TEXT_CHUNK, selector), response.data.text
+        return None, ""
+
+    def _flush(self) -> StreamResponse:
+        response = self._buffer_response
+        assert response is not None
+        if len(self._buffer) > 1:
+            text = "".join(self._buffer)
+            if isinstance(response, TextChunkStreamResponse):
+                response = response.model_copy(update={"data": response.data.model_copy(update={"text": text})})
+            else:
+                response = response.model_copy(update={"answer": text})
+
+            if self._envelope_bytes is None:
+                # every merged delta would have been sent in an envelope of about the same size
+                self._envelope_bytes = len(response.model_dump_json()) - len(text.encode())
+            self.events_saved += len(self._buffer) - 1
+            self.bytes_saved += self._envelope_bytes * (len(self._buffer) - 1)
+
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_response = None
+        self._buffer_key = None
+        return response
+
+    def _report(self) -> None:
+        if not self.events_saved:
+            return
+        _events_saved_counter.add(self.events_saved)
+        _bytes_saved_counter.add(self.bytes_saved)
+        logger.info(
+            "Stream of task %s coalesced text chunks, %d events and about %d bytes saved",
+            self.task_id,
+            self.events_saved,
+            self.bytes_saved,
+        )
@@ -124,7 +124,8 @@ class ProviderConfiguration(BaseModel):
             if not credentials and self.custom_configuration.provider:
                 credentials = self.custom_configuration.provider.credentials
 
-            return credentials
+            # the configurations may be cached, do not hand out the cached credentials
+            return credentials.copy() if credentials else credentials
 
     def get_system_configuration_status(self) -> Optional[SystemConfigurationStatus]:
         """
@@ -10,6 +10,7 @@ from yarl import URL
 
 from configs import dify_config
 from core.helper.code_executor.javascript.javascript_transformer import NodeJsTemplateTransformer
+from core.helper.code_executor.jinja2.jinja2_renderer import Jinja2Renderer
 from core.helper.code_executor.jinja2.jinja2_transformer import Jinja2TemplateTransformer
 from core.helper.code_executor.python3.python3_transformer import Python3TemplateTransformer
 from core.helper.code_executor.template_transformer import TemplateTransformer
@@ -134,6 +135,12 @@ class CodeExecutor:
         :param purview: bool = False
         :return:
         """
+        if language == CodeLanguage.JINJA2 and dify_config.CODE_EXECUTION_JINJA2_ENGINE == "local":
+            try:
+                return {"result": Jinja2Renderer.render(code, inputs)}
+            except Exception as e:
+                raise CodeExecutionError(f"Failed to render template: {e}")
+
         template_transformer = cls.code_template_transformers.get(language)
         if not template_transformer:
             raise CodeExecutionError(f"Unsupported language {language}")
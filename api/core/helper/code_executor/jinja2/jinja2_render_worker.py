@@ -0,0 +1,142 @@
+"""
+Child process that renders Jinja2 templates for Jinja2Renderer.
+
+It reads one JSON request per line from stdin and writes one JSON response per line to stdout. It only imports the
+standard library and Jinja2, so that it starts fast and none of the API code runs next to the templates.
+
+The CPU time of each render is limited with a profiling timer, which interrupts loops and filters, and with
+RLIMIT_CPU, which kills the process when a single builtin call outlasts the timer. The address space of the process
+is limited with RLIMIT_AS, so that building a huge value fails with a MemoryError.
+"""
+
+import json
+import resource
+import signal
+import sys
+from functools import lru_cache
+from itertools import islice
+from typing import Any
+
+from jinja2 import Template
+from jinja2.runtime import Context
+from jinja2.sandbox import ImmutableSandboxedEnvironment
+
+_OUTPUT_CHECK_BATCH_SIZE = 256
+
+
+class RenderLimitError(Exception):
+    pass
+
+
+class LimitedSandboxedEnvironment(ImmutableSandboxedEnvironment):
+    """
+    Sandboxed environment that refuses to repeat a sequence past the output length limit, before building it.
+    """
+
+    intercepted_binops = frozenset(["*", "**"])
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.max_output_length = 1_000_000
+
+    def check_output_length(self, length: int) -> None:
+        if length > self.max_output_length:
+            raise RenderLimitError(f"Template output exceeds {self.max_output_length} characters")
+
+    def call_binop(self, context: Context, operator: str, left: Any, right: Any) -> Any:
+        if operator == "*":
+            for sequence, count in ((left, right), (right, left)):
+                if isinstance(sequence, (str, list, tuple)) and isinstance(count, int):
+                    self.check_output_length(len(sequence) * count)
+        elif operator == "**" and isinstance(left, int) and isinstance(right, int):
+            # the result would need about this many digits
+            self.check_output_length(int(abs(right) * max(abs(left), 1).bit_length() * 0.302))
+        return super().call_binop(context, operator, left, right)
+
+
+_environment = LimitedSandboxedEnvironment()
+
+
+@lru_cache(maxsize=256)
+def _compile(template: str) -> Template:
+    return _environment.from_string(template)
+
+
+def _on_cpu_time_exceeded(signum, frame):
+    raise RenderLimitError("Template rendering exceeded the CPU time limit")
+
+
+def _limit_memory(max_memory: int) -> None:
+    """
+    Limit the address space to what the process uses now plus max_memory bytes
+    """
+    if max_memory <= 0:
+        return
+    try:
+        with open("/proc/self/statm") as statm:
+            used = int(statm.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        # RLIMIT_AS is only enforced on Linux anyway
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = used + max_memory
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _limit_cpu_time(cpu_time_limit: float) -> None:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # RLIMIT_CPU counts the whole life of the process in seconds, leave the timer a second to fire first
+    soft = int(usage.ru_utime + usage.ru_stime + cpu_time_limit) + 2
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    signal.setitimer(signal.ITIMER_PROF, cpu_time_limit)
+
+
+def render(template: str, inputs: dict[str, Any], max_output_length: int) -> str:
+    _environment.max_output_length = max_output_length
+    chunks = []
+    length = 0
+    generator = _compile(template).generate(**inputs)
+    # consume the output in batches, checking the length per chunk would cost more than rendering it
+    while batch := list(islice(generator, _OUTPUT_CHECK_BATCH_SIZE)):
+        chunk = "".join(batch)
+        length += len(chunk)
+        _environment.check_output_length(length)
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+def handle(request: dict[str, Any]) -> dict[str, Any]:
+    try:
+        _limit_cpu_time(request["cpu_time_limit"])
+        return {"result": render(request["template"], request["inputs"], request["max_output_length"])}
+    except RenderLimitError as e:
+        return {"error": str(e), "limit": True}
+    except MemoryError:
+        return {"error": "Template rendering exceeded the memory limit", "limit": True}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}", "limit": False}
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+
+
+def main() -> None:
+    _limit_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    signal.signal(signal.SIGPROF, _on_cpu_time_exceeded)
+
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    # tell the parent the process started, its startup does not count against the timeout of a render
+    stdout.write(b'{"ready": true}\n')
+    stdout.flush()
+    while line := stdin.readline():
+        stdout.write(json.dumps(handle(json.loads(line))).encode() + b"\n")
+        stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any
+
+from configs import dify_config
+from core.helper.code_executor.jinja2 import jinja2_render_worker
+from core.variables.utils import SegmentJSONEncoder
+
+
+class Jinja2RenderError(ValueError):
+    """Raised when a template cannot be rendered."""
+
+
+class Jinja2RenderLimitError(Jinja2RenderError):
+    """Raised when rendering a template exceeds the output length, CPU time or memory limit."""
+
+
+# seconds to wait for a render process to start, which is not part of the timeout of the render
+_START_TIMEOUT = 30
+
+
+class _RenderProcess:
+    """
+    A jinja2_render_worker child process, which renders one template at a time.
+    """
+
+    def __init__(self) -> None:
+        self._process = subprocess.Popen(
+            [
+                sys.executable,
+                jinja2_render_worker.__file__,
+                str(dify_config.CODE_EXECUTION_JINJA2_LOCAL_MAX_MEMORY * 1024 * 1024),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        assert self._process.stdin is not None
+        assert self._process.stdout is not None
+        self._stdin = self._process.stdin.fileno()
+        self._stdout = self._process.stdout.fileno()
+        self._started = False
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def request(self, payload: bytes, timeout: float) -> dict[str, Any]:
+        """
+        Send a request line and wait for the response line
+        :param payload: JSON request, ending with a newline
+        :param timeout: seconds to wait for the response, not counting the startup of the process
+        :return: JSON response
+        """
+        if not self._started:
+            self._read_line(time.monotonic() + _START_TIMEOUT)
+            self._started = True
+
+        # the descriptors may be non-blocking under gevent, and select waits cooperatively there
+        deadline = time.monotonic() + timeout
+        view = memoryview(payload)
+        while view:
+            if not select.select([], [self._stdin], [], self._remaining(deadline))[1]:
+                raise TimeoutError("Timed out sending the template to the render process")
+            try:
+                view = view[os.write(self._stdin, view) :]
+            except BlockingIOError:
+                continue
+
+        response: dict[str, Any] = json.loads(self._read_line(deadline))
+        return response
+
+    def _read_line(self, deadline: float) -> bytes:
+        chunks: list[bytes] = []
+        while not chunks or not chunks[-1].endswith(b"\n"):
+            if not select.select([self._stdout], [], [], self._remaining(deadline))[0]:
+                raise TimeoutError("Timed out waiting for the render process")
+            try:
+                chunk = os.read(self._stdout, 65536)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                raise EOFError("The render process exited")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def kill(self) -> None:
+        self._process.kill()
+        self._process.wait()
+        for pipe in (self._process.stdin, self._process.stdout):
+            if pipe:
+                pipe.close()
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(deadline - time.monotonic(), 0)
+
+
+class _RenderProcessPool:
+    """
+    Render processes of the current process, started on demand and reused.
+    """
+
+    def __init__(self) -> None:
+        self._available = threading.Condition()
+        self._idle: list[_RenderProcess] = []
+        self._count = 0
+        self._pid = os.getpid()
+
+    def acquire(self) -> _RenderProcess:
+        with self._available:
+            if self._pid != os.getpid():
+                # the render processes of the parent are not ours to use after a fork
+                self._idle, self._count, self._pid = [], 0, os.getpid()
+            while True:
+                while self._idle:
+                    process = self._idle.pop()
+                    if process.alive:
+                        return process
+                    self._count -= 1
+                if self._count < dify_config.CODE_EXECUTION_JINJA2_LOCAL_PROCESSES:
+                    self._count += 1
+                    break
+                self._available.wait()
+
+        try:
+            return _RenderProcess()
+        except Exception:
+            self.release(None)
+            raise
+
+    def release(self, process: _RenderProcess | None, reuse: bool = False) -> None:
+        with self._available:
+            if process is not None and reuse:
+                self._idle.append(process)
+            else:
+                self._count -= 1
+            self._available.notify()
+        if process is not None and not reuse:
+            process.kill()
+
+    def shutdown(self) -> None:
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._count -= len(idle)
+        for process in idle:
+            process.kill()
+
+
+_pool = _RenderProcessPool()
+
+
+class Jinja2Renderer:
+    """
+    Renders Jinja2 templates in local child processes, as an alternative to the code execution sandbox.
+
+    The templates run in a sandboxed Jinja2 environment, in processes that are limited in CPU time and memory, so
+    that a template cannot block or exhaust the API process.
+    """
+
+    @classmethod
+    def render(cls, template: str, inputs: Mapping[str, Any]) -> str:
+        """
+        Render template
+        :param template: template
+        :param inputs: inputs
+        :return:
+        """
+        # the sandbox receives the inputs as JSON too, so both engines render the same values
+        payload = (
+            json.dumps(
+                {
+                    "template": template,
+                    "inputs": inputs,
+                    "cpu_time_limit": dify_config.CODE_EXECUTION_JINJA2_LOCAL_CPU_TIME_LIMIT,
+                    "max_output_length": dify_config.CODE_EXECUTION_JINJA2_LOCAL_MAX_OUTPUT_LENGTH,
+                },
+                cls=SegmentJSONEncoder,
+            ).encode()
+            + b"\n"
+        )
+
+        process = _pool.acquire()
+        reuse = False
+        try:
+            response = process.request(payload, timeout=dify_config.CODE_EXECUTION_READ_TIMEOUT or 60)
+            reuse = True
+        except (TimeoutError, EOFError, OSError) as e:
+            raise Jinja2RenderLimitError(
+                f"Template rendering was stopped, it exceeded the CPU time or memory limit: {e}"
+            ) from e
+        finally:
+            _pool.release(process, reuse)
+
+        if "error" in response:
+            error_class = Jinja2RenderLimitError if response["limit"] else Jinja2RenderError
+            raise error_class(response["error"])
+        result: str = response["result"]
+        return result
+
+    @staticmethod
+    def shutdown() -> None:
+        """
+        Stop the idle render processes
+        """
+        _pool.shutdown()
@@ -21,6 +21,11 @@ def encrypt_token(tenant_id: str, token: str):
     return base64.b64encode(encrypted_token).decode()
 
 
+def encrypt_token_with_public_key(public_key: str, token: str):
+    encrypted_token = rsa.encrypt(token, public_key)
+    return base64.b64encode(encrypted_token).decode()
+
+
 def decrypt_token(tenant_id: str, token: str) -> str:
     return rsa.decrypt(base64.b64decode(token), tenant_id)
 
@@ -0,0 +1,127 @@
+import json
+import logging
+import threading
+import time
+from collections.abc import Callable, Sequence
+from typing import Optional, TypeVar
+
+from cachetools import LRUCache
+
+from configs import dify_config
+from extensions.ext_redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ModelLBScheduler:
+    """
+    Per-process round-robin scheduler of model load balancing configs.
+
+    The round-robin index of each model is kept in the process, so every process spreads its own invocations evenly
+    over the configs. Cooldowns are written to Redis for the console, and broadcast through Redis pub/sub to every
+    process, which keeps them with their expiry time. Picking a config does not talk to Redis.
+
+    A process only knows the cooldowns published while it was subscribed. Missing one costs a single failed call
+    on that config, which puts it in cooldown again.
+    """
+
+    COOLDOWN_CHANNEL = "model_lb_cooldown"
+
+    _lock = threading.Lock()
+    _indexes: LRUCache[str, int] = LRUCache(maxsize=dify_config.MODEL_LB_LOCAL_SCHEDULER_MAX_SIZE)
+    # cooldown key -> monotonic time the cooldown ends
+    _cooldowns: LRUCache[str, float] = LRUCache(maxsize=dify_config.MODEL_LB_LOCAL_SCHEDULER_MAX_SIZE)
+    _subscriber_started = False
+
+    @classmethod
+    def select(cls, key: str, candidates: Sequence[T], is_available: Callable[[T], bool]) -> Optional[T]:
+        """
+        Pick the next available candidate after the one picked last time
+        :param key: round-robin key of the model
+        :param candidates: load balancing configs
+        :param is_available: whether a candidate can be picked, e.g. it is not in cooldown
+        :return: the picked candidate, None if no candidate is available
+        """
+        cls._ensure_subscriber()
+
+        with cls._lock:
+            start = cls._indexes.get(key, 0)
+        for offset in range(len(candidates)):
+            index = (start + offset) % len(candidates)
+            if is_available(candidates[index]):
+                with cls._lock:
+                    cls._indexes[key] = index + 1
+                return candidates[index]
+
+        return None
+
+    @classmethod
+    def cooldown(cls, key: str, expire: int) -> None:
+        """
+        Put a load balancing config in cooldown in all processes
+        :param key: cooldown key of the config
+        :param expire: cooldown time in seconds
+        """
+        cls._ensure_subscriber()
+        cls._cooldown_local(key, expire)
+
+        try:
+            redis_client.setex(key, expire, "true")
+            redis_client.publish(cls.COOLDOWN_CHANNEL, json.dumps({"key": key, "expire": expire}))
+        except Exception:
+            logger.exception("Failed to broadcast model load balancing cooldown %s", key)
+
+    @classmethod
+    def in_cooldown(cls, key: str) -> bool:
+        with cls._lock:
+            until = cls._cooldowns.get(key)
+            if until is None:
+                return False
+            if until <= time.monotonic():
+                cls._cooldowns.pop(key, None)
+                return False
+            return True
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._indexes.clear()
+            cls._cooldowns.clear()
+
+    @classmethod
+    def _cooldown_local(cls, key: str, expire: int) -> None:
+        with cls._lock:
+            cls._cooldowns[key] = max(cls._cooldowns.get(key, 0), time.monotonic() + expire)
+
+    @classmethod
+    def _ensure_subscriber(cls) -> None:
+        if cls._subscriber_started:
+            return
+        with cls._lock:
+            if cls._subscriber_started:
+                return
+            cls._subscriber_started = True
+        threading.Thread(target=cls._listen_cooldown, name="model-lb-cooldown", daemon=True).start()
+
+    @classmethod
+    def _listen_cooldown(cls) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(cls.COOLDOWN_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        cls._on_cooldown_message(message["data"])
+            except Exception:
+                logger.exception("Model load balancing cooldown subscriber disconnected")
+            time.sleep(1)
+
+    @classmethod
+    def _on_cooldown_message(cls, data: bytes | str) -> None:
+        try:
+            cooldown = json.loads(data)
+            cls._cooldown_local(cooldown["key"], int(cooldown["expire"]))
+        except Exception:
+            logger.exception("Invalid model load balancing cooldown message %s", data)
@@ -0,0 +1,346 @@
+import hashlib
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generic, NamedTuple, Optional, TypeVar
+
+import orjson
+from cachetools import LRUCache
+from opentelemetry.metrics import get_meter
+from pydantic import TypeAdapter
+
+from configs import dify_config
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
+from core.model_runtime.entities.model_entities import AIModelEntity
+from core.plugin.entities.plugin_daemon import PluginInstallTask, PluginInstallTaskStatus, PluginModelProviderEntity
+from extensions.ext_redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+_meter = get_meter("plugin_model_cache")
+_lookup_counter = _meter.create_counter(
+    "plugin_model_cache.lookups",
+    description="Plugin model provider and model schema cache lookups, by kind and result",
+    unit="{lookup}",
+)
+
+_providers_adapter = TypeAdapter(list[PluginModelProviderEntity])
+
+_KEY_PREFIX = "plugin_model_cache"
+
+T = TypeVar("T")
+
+
+class _CacheEntry(NamedTuple):
+    value: Any
+    fetched_at: float
+
+
+class _Codec(NamedTuple, Generic[T]):
+    dump: Callable[[T], bytes]
+    load: Callable[[bytes], T]
+
+
+_PROVIDERS_CODEC: _Codec[list[PluginModelProviderEntity]] = _Codec(
+    dump=_providers_adapter.dump_json, load=_providers_adapter.validate_json
+)
+_SCHEMA_CODEC: _Codec[AIModelEntity] = _Codec(
+    dump=lambda schema: schema.model_dump_json().encode(), load=AIModelEntity.model_validate_json
+)
+
+
+class PluginModelCache:
+    """
+    Process-level and Redis-shared cache of the model providers and model schemas served by plugins.
+
+    Entries are fresh for PLUGIN_MODEL_CACHE_TTL seconds. For PLUGIN_MODEL_CACHE_STALE_TTL seconds after that, the
+    stale entry is still returned while a background thread fetches it again from the plugin daemon. Installing,
+    upgrading or uninstalling a plugin bumps the generation of the tenant in Redis, which retires the shared
+    entries, and drops the entries of the tenant in every process through Redis pub/sub.
+
+    Decoding a provider list costs about as much as fetching it, so the process keeps the decoded entities and
+    hands the same instances to every request, like the per-request caches in `contexts` did. Treat them as
+    read-only.
+    """
+
+    INVALIDATE_CHANNEL = "plugin_model_cache_invalidate"
+
+    _lock = threading.Lock()
+    _entries: LRUCache[tuple[str, ...], _CacheEntry] = LRUCache(maxsize=dify_config.PLUGIN_MODEL_CACHE_MAX_SIZE)
+    # bumped on every invalidation, so that a fetch that started before it is not cached
+    _tenant_versions: dict[str, int] = {}
+    _refreshing: set[tuple[str, ...]] = set()
+    _refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="plugin-model-cache-refresh")
+    _hits = 0
+    _stale_hits = 0
+    _misses = 0
+    _subscriber_started = False
+
+    @classmethod
+    def get_model_providers(
+        cls, tenant_id: str, fetch: Callable[[], Sequence[PluginModelProviderEntity]]
+    ) -> list[PluginModelProviderEntity]:
+        """
+        Get the model providers of the tenant, calling fetch on a cache miss
+        :param tenant_id: tenant id
+        :param fetch: fetches the model providers from the plugin daemon
+        :return: model providers
+        """
+        providers = cls._get("providers", (tenant_id, "providers"), lambda: list(fetch()), _PROVIDERS_CODEC)
+        return providers if providers is not None else []
+
+    @classmethod
+    def get_model_schema(
+        cls,
+        tenant_id: str,
+        plugin_unique_identifier: str,
+        provider: str,
+        model_type: str,
+        model: str,
+        credentials: Optional[Mapping],
+        fetch: Callable[[], Optional[AIModelEntity]],
+    ) -> Optional[AIModelEntity]:
+        """
+        Get a model schema, calling fetch on a cache miss. Missing schemas are not cached.
+        :param tenant_id: tenant id
+        :param plugin_unique_identifier: unique identifier of the plugin serving the provider
+        :param provider: provider name
+        :param model_type: model type
+        :param model: model name
+        :param credentials: model credentials, the schema of a customizable model depends on them
+        :param fetch: fetches the model schema from the plugin daemon
+        :return: model schema
+        """
+        key = (
+            tenant_id,
+            "schemas",
+            plugin_unique_identifier,
+            provider,
+            model_type,
+            model,
+            cls._hash_credentials(credentials),
+        )
+        return cls._get("schemas", key, fetch, _SCHEMA_CODEC)
+
+    @classmethod
+    def invalidate(cls, tenant_id: str) -> None:
+        """
+        Drop the cached model providers and model schemas of the tenant in all processes
+        :param tenant_id: tenant id
+        """
+        cls._invalidate_local(tenant_id)
+        # the provider configurations are built from the model providers
+        ProviderConfigurationsCache.invalidate([tenant_id])
+        try:
+            redis_client.incr(cls._generation_key(tenant_id))
+            redis_client.publish(cls.INVALIDATE_CHANNEL, tenant_id)
+        except Exception:
+            logger.exception("Failed to publish plugin model cache invalidation of tenant %s", tenant_id)
+
+    @classmethod
+    def invalidate_installed(cls, tenant_id: str, tasks: Iterable[PluginInstallTask]) -> None:
+        """
+        Invalidate the tenant once for every install task that has installed a plugin.
+
+        Installs and upgrades run asynchronously in the plugin daemon, so the tasks polled by the console are where
+        their completion is observed.
+        :param tenant_id: tenant id
+        :param tasks: install tasks of the tenant
+        """
+        for task in tasks:
+            if task.status in {PluginInstallTaskStatus.Pending, PluginInstallTaskStatus.Running}:
+                continue
+            if not any(plugin.status == PluginInstallTaskStatus.Success for plugin in task.plugins):
+                continue
+            try:
+                first_seen = redis_client.set(f"{_KEY_PREFIX}:install_task:{task.id}", 1, ex=86400, nx=True)
+            except Exception:
+                logger.exception("Failed to record install task %s of tenant %s", task.id, tenant_id)
+                first_seen = True
+            if first_seen:
+                cls.invalidate(tenant_id)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, float]:
+        lookups = cls._hits + cls._stale_hits + cls._misses
+        return {
+            "hits": cls._hits,
+            "stale_hits": cls._stale_hits,
+            "misses": cls._misses,
+            "hit_rate": (cls._hits + cls._stale_hits) / lookups if lookups else 0.0,
+            "size": len(cls._entries),
+        }
+
+    @classmethod
+    def _get(cls, kind: str, key: tuple[str, ...], fetch: Callable[[], Optional[T]], codec: _Codec[T]) -> Optional[T]:
+        if not dify_config.PLUGIN_MODEL_CACHE_ENABLED:
+            return fetch()
+        cls._ensure_subscriber()
+
+        level = "local"
+        with cls._lock:
+            entry = cls._entries.get(key)
+        if entry is None:
+            level = "shared"
+            entry = cls._get_shared(key, codec)
+
+        if entry is not None:
+            # the entries of a key are always loaded with the codec of its kind
+            value: T = entry.value
+            age = time.time() - entry.fetched_at
+            if age < dify_config.PLUGIN_MODEL_CACHE_TTL:
+                cls._record(kind, "hit", level)
+                return value
+            if age < dify_config.PLUGIN_MODEL_CACHE_TTL + dify_config.PLUGIN_MODEL_CACHE_STALE_TTL:
+                cls._record(kind, "stale", level)
+                cls._refresh_in_background(key, fetch, codec)
+                return value
+
+        cls._record(kind, "miss")
+        return cls._load(key, fetch, codec)
+
+    @classmethod
+    def _load(cls, key: tuple[str, ...], fetch: Callable[[], Optional[T]], codec: _Codec[T]) -> Optional[T]:
+        tenant_id = key[0]
+        with cls._lock:
+            version = cls._tenant_versions.get(tenant_id, 0)
+        generation = cls._get_generation(tenant_id)
+
+        value = fetch()
+        if value is None:
+            return None
+
+        entry = _CacheEntry(value=value, fetched_at=time.time())
+        with cls._lock:
+            if cls._tenant_versions.get(tenant_id, 0) != version:
+                # invalidated while fetching, the value may already be outdated
+                return value
+            cls._entries[key] = entry
+        if generation is not None:
+            cls._set_shared(key, generation, entry, codec)
+        return value
+
+    @classmethod
+    def _refresh_in_background(cls, key: tuple[str, ...], fetch: Callable[[], Optional[T]], codec: _Codec[T]) -> None:
+        with cls._lock:
+            if key in cls._refreshing:
+                return
+            cls._refreshing.add(key)
+
+        def refresh() -> None:
+            try:
+                cls._load(key, fetch, codec)
+            except Exception:
+                logger.exception("Failed to refresh plugin model cache entry %s", key[1])
+            finally:
+                with cls._lock:
+                    cls._refreshing.discard(key)
+
+        cls._refresh_executor.submit(refresh)
+
+    @classmethod
+    def _get_shared(cls, key: tuple[str, ...], codec: _Codec[Any]) -> Optional[_CacheEntry]:
+        generation = cls._get_generation(key[0])
+        if generation is None:
+            return None
+        try:
+            data = redis_client.get(cls._shared_key(key, generation))
+            if not data:
+                return None
+            fetched_at, _, value = data.partition(b"\n")
+            entry = _CacheEntry(value=codec.load(value), fetched_at=float(fetched_at))
+        except Exception:
+            logger.exception("Failed to read plugin model cache entry %s from redis", key[1])
+            return None
+
+        with cls._lock:
+            cls._entries[key] = entry
+        return entry
+
+    @classmethod
+    def _set_shared(cls, key: tuple[str, ...], generation: int, entry: _CacheEntry, codec: _Codec[Any]) -> None:
+        try:
+            redis_client.setex(
+                cls._shared_key(key, generation),
+                dify_config.PLUGIN_MODEL_CACHE_TTL + dify_config.PLUGIN_MODEL_CACHE_STALE_TTL,
+                f"{entry.fetched_at}\n".encode() + codec.dump(entry.value),
+            )
+        except Exception:
+            logger.exception("Failed to write plugin model cache entry %s to redis", key[1])
+
+    @classmethod
+    def _get_generation(cls, tenant_id: str) -> Optional[int]:
+        """The generation of the tenant's shared entries, None if Redis cannot be reached"""
+        try:
+            return int(redis_client.get(cls._generation_key(tenant_id)) or 0)
+        except Exception:
+            logger.exception("Failed to read plugin model cache generation of tenant %s", tenant_id)
+            return None
+
+    @staticmethod
+    def _generation_key(tenant_id: str) -> str:
+        return f"{_KEY_PREFIX}:{tenant_id}:generation"
+
+    @staticmethod
+    def _shared_key(key: tuple[str, ...], generation: int) -> str:
+        return f"{_KEY_PREFIX}:{key[0]}:{generation}:" + ":".join(key[1:])
+
+    @staticmethod
+    def _hash_credentials(credentials: Optional[Mapping]) -> str:
+        if not credentials:
+            return ""
+        return hashlib.sha256(orjson.dumps(credentials, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+    @classmethod
+    def _record(cls, kind: str, result: str, level: Optional[str] = None) -> None:
+        with cls._lock:
+            if result == "hit":
+                cls._hits += 1
+            elif result == "stale":
+                cls._stale_hits += 1
+            else:
+                cls._misses += 1
+        attributes = {"kind": kind, "result": result}
+        if level:
+            attributes["level"] = level
+        _lookup_counter.add(1, attributes)
+
+    @classmethod
+    def _invalidate_local(cls, tenant_id: str) -> None:
+        with cls._lock:
+            cls._tenant_versions[tenant_id] = cls._tenant_versions.get(tenant_id, 0) + 1
+            for key in [key for key in cls._entries if key[0] == tenant_id]:
+                cls._entries.pop(key, None)
+
+    @classmethod
+    def _ensure_subscriber(cls) -> None:
+        if cls._subscriber_started:
+            return
+        with cls._lock:
+            if cls._subscriber_started:
+                return
+            cls._subscriber_started = True
+        threading.Thread(target=cls._listen_invalidation, name="plugin-model-cache-invalidation", daemon=True).start()
+
+    @classmethod
+    def _listen_invalidation(cls) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(cls.INVALIDATE_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        data = message["data"]
+                        cls._invalidate_local(data.decode() if isinstance(data, bytes) else data)
+            except Exception:
+                logger.exception("Plugin model cache invalidation subscriber disconnected")
+            # invalidations may have been missed while disconnected
+            cls.clear()
+            time.sleep(1)
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+from cachetools import LRUCache
+from opentelemetry.metrics import get_meter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from extensions.ext_redis import redis_client
+from models.provider import (
+    LoadBalancingModelConfig,
+    Provider,
+    ProviderModel,
+    ProviderModelSetting,
+    TenantPreferredModelProvider,
+)
+
+if TYPE_CHECKING:
+    from core.entities.provider_configuration import ProviderConfigurations
+
+logger = logging.getLogger(__name__)
+
+_meter = get_meter("provider_configurations_cache")
+_lookup_counter = _meter.create_counter(
+    "provider_configurations_cache.lookups",
+    description="Provider configurations cache lookups, by result",
+    unit="{lookup}",
+)
+
+_SESSION_INFO_KEY = "provider_configurations_changed_tenant_ids"
+
+
+class _CacheEntry(NamedTuple):
+    version: int
+    configurations: "ProviderConfigurations"
+    cached_at: float
+
+
+class ProviderConfigurationsCache:
+    """
+    Per-process cache of the provider configurations of each tenant, stamped with a version kept in Redis.
+
+    Committing a change to the provider, provider model, preferred provider, model setting or load balancing rows
+    of a tenant bumps its version, so every process rebuilds the configurations on its next lookup. The cached
+    configurations are shared by all requests of the process and must not be modified.
+    """
+
+    _lock = threading.Lock()
+    _entries: LRUCache[str, _CacheEntry] = LRUCache(maxsize=dify_config.PROVIDER_CONFIGURATIONS_CACHE_MAX_SIZE)
+    _hits = 0
+    _misses = 0
+
+    @classmethod
+    def get(cls, tenant_id: str, build: Callable[[], "ProviderConfigurations"]) -> "ProviderConfigurations":
+        """
+        Get the provider configurations of the tenant, calling build when they are not cached or outdated
+        :param tenant_id: workspace id
+        :param build: builds the provider configurations of the tenant
+        :return: provider configurations
+        """
+        if not dify_config.PROVIDER_CONFIGURATIONS_CACHE_ENABLED:
+            return build()
+
+        # read before building, so that a change committed while building outdates the result
+        version = cls._get_version(tenant_id)
+        if version is None:
+            return build()
+
+        with cls._lock:
+            entry = cls._entries.get(tenant_id)
+        if (
+            entry is not None
+            and entry.version == version
+            and time.monotonic() - entry.cached_at < dify_config.PROVIDER_CONFIGURATIONS_CACHE_TTL
+        ):
+            cls._record("hit")
+            return entry.configurations
+
+        cls._record("miss")
+        configurations = build()
+        with cls._lock:
+            cls._entries[tenant_id] = _CacheEntry(
+                version=version, configurations=configurations, cached_at=time.monotonic()
+            )
+        return configurations
+
+    @classmethod
+    def invalidate(cls, tenant_ids: Iterable[str]) -> None:
+        """
+        Outdate the cached provider configurations of the tenants in all processes
+        :param tenant_ids: workspace ids
+        """
+        for tenant_id in set(tenant_ids):
+            with cls._lock:
+                cls._entries.pop(tenant_id, None)
+            try:
+                redis_client.incr(cls._version_key(tenant_id))
+            except Exception:
+                logger.exception("Failed to bump provider configurations version of tenant %s", tenant_id)
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._entries.clear()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, int]:
+        return {"hits": cls._hits, "misses": cls._misses, "size": len(cls._entries)}
+
+    @classmethod
+    def _get_version(cls, tenant_id: str) -> Optional[int]:
+        try:
+            return int(redis_client.get(cls._version_key(tenant_id)) or 0)
+        except Exception:
+            logger.exception("Failed to read provider configurations version of tenant %s", tenant_id)
+            return None
+
+    @staticmethod
+    def _version_key(tenant_id: str) -> str:
+        return f"tenant:{tenant_id}:provider_configurations_version"
+
+    @classmethod
+    def _record(cls, result: str) -> None:
+        with cls._lock:
+            if result == "hit":
+                cls._hits += 1
+            else:
+                cls._misses += 1
+        _lookup_counter.add(1, {"result": result})
+
+
+@event.listens_for(Provider, "after_insert")
+@event.listens_for(Provider, "after_update")
+@event.listens_for(Provider, "after_delete")
+@event.listens_for(ProviderModel, "after_insert")
+@event.listens_for(ProviderModel, "after_update")
+@event.listens_for(ProviderModel, "after_delete")
+@event.listens_for(TenantPreferredModelProvider, "after_insert")
+@event.listens_for(TenantPreferredModelProvider, "after_update")
+@event.listens_for(TenantPreferredModelProvider, "after_delete")
+@event.listens_for(ProviderModelSetting, "after_insert")
+@event.listens_for(ProviderModelSetting, "after_update")
+@event.listens_for(ProviderModelSetting, "after_delete")
+@event.listens_for(LoadBalancingModelConfig, "after_insert")
+@event.listens_for(LoadBalancingModelConfig, "after_update")
+@event.listens_for(LoadBalancingModelConfig, "after_delete")
+def _on_provider_row_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None and target.tenant_id:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).add(target.tenant_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    tenant_ids = session.info.pop(_SESSION_INFO_KEY, None)
+    if tenant_ids:
+        ProviderConfigurationsCache.invalidate(tenant_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_SESSION_INFO_KEY, None)
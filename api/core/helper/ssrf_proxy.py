@@ -2,10 +2,17 @@
 Proxy requests to avoid SSRF
 """
 
+import asyncio
+import http.cookiejar
+import importlib.util
 import logging
+import threading
 import time
+import weakref
+from typing import Any, Optional
 
 import httpx
+from opentelemetry.metrics import get_meter
 
 from configs import dify_config
 
@@ -34,7 +41,108 @@ class MaxRetriesExceededError(ValueError):
     pass
 
 
-def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+_ClientKey = tuple[Optional[str], Optional[str], Optional[str], bool]
+
+_clients: dict[_ClientKey, httpx.Client] = {}
+_clients_lock = threading.Lock()
+# async clients are bound to the event loop they were created in
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[_ClientKey, httpx.AsyncClient]] = (
+    weakref.WeakKeyDictionary()
+)
+
+_meter = get_meter("ssrf_proxy")
+_request_counter = _meter.create_counter(
+    "ssrf_proxy.requests",
+    description="Requests sent through the SSRF proxy clients, by whether a pooled connection was reused",
+    unit="{request}",
+)
+
+
+def _client_key(ssl_verify: bool) -> _ClientKey:
+    return (
+        dify_config.SSRF_PROXY_ALL_URL,
+        dify_config.SSRF_PROXY_HTTP_URL,
+        dify_config.SSRF_PROXY_HTTPS_URL,
+        ssl_verify,
+    )
+
+
+def _client_options(key: _ClientKey) -> dict[str, Any]:
+    return {
+        "verify": key[3],
+        "limits": httpx.Limits(
+            max_connections=dify_config.SSRF_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=dify_config.SSRF_POOL_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=dify_config.SSRF_POOL_KEEPALIVE_EXPIRY,
+        ),
+        "http2": dify_config.SSRF_POOL_HTTP2_ENABLED and importlib.util.find_spec("h2") is not None,
+        # the clients are shared by all tenants, never keep cookies set by responses
+        "cookies": http.cookiejar.CookieJar(policy=http.cookiejar.DefaultCookiePolicy(allowed_domains=[])),
+    }
+
+
+def _get_client(ssl_verify: bool) -> httpx.Client:
+    key = _client_key(ssl_verify)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        if key not in _clients:
+            proxy_all_url, proxy_http_url, proxy_https_url, _ = key
+            options = _client_options(key)
+            if proxy_all_url:
+                _clients[key] = httpx.Client(proxy=proxy_all_url, **options)
+            elif proxy_http_url and proxy_https_url:
+                transport_options = {k: options[k] for k in ("verify", "limits", "http2")}
+                proxy_mounts = {
+                    "http://": httpx.HTTPTransport(proxy=proxy_http_url, **transport_options),
+                    "https://": httpx.HTTPTransport(proxy=proxy_https_url, **transport_options),
+                }
+                _clients[key] = httpx.Client(mounts=proxy_mounts, **options)
+            else:
+                _clients[key] = httpx.Client(**options)
+        return _clients[key]
+
+
+def _get_async_client(ssl_verify: bool) -> httpx.AsyncClient:
+    key = _client_key(ssl_verify)
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    if key not in clients:
+        proxy_all_url, proxy_http_url, proxy_https_url, _ = key
+        options = _client_options(key)
+        if proxy_all_url:
+            clients[key] = httpx.AsyncClient(proxy=proxy_all_url, **options)
+        elif proxy_http_url and proxy_https_url:
+            transport_options = {k: options[k] for k in ("verify", "limits", "http2")}
+            proxy_mounts = {
+                "http://": httpx.AsyncHTTPTransport(proxy=proxy_http_url, **transport_options),
+                "https://": httpx.AsyncHTTPTransport(proxy=proxy_https_url, **transport_options),
+            }
+            clients[key] = httpx.AsyncClient(mounts=proxy_mounts, **options)
+        else:
+            clients[key] = httpx.AsyncClient(**options)
+    return clients[key]
+
+
+class _ConnectionTrace:
+    """Records whether a request opened a new connection or reused a pooled one."""
+
+    def __init__(self) -> None:
+        self.connected = False
+
+    def __call__(self, event_name: str, info: dict) -> None:
+        if event_name.startswith("connection.connect_tcp."):
+            self.connected = True
+
+    async def trace_async(self, event_name: str, info: dict) -> None:
+        self(event_name, info)
+
+    def record(self) -> None:
+        _request_counter.add(1, {"connection.reused": not self.connected})
+
+
+def _prepare_request_kwargs(kwargs: dict[str, Any]) -> bool:
+    """Normalize the request options in place and return the ssl verify option the client is selected by."""
     if "allow_redirects" in kwargs:
         allow_redirects = kwargs.pop("allow_redirects")
         if "follow_redirects" not in kwargs:
@@ -51,24 +159,20 @@ def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     if "ssl_verify" not in kwargs:
         kwargs["ssl_verify"] = HTTP_REQUEST_NODE_SSL_VERIFY
 
-    ssl_verify = kwargs.pop("ssl_verify")
+    return bool(kwargs.pop("ssl_verify"))
+
+
+def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+    ssl_verify = _prepare_request_kwargs(kwargs)
+    client = _get_client(ssl_verify)
+    extensions = kwargs.pop("extensions", {})
 
     retries = 0
     while retries <= max_retries:
         try:
-            if dify_config.SSRF_PROXY_ALL_URL:
-                with httpx.Client(proxy=dify_config.SSRF_PROXY_ALL_URL, verify=ssl_verify) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            elif dify_config.SSRF_PROXY_HTTP_URL and dify_config.SSRF_PROXY_HTTPS_URL:
-                proxy_mounts = {
-                    "http://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTP_URL, verify=ssl_verify),
-                    "https://": httpx.HTTPTransport(proxy=dify_config.SSRF_PROXY_HTTPS_URL, verify=ssl_verify),
-                }
-                with httpx.Client(mounts=proxy_mounts, verify=ssl_verify) as client:
-                    response = client.request(method=method, url=url, **kwargs)
-            else:
-                with httpx.Client(verify=ssl_verify) as client:
-                    response = client.request(method=method, url=url, **kwargs)
+            trace = _ConnectionTrace()
+            response = client.request(method=method, url=url, extensions={**extensions, "trace": trace}, **kwargs)
+            trace.record()
 
             if response.status_code not in STATUS_FORCELIST:
                 return response
@@ -88,6 +192,38 @@ def make_request(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     raise MaxRetriesExceededError(f"Reached maximum retries ({max_retries}) for URL {url}")
 
 
+async def make_request_async(method, url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
+    ssl_verify = _prepare_request_kwargs(kwargs)
+    client = _get_async_client(ssl_verify)
+    extensions = kwargs.pop("extensions", {})
+
+    retries = 0
+    while retries <= max_retries:
+        try:
+            trace = _ConnectionTrace()
+            response = await client.request(
+                method=method, url=url, extensions={**extensions, "trace": trace.trace_async}, **kwargs
+            )
+            trace.record()
+
+            if response.status_code not in STATUS_FORCELIST:
+                return response
+            else:
+                logging.warning(
+                    "Received status code %s for URL %s which is in the force list", response.status_code, url
+                )
+
+        except httpx.RequestError as e:
+            logging.warning("Request to URL %s failed on attempt %s: %s", url, retries + 1, e)
+            if max_retries == 0:
+                raise
+
+        retries += 1
+        if retries <= max_retries:
+            await asyncio.sleep(BACKOFF_FACTOR * (2 ** (retries - 1)))
+    raise MaxRetriesExceededError(f"Reached maximum retries ({max_retries}) for URL {url}")
+
+
 def get(url, max_retries=SSRF_DEFAULT_MAX_RETRIES, **kwargs):
     return make_request("GET", url, max_retries=max_retries, **kwargs)
 
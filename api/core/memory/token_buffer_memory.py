@@ -1,10 +1,16 @@
+import logging
+import threading
+from bisect import bisect_right
 from collections.abc import Sequence
+from itertools import accumulate
 from typing import Optional
 
+from cachetools import LRUCache
 from sqlalchemy import select
 
+from configs import dify_config
 from core.app.app_config.features.file_upload.manager import FileUploadConfigManager
-from core.file import file_manager
+from core.file import FileUploadConfig, file_manager
 from core.model_manager import ModelInstance
 from core.model_runtime.entities import (
     AssistantPromptMessage,
@@ -15,12 +21,23 @@ from core.model_runtime.entities import (
     UserPromptMessage,
 )
 from core.model_runtime.entities.message_entities import PromptMessageContentUnionTypes
+from core.model_runtime.model_providers.__base.tokenizers.gpt2_tokenizer import GPT2Tokenizer
 from core.prompt.utils.extract_thread_messages import extract_thread_messages
 from extensions.ext_database import db
+from extensions.ext_redis import redis_client
 from factories import file_factory
 from models.model import AppMode, Conversation, Message, MessageFile
 from models.workflow import Workflow, WorkflowRun
 
+logger = logging.getLogger(__name__)
+
+# token counts of history messages never change, cache them so that each turn only counts the latest exchange
+_TOKEN_COUNT_CACHE_TTL = 24 * 60 * 60
+
+# file upload configs of published workflows, keyed by workflow id
+_workflow_file_upload_configs: LRUCache[str, Optional[FileUploadConfig]] = LRUCache(maxsize=1024)
+_workflow_file_upload_configs_lock = threading.Lock()
+
 
 class TokenBufferMemory:
     def __init__(
@@ -65,26 +82,17 @@ class TokenBufferMemory:
 
         messages = list(reversed(thread_messages))
 
+        message_files = self._get_message_files(messages)
+        file_extra_configs = self._get_file_extra_configs(
+            [message for message in messages if message.id in message_files]
+        )
+
         prompt_messages: list[PromptMessage] = []
+        token_count_keys: list[str] = []
         for message in messages:
-            files = db.session.query(MessageFile).where(MessageFile.message_id == message.id).all()
+            files = message_files.get(message.id)
             if files:
-                file_extra_config = None
-                if self.conversation.mode in {AppMode.AGENT_CHAT, AppMode.COMPLETION, AppMode.CHAT}:
-                    file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
-                elif self.conversation.mode in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
-                    workflow_run = db.session.scalar(
-                        select(WorkflowRun).where(WorkflowRun.id == message.workflow_run_id)
-                    )
-                    if not workflow_run:
-                        raise ValueError(f"Workflow run not found: {message.workflow_run_id}")
-                    workflow = db.session.scalar(select(Workflow).where(Workflow.id == workflow_run.workflow_id))
-                    if not workflow:
-                        raise ValueError(f"Workflow not found: {workflow_run.workflow_id}")
-                    file_extra_config = FileUploadConfigManager.convert(workflow.features_dict, is_vision=False)
-                else:
-                    raise AssertionError(f"Invalid app mode: {self.conversation.mode}")
-
+                file_extra_config = file_extra_configs.get(message.id)
                 detail = ImagePromptMessageContent.DETAIL.LOW
                 if file_extra_config and app_record:
                     file_objs = file_factory.build_from_message_files(
@@ -113,20 +121,171 @@ class TokenBufferMemory:
                 prompt_messages.append(UserPromptMessage(content=message.query))
 
             prompt_messages.append(AssistantPromptMessage(content=message.answer))
+            token_count_keys.extend(
+                [self._token_count_key(message.id, "query"), self._token_count_key(message.id, "answer")]
+            )
 
         if not prompt_messages:
             return []
 
-        # prune the chat message if it exceeds the max token limit
-        curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        # without plugin based or local token counting every count is 0, so nothing would be pruned
+        if (
+            not dify_config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED
+            and not dify_config.LOCAL_TOKEN_COUNTING_FALLBACK_ENABLED
+        ):
+            return prompt_messages
 
-        if curr_message_tokens > max_token_limit:
-            while curr_message_tokens > max_token_limit and len(prompt_messages) > 1:
-                prompt_messages.pop(0)
-                curr_message_tokens = self.model_instance.get_llm_num_tokens(prompt_messages)
+        cached_counts = self._get_cached_token_counts(token_count_keys)
+        uncounted_messages = [
+            prompt_message for prompt_message, count in zip(prompt_messages, cached_counts) if count is None
+        ]
+        if dify_config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED and len(uncounted_messages) > 1:
+            # each message counted on its own is a plugin daemon call, so on a cold cache count them all at once
+            # first, the history usually fits and needs no per message counts
+            uncounted_tokens = self.model_instance.get_llm_num_tokens(uncounted_messages)
+            if sum(count or 0 for count in cached_counts) + uncounted_tokens <= max_token_limit:
+                return prompt_messages
+
+        # prune the chat message if it exceeds the max token limit, keeping the longest suffix that fits
+        token_counts = self._get_token_counts(prompt_messages, token_count_keys, cached_counts)
+        suffix_tokens = list(accumulate(reversed(token_counts)))
+        if suffix_tokens[-1] > max_token_limit:
+            kept = max(bisect_right(suffix_tokens, max_token_limit), 1)
+            prompt_messages = prompt_messages[-kept:]
 
         return prompt_messages
 
+    @staticmethod
+    def _get_message_files(messages: Sequence[Message]) -> dict[str, list[MessageFile]]:
+        message_files: dict[str, list[MessageFile]] = {}
+        if not messages:
+            return message_files
+        files = db.session.scalars(
+            select(MessageFile).where(MessageFile.message_id.in_([message.id for message in messages]))
+        ).all()
+        for file in files:
+            message_files.setdefault(file.message_id, []).append(file)
+        return message_files
+
+    def _get_file_extra_configs(self, messages: Sequence[Message]) -> dict[str, Optional[FileUploadConfig]]:
+        """
+        Get the file upload config of each message with files, resolving it once per app config or workflow.
+        """
+        if not messages:
+            return {}
+
+        if self.conversation.mode in {AppMode.AGENT_CHAT, AppMode.COMPLETION, AppMode.CHAT}:
+            file_extra_config = FileUploadConfigManager.convert(self.conversation.model_config)
+            return {message.id: file_extra_config for message in messages}
+        if self.conversation.mode not in {AppMode.ADVANCED_CHAT, AppMode.WORKFLOW}:
+            raise AssertionError(f"Invalid app mode: {self.conversation.mode}")
+
+        workflow_run_ids: dict[str, str] = {}
+        for message in messages:
+            if not message.workflow_run_id:
+                raise ValueError(f"Workflow run not found: {message.workflow_run_id}")
+            workflow_run_ids[message.id] = message.workflow_run_id
+
+        workflow_ids_by_run = dict(
+            db.session.execute(
+                select(WorkflowRun.id, WorkflowRun.workflow_id).where(
+                    WorkflowRun.id.in_(set(workflow_run_ids.values()))
+                )
+            )
+            .tuples()
+            .all()
+        )
+        for workflow_run_id in workflow_run_ids.values():
+            if workflow_run_id not in workflow_ids_by_run:
+                raise ValueError(f"Workflow run not found: {workflow_run_id}")
+
+        workflow_configs = self._get_workflow_file_upload_configs(set(workflow_ids_by_run.values()))
+        return {
+            message_id: workflow_configs[workflow_ids_by_run[workflow_run_id]]
+            for message_id, workflow_run_id in workflow_run_ids.items()
+        }
+
+    @staticmethod
+    def _get_workflow_file_upload_configs(workflow_ids: set[str]) -> dict[str, Optional[FileUploadConfig]]:
+        with _workflow_file_upload_configs_lock:
+            configs = {
+                workflow_id: _workflow_file_upload_configs[workflow_id]
+                for workflow_id in workflow_ids
+                if workflow_id in _workflow_file_upload_configs
+            }
+        missing_ids = workflow_ids - configs.keys()
+        if not missing_ids:
+            return configs
+
+        workflows = {
+            workflow.id: workflow
+            for workflow in db.session.scalars(select(Workflow).where(Workflow.id.in_(missing_ids))).all()
+        }
+        for workflow_id in missing_ids:
+            workflow = workflows.get(workflow_id)
+            if not workflow:
+                raise ValueError(f"Workflow not found: {workflow_id}")
+            configs[workflow_id] = FileUploadConfigManager.convert(workflow.features_dict, is_vision=False)
+            # published workflow versions never change, the draft is edited in place
+            if workflow.version != Workflow.VERSION_DRAFT:
+                with _workflow_file_upload_configs_lock:
+                    _workflow_file_upload_configs[workflow_id] = configs[workflow_id]
+        return configs
+
+    def _token_count_key(self, message_id: str, part: str) -> str:
+        return (
+            f"token_buffer_memory:token_count:{self.model_instance.provider}:{self.model_instance.model}:"
+            f"{message_id}:{part}"
+        )
+
+    @staticmethod
+    def _get_cached_token_counts(keys: Sequence[str]) -> list[Optional[int]]:
+        try:
+            cached = redis_client.mget(keys)
+        except Exception:
+            logger.exception("Failed to get cached token counts")
+            return [None] * len(keys)
+        return [None if count is None else int(count) for count in cached]
+
+    def _get_token_counts(
+        self, prompt_messages: Sequence[PromptMessage], keys: Sequence[str], cached_counts: Sequence[Optional[int]]
+    ) -> list[int]:
+        """
+        Get the token count of each prompt message, counting and caching the ones without a cached count.
+        """
+        token_counts: list[int] = []
+        missing: dict[str, int] = {}
+        for prompt_message, key, cached_count in zip(prompt_messages, keys, cached_counts):
+            if cached_count is not None:
+                token_counts.append(cached_count)
+                continue
+            token_count = self._count_tokens(prompt_message)
+            token_counts.append(token_count)
+            missing[key] = token_count
+
+        if missing:
+            try:
+                with redis_client.pipeline(transaction=False) as pipe:
+                    for key, token_count in missing.items():
+                        pipe.setex(key, _TOKEN_COUNT_CACHE_TTL, token_count)
+                    pipe.execute()
+            except Exception:
+                logger.exception("Failed to cache token counts")
+        return token_counts
+
+    def _count_tokens(self, prompt_message: PromptMessage) -> int:
+        if dify_config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED:
+            return self.model_instance.get_llm_num_tokens([prompt_message])
+
+        # local estimation only counts the text, file contents are not tokenized
+        if isinstance(prompt_message.content, list):
+            text = "\n".join(
+                content.data for content in prompt_message.content if isinstance(content, TextPromptMessageContent)
+            )
+        else:
+            text = prompt_message.content or ""
+        return GPT2Tokenizer.get_num_tokens(text)
+
     def get_history_prompt_text(
         self,
         human_prefix: str = "Human",
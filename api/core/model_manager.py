@@ -7,6 +7,7 @@ from core.entities.embedding_type import EmbeddingInputType
 from core.entities.provider_configuration import ProviderConfiguration, ProviderModelBundle
 from core.entities.provider_entities import ModelLoadBalancingConfiguration
 from core.errors.error import ProviderTokenNotInitError
+from core.helper.model_lb_scheduler import ModelLBScheduler
 from core.model_runtime.callbacks.base_callback import Callback
 from core.model_runtime.entities.llm_entities import LLMResult
 from core.model_runtime.entities.message_entities import PromptMessage, PromptMessageTool
@@ -495,6 +496,14 @@ class LBModelManager:
                 else:
                     load_balancing_config.credentials = managed_credentials
 
+    @property
+    def config_count(self) -> int:
+        """
+        Number of load balancing configs requests are distributed over
+        :return:
+        """
+        return len(self._load_balancing_configs)
+
     def fetch_next(self) -> Optional[ModelLoadBalancingConfiguration]:
         """
         Get next model load balancing config
@@ -505,6 +514,14 @@ class LBModelManager:
             self._tenant_id, self._provider, self._model_type.value, self._model
         )
 
+        if dify_config.MODEL_LB_LOCAL_SCHEDULER_ENABLED:
+            local_config = ModelLBScheduler.select(
+                cache_key, self._load_balancing_configs, lambda config: not self.in_cooldown(config)
+            )
+            if local_config:
+                self._log_fetched(local_config)
+            return local_config
+
         cooldown_load_balancing_configs = []
         max_index = len(self._load_balancing_configs)
 
@@ -533,24 +550,26 @@ class LBModelManager:
 
                 continue
 
-            if dify_config.DEBUG:
-                logger.info(
-                    """Model LB
+            self._log_fetched(config)
+            return config
+
+    def _log_fetched(self, config: ModelLoadBalancingConfiguration) -> None:
+        if dify_config.DEBUG:
+            logger.info(
+                """Model LB
 id: %s
 name:%s
 tenant_id: %s
 provider: %s
 model_type: %s
 model: %s""",
-                    config.id,
-                    config.name,
-                    self._tenant_id,
-                    self._provider,
-                    self._model_type.value,
-                    self._model,
-                )
-
-            return config
+                config.id,
+                config.name,
+                self._tenant_id,
+                self._provider,
+                self._model_type.value,
+                self._model,
+            )
 
     def cooldown(self, config: ModelLoadBalancingConfiguration, expire: int = 60) -> None:
         """
@@ -563,6 +582,10 @@ model: %s""",
             self._tenant_id, self._provider, self._model_type.value, self._model, config.id
         )
 
+        if dify_config.MODEL_LB_LOCAL_SCHEDULER_ENABLED:
+            ModelLBScheduler.cooldown(cooldown_cache_key, expire)
+            return
+
         redis_client.setex(cooldown_cache_key, expire, "true")
 
     def in_cooldown(self, config: ModelLoadBalancingConfiguration) -> bool:
@@ -575,6 +598,9 @@ model: %s""",
             self._tenant_id, self._provider, self._model_type.value, self._model, config.id
         )
 
+        if dify_config.MODEL_LB_LOCAL_SCHEDULER_ENABLED:
+            return ModelLBScheduler.in_cooldown(cooldown_cache_key)
+
         res: bool = redis_client.exists(cooldown_cache_key)
         return res
 
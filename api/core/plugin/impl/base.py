@@ -1,12 +1,22 @@
 import inspect
 import json
 import logging
+import socket
+import threading
+from collections import deque
 from collections.abc import Callable, Generator
-from typing import TypeVar
+from decimal import Decimal
+from pathlib import PurePath
+from types import GeneratorType
+from typing import Any, Optional, TypeVar
 
+import orjson
 import requests
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3 import HTTPConnectionPool
+from urllib3.connection import HTTPConnection
 from yarl import URL
 
 from configs import dify_config
@@ -18,6 +28,7 @@ from core.model_runtime.errors.invoke import (
     InvokeServerUnavailableError,
 )
 from core.model_runtime.errors.validate import CredentialsValidateFailedError
+from core.model_runtime.utils.encoders import jsonable_encoder
 from core.plugin.endpoint.exc import EndpointSetupFailedError
 from core.plugin.entities.plugin_daemon import PluginDaemonBasicResponse, PluginDaemonError, PluginDaemonInnerError
 from core.plugin.impl.exc import (
@@ -38,6 +49,89 @@ T = TypeVar("T", bound=(BaseModel | dict | list | bool | str))
 logger = logging.getLogger(__name__)
 
 
+class _UnixSocketConnection(HTTPConnection):
+    def __init__(self, *args: Any, socket_path: str, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._socket_path = socket_path
+
+    def _new_conn(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if isinstance(self.timeout, int | float):
+            sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        return sock
+
+
+class _UnixSocketConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _UnixSocketConnection
+
+
+class _UnixSocketAdapter(HTTPAdapter):
+    """
+    Sends the requests of a session mounted on the plugin daemon URL over a unix socket, for a co-located daemon.
+    """
+
+    def __init__(self, socket_path: str, pool_maxsize: int) -> None:
+        super().__init__(pool_maxsize=pool_maxsize)
+        self._unix_pool = _UnixSocketConnectionPool("localhost", maxsize=pool_maxsize, socket_path=socket_path)
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self._unix_pool
+
+    def get_connection(self, url, proxies=None):
+        return self._unix_pool
+
+    def close(self) -> None:
+        super().close()
+        self._unix_pool.close()
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """
+    Session shared by all plugin daemon requests, keeping connections to the daemon alive between calls.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                pool_maxsize = dify_config.PLUGIN_DAEMON_POOL_MAX_SIZE
+                if dify_config.PLUGIN_DAEMON_UNIX_SOCKET:
+                    adapter: HTTPAdapter = _UnixSocketAdapter(dify_config.PLUGIN_DAEMON_UNIX_SOCKET, pool_maxsize)
+                else:
+                    adapter = HTTPAdapter(pool_maxsize=pool_maxsize)
+                session.mount(str(plugin_daemon_inner_api_baseurl), adapter)
+                _session = session
+    return _session
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    if isinstance(obj, Decimal):
+        return format(obj, "f")
+    if isinstance(obj, PurePath):
+        return str(obj)
+    if isinstance(obj, set | frozenset | deque | GeneratorType):
+        return list(obj)
+    return jsonable_encoder(obj)
+
+
+def _dump_json(data: Any) -> bytes:
+    """
+    Encode a request body in one pass, models included, producing the same JSON as jsonable_encoder.
+    """
+    try:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits
+        return json.dumps(jsonable_encoder(data)).encode()
+
+
 class BasePluginClient:
     def _request(
         self,
@@ -58,10 +152,10 @@ class BasePluginClient:
         headers["Accept-Encoding"] = "gzip, deflate, br"
 
         if headers.get("Content-Type") == "application/json" and isinstance(data, dict):
-            data = json.dumps(data)
+            data = _dump_json(data)
 
         try:
-            response = requests.request(
+            response = _get_session().request(
                 method=method, url=str(url), headers=headers, data=data, params=params, stream=stream, files=files
             )
         except requests.exceptions.ConnectionError:
@@ -84,8 +178,8 @@ class BasePluginClient:
         """
         response = self._request(method, path, headers, data, params, files, stream=True)
         for line in response.iter_lines(chunk_size=1024 * 8):
-            line = line.decode("utf-8").strip()
-            if line.startswith("data:"):
+            line = line.strip()
+            if line.startswith(b"data:"):
                 line = line[5:].strip()
             if line:
                 yield line
@@ -104,7 +198,7 @@ class BasePluginClient:
         Make a stream request to the plugin daemon inner API and yield the response as a model.
         """
         for line in self._stream_request(method, path, params, headers, data, files):
-            yield type(**json.loads(line))  # type: ignore
+            yield type(**orjson.loads(line))  # type: ignore
 
     def _request_with_model(
         self,
@@ -120,7 +214,7 @@ class BasePluginClient:
         Make a request to the plugin daemon inner API and return the response as a model.
         """
         response = self._request(method, path, headers, data, params, files)
-        return type(**response.json())  # type: ignore
+        return type(**orjson.loads(response.content))  # type: ignore
 
     def _request_with_plugin_daemon_response(
         self,
@@ -149,7 +243,7 @@ class BasePluginClient:
             raise ValueError(msg) from e
 
         try:
-            json_response = response.json()
+            json_response = orjson.loads(response.content)
             if transformer:
                 json_response = transformer(json_response)
             rep = PluginDaemonBasicResponse[type](**json_response)  # type: ignore
@@ -193,13 +287,13 @@ class BasePluginClient:
             except (ValueError, TypeError):
                 # TODO modify this when line_data has code and message
                 try:
-                    line_data = json.loads(line)
+                    line_data = orjson.loads(line)
                 except (ValueError, TypeError):
-                    raise ValueError(line)
+                    raise ValueError(line.decode("utf-8", errors="replace"))
                 # If the dictionary contains the `error` key, use its value as the argument
                 # for `ValueError`.
                 # Otherwise, use the `line` to provide better contextual information about the error.
-                raise ValueError(line_data.get("error", line))
+                raise ValueError(line_data.get("error", line.decode("utf-8", errors="replace")))
 
             if rep.code != 0:
                 if rep.code == -500:
@@ -7,7 +7,6 @@ from core.model_runtime.entities.message_entities import PromptMessage, PromptMe
 from core.model_runtime.entities.model_entities import AIModelEntity
 from core.model_runtime.entities.rerank_entities import RerankResult
 from core.model_runtime.entities.text_embedding_entities import TextEmbeddingResult
-from core.model_runtime.utils.encoders import jsonable_encoder
 from core.plugin.entities.plugin_daemon import (
     PluginBasicBooleanResponse,
     PluginDaemonInnerError,
@@ -163,22 +162,20 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/llm/invoke",
             type=LLMResultChunk,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "llm",
-                        "model": model,
-                        "credentials": credentials,
-                        "prompt_messages": prompt_messages,
-                        "model_parameters": model_parameters,
-                        "tools": tools,
-                        "stop": stop,
-                        "stream": stream,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "llm",
+                    "model": model,
+                    "credentials": credentials,
+                    "prompt_messages": prompt_messages,
+                    "model_parameters": model_parameters,
+                    "tools": tools,
+                    "stop": stop,
+                    "stream": stream,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -209,19 +206,17 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/llm/num_tokens",
             type=PluginLLMNumTokensResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": model_type,
-                        "model": model,
-                        "credentials": credentials,
-                        "prompt_messages": prompt_messages,
-                        "tools": tools,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": model_type,
+                    "model": model,
+                    "credentials": credentials,
+                    "prompt_messages": prompt_messages,
+                    "tools": tools,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -251,19 +246,17 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/text_embedding/invoke",
             type=TextEmbeddingResult,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "text-embedding",
-                        "model": model,
-                        "credentials": credentials,
-                        "texts": texts,
-                        "input_type": input_type,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "text-embedding",
+                    "model": model,
+                    "credentials": credentials,
+                    "texts": texts,
+                    "input_type": input_type,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -292,18 +285,16 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/text_embedding/num_tokens",
             type=PluginTextEmbeddingNumTokensResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "text-embedding",
-                        "model": model,
-                        "credentials": credentials,
-                        "texts": texts,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "text-embedding",
+                    "model": model,
+                    "credentials": credentials,
+                    "texts": texts,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -335,21 +326,19 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/rerank/invoke",
             type=RerankResult,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "rerank",
-                        "model": model,
-                        "credentials": credentials,
-                        "query": query,
-                        "docs": docs,
-                        "score_threshold": score_threshold,
-                        "top_n": top_n,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "rerank",
+                    "model": model,
+                    "credentials": credentials,
+                    "query": query,
+                    "docs": docs,
+                    "score_threshold": score_threshold,
+                    "top_n": top_n,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -379,20 +368,18 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/tts/invoke",
             type=PluginStringResultResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "tts",
-                        "model": model,
-                        "credentials": credentials,
-                        "tenant_id": tenant_id,
-                        "content_text": content_text,
-                        "voice": voice,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "tts",
+                    "model": model,
+                    "credentials": credentials,
+                    "tenant_id": tenant_id,
+                    "content_text": content_text,
+                    "voice": voice,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -423,18 +410,16 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/tts/model/voices",
             type=PluginVoicesResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "tts",
-                        "model": model,
-                        "credentials": credentials,
-                        "language": language,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "tts",
+                    "model": model,
+                    "credentials": credentials,
+                    "language": language,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -467,18 +452,16 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/speech2text/invoke",
             type=PluginStringResultResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "speech2text",
-                        "model": model,
-                        "credentials": credentials,
-                        "file": binascii.hexlify(file.read()).decode(),
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "speech2text",
+                    "model": model,
+                    "credentials": credentials,
+                    "file": binascii.hexlify(file.read()).decode(),
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -507,18 +490,16 @@ class PluginModelClient(BasePluginClient):
             method="POST",
             path=f"plugin/{tenant_id}/dispatch/moderation/invoke",
             type=PluginBasicBooleanResponse,
-            data=jsonable_encoder(
-                {
-                    "user_id": user_id,
-                    "data": {
-                        "provider": provider,
-                        "model_type": "moderation",
-                        "model": model,
-                        "credentials": credentials,
-                        "text": text,
-                    },
-                }
-            ),
+            data={
+                "user_id": user_id,
+                "data": {
+                    "provider": provider,
+                    "model_type": "moderation",
+                    "model": model,
+                    "credentials": credentials,
+                    "text": text,
+                },
+            },
             headers={
                 "X-Plugin-ID": plugin_id,
                 "Content-Type": "application/json",
@@ -24,6 +24,7 @@ from core.entities.provider_entities import (
 from core.helper import encrypter
 from core.helper.model_provider_cache import ProviderCredentialsCache, ProviderCredentialsCacheType
 from core.helper.position_helper import is_filtered
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.model_runtime.entities.model_entities import ModelType
 from core.model_runtime.entities.provider_entities import (
     ConfigurateMethod,
@@ -91,6 +92,18 @@ class ProviderManager:
         - Get provider instance
         - Switch selection priority
 
+        The configurations are cached per process until a provider row of the workspace changes, see
+        ProviderConfigurationsCache. They are shared by all requests and must not be modified.
+
+        :param tenant_id:
+        :return:
+        """
+        return ProviderConfigurationsCache.get(tenant_id, lambda: self._build_configurations(tenant_id))
+
+    def _build_configurations(self, tenant_id: str) -> ProviderConfigurations:
+        """
+        Build model provider configurations from the provider records of the workspace.
+
         :param tenant_id:
         :return:
         """
@@ -91,24 +91,31 @@ class Jieba(BaseKeyword):
         document_ids_filter = kwargs.get("document_ids_filter")
         sorted_chunk_indices = self._retrieve_ids_by_query(keyword_table or {}, query, k)
 
+        if not sorted_chunk_indices:
+            return []
+
+        # fetch all matched segments at once, then keep the rank order of the keyword table
+        segment_query = db.session.query(DocumentSegment).where(
+            DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.index_node_id.in_(sorted_chunk_indices)
+        )
+        if document_ids_filter:
+            segment_query = segment_query.where(DocumentSegment.document_id.in_(document_ids_filter))
+        segments: dict[str, DocumentSegment] = {}
+        for segment in segment_query.all():
+            segments.setdefault(segment.index_node_id, segment)
+
         documents = []
         for chunk_index in sorted_chunk_indices:
-            segment_query = db.session.query(DocumentSegment).where(
-                DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.index_node_id == chunk_index
-            )
-            if document_ids_filter:
-                segment_query = segment_query.where(DocumentSegment.document_id.in_(document_ids_filter))
-            segment = segment_query.first()
-
-            if segment:
+            matched_segment = segments.get(chunk_index)
+            if matched_segment:
                 documents.append(
                     Document(
-                        page_content=segment.content,
+                        page_content=matched_segment.content,
                         metadata={
                             "doc_id": chunk_index,
-                            "doc_hash": segment.index_node_hash,
-                            "document_id": segment.document_id,
-                            "dataset_id": segment.dataset_id,
+                            "doc_hash": matched_segment.index_node_hash,
+                            "document_id": matched_segment.document_id,
+                            "dataset_id": matched_segment.dataset_id,
                         },
                     )
                 )
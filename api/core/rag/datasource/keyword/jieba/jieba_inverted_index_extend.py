@@ -0,0 +1,186 @@
+from collections.abc import Iterable
+from typing import Any
+
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from core.rag.datasource.keyword.jieba.jieba import Jieba
+from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.models.document import Document
+from extensions.ext_database import db
+from models.dataset import DocumentSegment
+from models.dataset_keyword_extend import DatasetKeywordPostingExtend
+
+# 批量写入、删除倒排索引时每条语句处理的行数
+_BATCH_SIZE = 1000
+
+
+class JiebaInvertedIndexExtend(Jieba):
+    """
+    基于倒排表的 Jieba 关键词索引。
+
+    关键词表按 (数据集, 关键词, 分段节点ID) 一行存储在 DatasetKeywordPostingExtend 中，
+    增删分段只写入 / 删除涉及的行，检索在数据库中按命中关键词数排序取 top k，
+    不再需要加载、反序列化整个数据集的关键词表，也不需要数据集级别的锁。
+    """
+
+    def create(self, texts: list[Document], **kwargs):
+        self.add_texts(texts, **kwargs)
+        return self
+
+    def add_texts(self, texts: list[Document], **kwargs):
+        keyword_table_handler = JiebaKeywordTableHandler()
+        keywords_list = kwargs.get("keywords_list")
+        segment_keywords: dict[str, list[str]] = {}
+        for i, text in enumerate(texts):
+            keywords = keywords_list[i] if keywords_list else None
+            if not keywords:
+                keywords = keyword_table_handler.extract_keywords(
+                    text.page_content, self._config.max_keywords_per_chunk
+                )
+            if text.metadata is not None:
+                segment_keywords[text.metadata["doc_id"]] = list(keywords)
+
+        self._update_segments_keywords(segment_keywords)
+        self._add_postings(segment_keywords)
+
+    def text_exists(self, id: str) -> bool:
+        return bool(
+            db.session.scalar(
+                select(
+                    exists().where(
+                        DatasetKeywordPostingExtend.dataset_id == self.dataset.id,
+                        DatasetKeywordPostingExtend.node_id == id,
+                    )
+                )
+            )
+        )
+
+    def delete_by_ids(self, ids: list[str]) -> None:
+        for i in range(0, len(ids), _BATCH_SIZE):
+            db.session.execute(
+                delete(DatasetKeywordPostingExtend).where(
+                    DatasetKeywordPostingExtend.dataset_id == self.dataset.id,
+                    DatasetKeywordPostingExtend.node_id.in_(ids[i : i + _BATCH_SIZE]),
+                )
+            )
+        db.session.commit()
+
+    def search(self, query: str, **kwargs: Any) -> list[Document]:
+        k = kwargs.get("top_k", 4)
+        document_ids_filter = kwargs.get("document_ids_filter")
+        node_ids = self._retrieve_node_ids_by_query(query, k, document_ids_filter)
+        if not node_ids:
+            return []
+
+        segment_query = select(DocumentSegment).where(
+            DocumentSegment.dataset_id == self.dataset.id, DocumentSegment.index_node_id.in_(node_ids)
+        )
+        if document_ids_filter:
+            segment_query = segment_query.where(DocumentSegment.document_id.in_(document_ids_filter))
+        segments = {segment.index_node_id: segment for segment in db.session.scalars(segment_query)}
+
+        documents = []
+        for node_id in node_ids:
+            segment = segments.get(node_id)
+            if segment:
+                documents.append(
+                    Document(
+                        page_content=segment.content,
+                        metadata={
+                            "doc_id": node_id,
+                            "doc_hash": segment.index_node_hash,
+                            "document_id": segment.document_id,
+                            "dataset_id": segment.dataset_id,
+                        },
+                    )
+                )
+        return documents
+
+    def delete(self) -> None:
+        db.session.execute(
+            delete(DatasetKeywordPostingExtend).where(DatasetKeywordPostingExtend.dataset_id == self.dataset.id)
+        )
+        db.session.commit()
+
+    def create_segment_keywords(self, node_id: str, keywords: list[str]):
+        self._update_segments_keywords({node_id: keywords})
+        self._add_postings({node_id: keywords})
+
+    def multi_create_segment_keywords(self, pre_segment_data_list: list):
+        keyword_table_handler = JiebaKeywordTableHandler()
+        segment_keywords: dict[str, list[str]] = {}
+        for pre_segment_data in pre_segment_data_list:
+            segment = pre_segment_data["segment"]
+            if pre_segment_data["keywords"]:
+                segment.keywords = pre_segment_data["keywords"]
+            else:
+                segment.keywords = list(
+                    keyword_table_handler.extract_keywords(segment.content, self._config.max_keywords_per_chunk)
+                )
+            segment_keywords[segment.index_node_id] = segment.keywords
+        self._add_postings(segment_keywords)
+
+    def update_segment_keywords_index(self, node_id: str, keywords: list[str]):
+        self._add_postings({node_id: keywords})
+
+    def add_keyword_table(self, keyword_table: dict[str, Iterable[str]]) -> None:
+        """把旧的 JSON 关键词表（关键词 -> 节点ID集合）写入倒排表，用于从 jieba 关键词存储迁移"""
+        rows = [
+            {"dataset_id": self.dataset.id, "keyword": keyword, "node_id": node_id}
+            for keyword, node_ids in keyword_table.items()
+            for node_id in node_ids
+        ]
+        self._insert_postings(rows)
+
+    def _retrieve_node_ids_by_query(self, query: str, k: int, document_ids_filter: list[str] | None) -> list[str]:
+        keyword_table_handler = JiebaKeywordTableHandler()
+        keywords = list(keyword_table_handler.extract_keywords(query))
+        if not keywords:
+            return []
+
+        posting = DatasetKeywordPostingExtend
+        match_count = func.count().label("match_count")
+        stmt = (
+            select(posting.node_id, match_count)
+            .where(posting.dataset_id == self.dataset.id, posting.keyword.in_(keywords))
+            .group_by(posting.node_id)
+            .order_by(match_count.desc(), posting.node_id)
+            .limit(k)
+        )
+        if document_ids_filter:
+            # 先按文档过滤再取 top k，避免过滤后结果不足 k 条
+            stmt = stmt.join(
+                DocumentSegment,
+                (DocumentSegment.dataset_id == posting.dataset_id) & (DocumentSegment.index_node_id == posting.node_id),
+            ).where(DocumentSegment.document_id.in_(document_ids_filter))
+        return [node_id for node_id, _ in db.session.execute(stmt)]
+
+    def _update_segments_keywords(self, segment_keywords: dict[str, list[str]]) -> None:
+        node_ids = list(segment_keywords)
+        for i in range(0, len(node_ids), _BATCH_SIZE):
+            segments = db.session.scalars(
+                select(DocumentSegment).where(
+                    DocumentSegment.dataset_id == self.dataset.id,
+                    DocumentSegment.index_node_id.in_(node_ids[i : i + _BATCH_SIZE]),
+                )
+            )
+            for segment in segments:
+                segment.keywords = segment_keywords[segment.index_node_id]
+        db.session.commit()
+
+    def _add_postings(self, segment_keywords: dict[str, list[str]]) -> None:
+        rows = [
+            {"dataset_id": self.dataset.id, "keyword": keyword, "node_id": node_id}
+            for node_id, keywords in segment_keywords.items()
+            for keyword in set(keywords)
+        ]
+        self._insert_postings(rows)
+
+    @staticmethod
+    def _insert_postings(rows: list[dict[str, str]]) -> None:
+        for i in range(0, len(rows), _BATCH_SIZE):
+            db.session.execute(
+                insert(DatasetKeywordPostingExtend).values(rows[i : i + _BATCH_SIZE]).on_conflict_do_nothing()
+            )
+        db.session.commit()
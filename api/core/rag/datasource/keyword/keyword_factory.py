@@ -24,6 +24,12 @@ class Keyword:
                 from core.rag.datasource.keyword.jieba.jieba import Jieba
 
                 return Jieba
+            # ---------------------- 二开部分Begin - 关键词倒排索引 ----------------------
+            case KeyWordType.JIEBA_INVERTED_INDEX:
+                from core.rag.datasource.keyword.jieba.jieba_inverted_index_extend import JiebaInvertedIndexExtend
+
+                return JiebaInvertedIndexExtend
+            # ---------------------- 二开部分End - 关键词倒排索引 ----------------------
             case _:
                 raise ValueError(f"Keyword store {keyword_type} is not supported.")
 
@@ -3,3 +3,4 @@ from enum import StrEnum
 
 class KeyWordType(StrEnum):
     JIEBA = "jieba"
+    JIEBA_INVERTED_INDEX = "jieba_inverted_index"  # 二开部分 - 关键词倒排索引
@@ -303,6 +303,58 @@ class RetrievalService:
             include_segment_ids = set()
             segment_child_map = {}
 
+            # Batch query child chunks, their parent segments and normal segments instead of one query per document
+            child_index_node_ids = set()
+            index_node_ids = set()
+            for document in documents:
+                dataset_document = dataset_documents.get(document.metadata.get("document_id"))
+                if not dataset_document or not document.metadata.get("doc_id"):
+                    continue
+                if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
+                    child_index_node_ids.add(document.metadata["doc_id"])
+                else:
+                    index_node_ids.add(document.metadata["doc_id"])
+            dataset_ids = {dataset_document.dataset_id for dataset_document in dataset_documents.values()}
+
+            child_chunks_by_node: dict[str, ChildChunk] = {}
+            if child_index_node_ids:
+                for child_chunk in db.session.query(ChildChunk).where(
+                    ChildChunk.index_node_id.in_(child_index_node_ids)
+                ):
+                    child_chunks_by_node.setdefault(child_chunk.index_node_id, child_chunk)
+
+            parent_segments: dict[str, DocumentSegment] = {}
+            parent_segment_ids = {child_chunk.segment_id for child_chunk in child_chunks_by_node.values()}
+            if parent_segment_ids:
+                parent_segments = {
+                    segment.id: segment
+                    for segment in db.session.query(DocumentSegment)
+                    .where(
+                        DocumentSegment.dataset_id.in_(dataset_ids),
+                        DocumentSegment.enabled == True,
+                        DocumentSegment.status == "completed",
+                        DocumentSegment.id.in_(parent_segment_ids),
+                    )
+                    .options(
+                        load_only(
+                            DocumentSegment.id,
+                            DocumentSegment.dataset_id,
+                            DocumentSegment.content,
+                            DocumentSegment.answer,
+                        )
+                    )
+                }
+
+            segments_by_node: dict[tuple[str, str], DocumentSegment] = {}
+            if index_node_ids:
+                for segment in db.session.query(DocumentSegment).where(
+                    DocumentSegment.dataset_id.in_(dataset_ids),
+                    DocumentSegment.enabled == True,
+                    DocumentSegment.status == "completed",
+                    DocumentSegment.index_node_id.in_(index_node_ids),
+                ):
+                    segments_by_node.setdefault((segment.dataset_id, segment.index_node_id), segment)
+
             # Process documents
             for document in documents:
                 document_id = document.metadata.get("document_id")
@@ -316,62 +368,46 @@ class RetrievalService:
                 if dataset_document.doc_form == IndexType.PARENT_CHILD_INDEX:
                     # Handle parent-child documents
                     child_index_node_id = document.metadata.get("doc_id")
+                    if not child_index_node_id:
+                        continue
 
-                    child_chunk = (
-                        db.session.query(ChildChunk).where(ChildChunk.index_node_id == child_index_node_id).first()
-                    )
+                    matched_chunk = child_chunks_by_node.get(child_index_node_id)
 
-                    if not child_chunk:
+                    if not matched_chunk:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .where(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.id == child_chunk.segment_id,
-                        )
-                        .options(
-                            load_only(
-                                DocumentSegment.id,
-                                DocumentSegment.content,
-                                DocumentSegment.answer,
-                            )
-                        )
-                        .first()
-                    )
+                    matched_segment = parent_segments.get(matched_chunk.segment_id)
 
-                    if not segment:
+                    if not matched_segment or matched_segment.dataset_id != dataset_document.dataset_id:
                         continue
 
-                    if segment.id not in include_segment_ids:
-                        include_segment_ids.add(segment.id)
+                    if matched_segment.id not in include_segment_ids:
+                        include_segment_ids.add(matched_segment.id)
                         child_chunk_detail = {
-                            "id": child_chunk.id,
-                            "content": child_chunk.content,
-                            "position": child_chunk.position,
+                            "id": matched_chunk.id,
+                            "content": matched_chunk.content,
+                            "position": matched_chunk.position,
                             "score": document.metadata.get("score", 0.0),
                         }
                         map_detail = {
                             "max_score": document.metadata.get("score", 0.0),
                             "child_chunks": [child_chunk_detail],
                         }
-                        segment_child_map[segment.id] = map_detail
+                        segment_child_map[matched_segment.id] = map_detail
                         record = {
-                            "segment": segment,
+                            "segment": matched_segment,
                         }
                         records.append(record)
                     else:
                         child_chunk_detail = {
-                            "id": child_chunk.id,
-                            "content": child_chunk.content,
-                            "position": child_chunk.position,
+                            "id": matched_chunk.id,
+                            "content": matched_chunk.content,
+                            "position": matched_chunk.position,
                             "score": document.metadata.get("score", 0.0),
                         }
-                        segment_child_map[segment.id]["child_chunks"].append(child_chunk_detail)
-                        segment_child_map[segment.id]["max_score"] = max(
-                            segment_child_map[segment.id]["max_score"], document.metadata.get("score", 0.0)
+                        segment_child_map[matched_segment.id]["child_chunks"].append(child_chunk_detail)
+                        segment_child_map[matched_segment.id]["max_score"] = max(
+                            segment_child_map[matched_segment.id]["max_score"], document.metadata.get("score", 0.0)
                         )
                 else:
                     # Handle normal documents
@@ -379,23 +415,14 @@ class RetrievalService:
                     if not index_node_id:
                         continue
 
-                    segment = (
-                        db.session.query(DocumentSegment)
-                        .where(
-                            DocumentSegment.dataset_id == dataset_document.dataset_id,
-                            DocumentSegment.enabled == True,
-                            DocumentSegment.status == "completed",
-                            DocumentSegment.index_node_id == index_node_id,
-                        )
-                        .first()
-                    )
+                    matched_segment = segments_by_node.get((dataset_document.dataset_id, index_node_id))
 
-                    if not segment:
+                    if not matched_segment:
                         continue
 
-                    include_segment_ids.add(segment.id)
+                    include_segment_ids.add(matched_segment.id)
                     record = {
-                        "segment": segment,
+                        "segment": matched_segment,
                         "score": document.metadata.get("score"),  # type: ignore
                     }
                     records.append(record)
@@ -235,7 +235,7 @@ class Vector:
             model_type=ModelType.TEXT_EMBEDDING,
             model=self._dataset.embedding_model,
         )
-        return CacheEmbedding(embedding_model)
+        return CacheEmbedding(embedding_model, dataset_id=self._dataset.id)
 
     def _filter_duplicate_texts(self, texts: list[Document]) -> list[Document]:
         for text in texts.copy():
@@ -1,9 +1,12 @@
 import base64
 import logging
+import threading
 from typing import Any, Optional, cast
 
 import numpy as np
-from sqlalchemy.exc import IntegrityError
+from cachetools import LRUCache
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 
 from configs import dify_config
 from core.entities.embedding_type import EmbeddingInputType
@@ -11,6 +14,7 @@ from core.model_manager import ModelInstance
 from core.model_runtime.entities.model_entities import ModelPropertyKey
 from core.model_runtime.model_providers.__base.text_embedding_model import TextEmbeddingModel
 from core.rag.embedding.embedding_base import Embeddings
+from core.rag.embedding.embedding_pipeline import EmbeddingBatchPipeline
 from extensions.ext_database import db
 from extensions.ext_redis import redis_client
 from libs import helper
@@ -18,28 +22,33 @@ from models.dataset import Embedding
 
 logger = logging.getLogger(__name__)
 
+# hash IN (...) lookups and inserts against the embeddings table are split into chunks of this size
+_DB_BATCH_SIZE = 1000
+
+_document_embedding_cache: LRUCache[tuple[str, str, str], bytes] = LRUCache(
+    maxsize=max(dify_config.DOCUMENT_EMBEDDING_CACHE_MAX_SIZE, 1)
+)
+_document_embedding_cache_lock = threading.Lock()
+
 
 class CacheEmbedding(Embeddings):
-    def __init__(self, model_instance: ModelInstance, user: Optional[str] = None) -> None:
+    def __init__(
+        self, model_instance: ModelInstance, user: Optional[str] = None, dataset_id: Optional[str] = None
+    ) -> None:
         self._model_instance = model_instance
         self._user = user
+        self._dataset_id = dataset_id
 
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
         """Embed search docs in batches of 10."""
         # use doc embedding cache or store if not exists
         text_embeddings: list[Any] = [None for _ in range(len(texts))]
+        text_hashes = [helper.generate_text_hash(text) for text in texts]
+        cached_embeddings = self._get_document_embeddings(set(text_hashes))
         embedding_queue_indices = []
-        for i, text in enumerate(texts):
-            hash = helper.generate_text_hash(text)
-            embedding = (
-                db.session.query(Embedding)
-                .filter_by(
-                    model_name=self._model_instance.model, hash=hash, provider_name=self._model_instance.provider
-                )
-                .first()
-            )
-            if embedding:
-                text_embeddings[i] = embedding.get_embedding()
+        for i, hash in enumerate(text_hashes):
+            if hash in cached_embeddings:
+                text_embeddings[i] = cached_embeddings[hash]
             else:
                 embedding_queue_indices.append(i)
         if embedding_queue_indices:
@@ -55,13 +64,14 @@ class CacheEmbedding(Embeddings):
                     if model_schema and ModelPropertyKey.MAX_CHUNKS in model_schema.model_properties
                     else 1
                 )
-                for i in range(0, len(embedding_queue_texts), max_chunks):
-                    batch_texts = embedding_queue_texts[i : i + max_chunks]
-
-                    embedding_result = self._model_instance.invoke_text_embedding(
-                        texts=batch_texts, user=self._user, input_type=EmbeddingInputType.DOCUMENT
-                    )
+                batches = [
+                    embedding_queue_texts[i : i + max_chunks] for i in range(0, len(embedding_queue_texts), max_chunks)
+                ]
+                embedding_results = EmbeddingBatchPipeline(
+                    self._model_instance, user=self._user, dataset_id=self._dataset_id
+                ).run(batches)
 
+                for embedding_result in embedding_results:
                     for vector in embedding_result.embeddings:
                         try:
                             # FIXME: type ignore for numpy here
@@ -72,27 +82,13 @@ class CacheEmbedding(Embeddings):
                                 logger.warning("Normalized embedding is nan: %s", normalized_embedding)
                                 continue
                             embedding_queue_embeddings.append(normalized_embedding)
-                        except IntegrityError:
-                            db.session.rollback()
                         except Exception:
                             logging.exception("Failed transform embedding")
-                cache_embeddings = []
-                try:
-                    for i, n_embedding in zip(embedding_queue_indices, embedding_queue_embeddings):
-                        text_embeddings[i] = n_embedding
-                        hash = helper.generate_text_hash(texts[i])
-                        if hash not in cache_embeddings:
-                            embedding_cache = Embedding(
-                                model_name=self._model_instance.model,
-                                hash=hash,
-                                provider_name=self._model_instance.provider,
-                            )
-                            embedding_cache.set_embedding(n_embedding)
-                            db.session.add(embedding_cache)
-                            cache_embeddings.append(hash)
-                    db.session.commit()
-                except IntegrityError:
-                    db.session.rollback()
+                new_embeddings: dict[str, list[float]] = {}
+                for i, n_embedding in zip(embedding_queue_indices, embedding_queue_embeddings):
+                    text_embeddings[i] = n_embedding
+                    new_embeddings.setdefault(text_hashes[i], n_embedding)
+                self._store_document_embeddings(new_embeddings)
             except Exception as ex:
                 db.session.rollback()
                 logger.exception("Failed to embed documents: %s")
@@ -100,6 +96,96 @@ class CacheEmbedding(Embeddings):
 
         return text_embeddings
 
+    def _document_cache_key(self, hash: str) -> tuple[str, str, str]:
+        return self._model_instance.provider, self._model_instance.model, hash
+
+    def _document_redis_key(self, hash: str) -> str:
+        return f"document_embedding:{self._model_instance.provider}_{self._model_instance.model}_{hash}"
+
+    def _get_document_embeddings(self, hashes: set[str]) -> dict[str, list[float]]:
+        """
+        Look up cached document embeddings by text hash, in order: the per-process LRU cache,
+        Redis, then the embeddings table in chunked `hash IN (...)` queries.
+        """
+        found: dict[str, bytes] = {}
+        if dify_config.DOCUMENT_EMBEDDING_CACHE_MAX_SIZE:
+            with _document_embedding_cache_lock:
+                for hash in hashes:
+                    blob = _document_embedding_cache.get(self._document_cache_key(hash))
+                    if blob is not None:
+                        found[hash] = blob
+
+        missing = [hash for hash in hashes if hash not in found]
+        if missing and dify_config.DOCUMENT_EMBEDDING_CACHE_REDIS_TTL:
+            redis_found: dict[str, bytes] = {}
+            try:
+                blobs = redis_client.mget([self._document_redis_key(hash) for hash in missing])
+                redis_found = {hash: blob for hash, blob in zip(missing, blobs) if blob}
+            except Exception:
+                logger.exception("Failed to get document embeddings from redis")
+            self._cache_document_embeddings(redis_found, to_redis=False)
+            found.update(redis_found)
+            missing = [hash for hash in missing if hash not in redis_found]
+
+        db_found: dict[str, bytes] = {}
+        for i in range(0, len(missing), _DB_BATCH_SIZE):
+            rows = db.session.execute(
+                select(Embedding.hash, Embedding.embedding).where(
+                    Embedding.model_name == self._model_instance.model,
+                    Embedding.provider_name == self._model_instance.provider,
+                    Embedding.hash.in_(missing[i : i + _DB_BATCH_SIZE]),
+                )
+            ).all()
+            for hash, blob in rows:
+                db_found[hash] = blob
+        self._cache_document_embeddings(db_found, to_redis=True)
+        found.update(db_found)
+
+        return {hash: Embedding.decode_embedding(blob) for hash, blob in found.items()}
+
+    def _store_document_embeddings(self, embeddings: dict[str, list[float]]) -> None:
+        if not embeddings:
+            return
+        blobs = {hash: Embedding.encode_embedding(embedding) for hash, embedding in embeddings.items()}
+        rows = [
+            {
+                "model_name": self._model_instance.model,
+                "hash": hash,
+                "provider_name": self._model_instance.provider,
+                "embedding": blob,
+            }
+            for hash, blob in blobs.items()
+        ]
+        try:
+            for i in range(0, len(rows), _DB_BATCH_SIZE):
+                db.session.execute(
+                    insert(Embedding)
+                    .values(rows[i : i + _DB_BATCH_SIZE])
+                    .on_conflict_do_nothing(index_elements=["model_name", "hash", "provider_name"])
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Failed to store document embeddings")
+            return
+        self._cache_document_embeddings(blobs, to_redis=True)
+
+    def _cache_document_embeddings(self, blobs: dict[str, bytes], to_redis: bool) -> None:
+        if not blobs:
+            return
+        if dify_config.DOCUMENT_EMBEDDING_CACHE_MAX_SIZE:
+            with _document_embedding_cache_lock:
+                for hash, blob in blobs.items():
+                    _document_embedding_cache[self._document_cache_key(hash)] = blob
+        if to_redis and dify_config.DOCUMENT_EMBEDDING_CACHE_REDIS_TTL:
+            try:
+                with redis_client.pipeline(transaction=False) as pipe:
+                    for hash, blob in blobs.items():
+                        pipe.setex(self._document_redis_key(hash), dify_config.DOCUMENT_EMBEDDING_CACHE_REDIS_TTL, blob)
+                    pipe.execute()
+            except Exception:
+                logger.exception("Failed to cache document embeddings in redis")
+
     def embed_query(self, text: str) -> list[float]:
         """Embed query text."""
         # use doc embedding cache or store if not exists
@@ -0,0 +1,147 @@
+import logging
+import random
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from configs import dify_config
+from core.entities.embedding_type import EmbeddingInputType
+from core.model_manager import ModelInstance
+from core.model_runtime.entities.text_embedding_entities import TextEmbeddingResult
+from core.model_runtime.errors.invoke import InvokeRateLimitError
+
+logger = logging.getLogger(__name__)
+
+# exponential backoff between retries of a rate limited batch, in seconds
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 30.0
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of embedding batches in flight for one model.
+
+    The limit is halved whenever a batch is rate limited and grows back by one
+    after `limit` consecutive successful batches (AIMD).
+    """
+
+    def __init__(self, max_limit: int) -> None:
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, rate_limited: bool = False) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            if rate_limited:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+_limiters: dict[tuple[str, str, str], AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(model_instance: ModelInstance) -> AdaptiveConcurrencyLimiter:
+    """
+    Get the process wide limiter of a model, shared by every indexing thread embedding with it.
+    With load balancing enabled, each credential gets its own share of in-flight batches.
+    """
+    credential_count = 1
+    if model_instance.load_balancing_manager:
+        credential_count = max(model_instance.load_balancing_manager.config_count, 1)
+    max_limit = dify_config.EMBEDDING_MAX_CONCURRENT_BATCHES * credential_count
+    key = (model_instance.provider_model_bundle.configuration.tenant_id, model_instance.provider, model_instance.model)
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None or limiter.max_limit != max_limit:
+            limiter = _limiters[key] = AdaptiveConcurrencyLimiter(max_limit)
+        return limiter
+
+
+class EmbeddingBatchPipeline:
+    """Embeds batches of texts concurrently and returns the results in batch order."""
+
+    def __init__(
+        self, model_instance: ModelInstance, user: Optional[str] = None, dataset_id: Optional[str] = None
+    ) -> None:
+        self._model_instance = model_instance
+        self._user = user
+        self._dataset_id = dataset_id
+
+    def run(self, batches: Sequence[list[str]]) -> list[TextEmbeddingResult]:
+        if not batches:
+            return []
+
+        start_at = time.perf_counter()
+        limiter = get_limiter(self._model_instance)
+        if len(batches) == 1 or limiter.max_limit == 1:
+            results = [self._invoke(limiter, batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(limiter.max_limit, len(batches))) as executor:
+                futures = [executor.submit(self._invoke, limiter, batch) for batch in batches]
+                try:
+                    results = [future.result() for future in futures]
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        elapsed = time.perf_counter() - start_at
+        text_count = sum(len(batch) for batch in batches)
+        logger.info(
+            "Embedded %s texts in %s batches for dataset %s with %s/%s in %.2fs (%.1f texts/s)",
+            text_count,
+            len(batches),
+            self._dataset_id,
+            self._model_instance.provider,
+            self._model_instance.model,
+            elapsed,
+            text_count / elapsed if elapsed else 0.0,
+        )
+        return results
+
+    def _invoke(self, limiter: AdaptiveConcurrencyLimiter, texts: list[str]) -> TextEmbeddingResult:
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                result = self._model_instance.invoke_text_embedding(
+                    texts=texts, user=self._user, input_type=EmbeddingInputType.DOCUMENT
+                )
+            except InvokeRateLimitError:
+                limiter.release(rate_limited=True)
+                if attempt >= dify_config.EMBEDDING_RATE_LIMIT_MAX_RETRIES:
+                    raise
+                backoff = min(_BACKOFF_MAX, _BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.0)  # noqa: S311
+                logger.warning(
+                    "Embedding batch rate limited for %s/%s, retrying in %.1fs",
+                    self._model_instance.provider,
+                    self._model_instance.model,
+                    backoff,
+                )
+                attempt += 1
+                time.sleep(backoff)
+                continue
+            except Exception:
+                limiter.release()
+                raise
+            limiter.release()
+            return result
@@ -0,0 +1,118 @@
+import logging
+import threading
+from collections import Counter
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+from cachetools import LRUCache
+from sqlalchemy import select
+
+from core.rag.datasource.keyword.jieba.jieba_keyword_table_handler import JiebaKeywordTableHandler
+from core.rag.models.document import Document
+from extensions.ext_database import db
+from libs import helper
+from models.dataset import DocumentSegment
+
+logger = logging.getLogger(__name__)
+
+# keywords extracted from documents without stored segment keywords, keyed by text hash
+_KEYWORDS_CACHE_SIZE = 10000
+_keywords_cache: LRUCache[str, list[str]] = LRUCache(maxsize=_KEYWORDS_CACHE_SIZE)
+_keywords_cache_lock = threading.Lock()
+
+
+def tfidf_cosine_scores(query_keywords: Iterable[str], documents_keywords: Sequence[Iterable[str]]) -> list[float]:
+    """
+    Score documents by the cosine similarity of their TF-IDF vectors with the query's.
+
+    IDF is computed over the given documents as log((1 + N) / (1 + df)) + 1. The term matrix is kept
+    as (document, term, count) triplets and reduced with numpy, so the cost is linear in the number of
+    document keywords instead of keywords x documents.
+    """
+    document_count = len(documents_keywords)
+    if not document_count:
+        return []
+
+    vocabulary: dict[str, int] = {}
+    doc_indices: list[int] = []
+    term_indices: list[int] = []
+    counts: list[int] = []
+    for doc_index, keywords in enumerate(documents_keywords):
+        for keyword, count in Counter(keywords).items():
+            doc_indices.append(doc_index)
+            term_indices.append(vocabulary.setdefault(keyword, len(vocabulary)))
+            counts.append(count)
+    if not vocabulary:
+        return [0.0] * document_count
+
+    doc_index_array = np.asarray(doc_indices, dtype=np.int64)
+    term_index_array = np.asarray(term_indices, dtype=np.int64)
+    document_frequency = np.bincount(term_index_array, minlength=len(vocabulary))
+    idf = np.log((1 + document_count) / (1 + document_frequency)) + 1
+    weights = np.asarray(counts, dtype=np.float64) * idf[term_index_array]
+
+    # keywords that appear in no document have no IDF and do not contribute to the query vector
+    query_weights = np.zeros(len(vocabulary))
+    for keyword, count in Counter(query_keywords).items():
+        term_index = vocabulary.get(keyword)
+        if term_index is not None:
+            query_weights[term_index] = count * idf[term_index]
+
+    numerators = np.bincount(
+        doc_index_array, weights=weights * query_weights[term_index_array], minlength=document_count
+    )
+    document_norms = np.sqrt(np.bincount(doc_index_array, weights=weights**2, minlength=document_count))
+    denominators = document_norms * np.linalg.norm(query_weights)
+    scores = np.divide(numerators, denominators, out=np.zeros(document_count), where=denominators > 0)
+    return [float(score) for score in scores]
+
+
+def get_documents_keywords(documents: Sequence[Document]) -> list[list[str]]:
+    """
+    Get the keywords of each document.
+
+    Keywords stored on the segment at index time are loaded with one query; documents without them
+    are extracted with jieba once and kept in a process wide LRU cache keyed by text hash.
+    """
+    stored_keywords = _load_segment_keywords(documents)
+    keyword_table_handler = None
+    documents_keywords = []
+    for document in documents:
+        metadata = document.metadata or {}
+        dataset_id = metadata.get("dataset_id")
+        doc_id = metadata.get("doc_id")
+        keywords = stored_keywords.get((dataset_id, doc_id)) if dataset_id and doc_id else None
+        if not keywords:
+            text_hash = helper.generate_text_hash(document.page_content)
+            with _keywords_cache_lock:
+                keywords = _keywords_cache.get(text_hash)
+            if keywords is None:
+                keyword_table_handler = keyword_table_handler or JiebaKeywordTableHandler()
+                keywords = list(keyword_table_handler.extract_keywords(document.page_content, None))
+                with _keywords_cache_lock:
+                    _keywords_cache[text_hash] = keywords
+        documents_keywords.append(list(keywords))
+    return documents_keywords
+
+
+def _load_segment_keywords(documents: Sequence[Document]) -> dict[tuple[str, str], list[str]]:
+    dataset_ids: set[str] = set()
+    node_ids: set[str] = set()
+    for document in documents:
+        if document.metadata and document.metadata.get("dataset_id") and document.metadata.get("doc_id"):
+            dataset_ids.add(document.metadata["dataset_id"])
+            node_ids.add(document.metadata["doc_id"])
+    if not node_ids or not dataset_ids:
+        return {}
+    try:
+        rows = db.session.execute(
+            select(DocumentSegment.dataset_id, DocumentSegment.index_node_id, DocumentSegment.keywords).where(
+                DocumentSegment.dataset_id.in_(dataset_ids),
+                DocumentSegment.index_node_id.in_(node_ids),
+                DocumentSegment.keywords.is_not(None),
+            )
+        ).all()
+    except Exception:
+        logger.exception("Failed to load segment keywords")
+        return {}
+    return {(dataset_id, node_id): list(keywords) for dataset_id, node_id, keywords in rows if keywords}
@@ -1,9 +1,10 @@
 import re
+import threading
 from collections import defaultdict
 from collections.abc import Mapping, Sequence
 from typing import Annotated, Any, Union, cast
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 from core.file import File, FileAttribute, file_manager
 from core.variables import Segment, SegmentGroup, Variable
@@ -18,6 +19,9 @@ VariableValue = Union[str, int, float, dict, list, File]
 
 VARIABLE_PATTERN = re.compile(r"\{\{#([a-zA-Z0-9_]{1,50}(?:\.[a-zA-Z_][a-zA-Z0-9_]{0,29}){1,10})#\}\}")
 
+# Guards the bookkeeping of node variable dictionaries shared between forked pools.
+_fork_lock = threading.Lock()
+
 
 class VariablePool(BaseModel):
     # Variable dictionary is a dictionary for looking up variables by their selector.
@@ -46,6 +50,9 @@ class VariablePool(BaseModel):
         default_factory=list,
     )
 
+    # Node ids whose variable dictionary is shared with a forked pool and must be copied before it is written.
+    _shared_node_ids: set[str] = PrivateAttr(default_factory=set)
+
     def model_post_init(self, context: Any, /) -> None:
         # Create a mapping from field names to SystemVariableKey enum values
         self._add_system_variables(self.system_variables)
@@ -87,7 +94,30 @@ class VariablePool(BaseModel):
         key, hash_key = self._selector_to_keys(selector)
         # Based on the definition of `VariableUnion`,
         # `list[Variable]` can be safely used as `list[VariableUnion]` since they are compatible.
-        self.variable_dictionary[key][hash_key] = cast(VariableUnion, variable)
+        self._writable_variables(key)[hash_key] = cast(VariableUnion, variable)
+
+    def fork(self) -> "VariablePool":
+        """
+        Create a copy-on-write copy of the variable pool.
+
+        The copy shares the variable dictionaries of every node with this pool instead of deep copying them.
+        Whichever pool writes to a node first copies that node's dictionary, so writes stay isolated in both
+        directions while reads cost the same as before. Variables are immutable segments and are never copied.
+        """
+        with _fork_lock:
+            node_ids = set(self.variable_dictionary)
+            forked = self.model_copy(update={"variable_dictionary": defaultdict(dict, self.variable_dictionary)})
+            forked._shared_node_ids = set(node_ids)
+            self._shared_node_ids |= node_ids
+        return forked
+
+    def _writable_variables(self, node_id: str) -> dict[int, VariableUnion]:
+        if node_id in self._shared_node_ids:
+            with _fork_lock:
+                if node_id in self._shared_node_ids:
+                    self.variable_dictionary[node_id] = dict(self.variable_dictionary[node_id])
+                    self._shared_node_ids.discard(node_id)
+        return self.variable_dictionary[node_id]
 
     @classmethod
     def _selector_to_keys(cls, selector: Sequence[str]) -> tuple[str, int]:
@@ -149,10 +179,13 @@ class VariablePool(BaseModel):
         if not selector:
             return
         if len(selector) == 1:
-            self.variable_dictionary[selector[0]] = {}
+            with _fork_lock:
+                self.variable_dictionary[selector[0]] = {}
+                self._shared_node_ids.discard(selector[0])
             return
         key, hash_key = self._selector_to_keys(selector)
-        self.variable_dictionary[key].pop(hash_key, None)
+        if hash_key in self.variable_dictionary.get(key, {}):
+            self._writable_variables(key).pop(hash_key, None)
 
     def convert_template(self, template: str, /):
         parts = VARIABLE_PATTERN.split(template)
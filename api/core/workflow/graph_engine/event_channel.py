@@ -0,0 +1,64 @@
+import threading
+from collections import deque
+from collections.abc import Generator
+from concurrent.futures import Future
+from typing import Any
+
+
+class _TaskFailed:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_CLOSED = object()
+
+
+class TaskEventChannel:
+    """
+    Events produced by a set of tasks, joined with the completion of the tasks themselves.
+
+    Tasks `put` events from their threads and the consumer iterates over the channel. Iteration blocks on a
+    condition until an event arrives, so there are no idle wakeups, and it ends once every tracked task has
+    finished and its events have been consumed. A task that raises instead of reporting its failure as an
+    event re-raises the exception in the consumer right after the events it put before failing.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._events: deque[Any] = deque()
+        self._pending_count = 0
+
+    def put(self, event: Any) -> None:
+        with self._condition:
+            self._events.append(event)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """Stop the iteration after the events that have already been put, without waiting for the tasks."""
+        self.put(_CLOSED)
+
+    def track(self, future: Future) -> None:
+        with self._condition:
+            self._pending_count += 1
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future) -> None:
+        with self._condition:
+            self._pending_count -= 1
+            if not future.cancelled() and future.exception() is not None:
+                self._events.append(_TaskFailed(future.exception()))  # type: ignore[arg-type]
+            self._condition.notify()
+
+    def __iter__(self) -> Generator[Any, None, None]:
+        while True:
+            with self._condition:
+                while not self._events and self._pending_count:
+                    self._condition.wait()
+                if not self._events:
+                    return
+                event = self._events.popleft()
+            if event is _CLOSED:
+                return
+            if isinstance(event, _TaskFailed):
+                raise event.error
+            yield event
@@ -1,11 +1,10 @@
 import contextvars
 import logging
-import queue
 import time
 import uuid
 from collections.abc import Generator, Mapping
-from concurrent.futures import ThreadPoolExecutor, wait
-from copy import copy, deepcopy
+from concurrent.futures import wait
+from copy import copy
 from datetime import UTC, datetime
 from typing import Any, Optional, cast
 
@@ -42,6 +41,8 @@ from core.workflow.graph_engine.entities.graph import Graph, GraphEdge
 from core.workflow.graph_engine.entities.graph_init_params import GraphInitParams
 from core.workflow.graph_engine.entities.graph_runtime_state import GraphRuntimeState
 from core.workflow.graph_engine.entities.runtime_route_state import RouteNodeState
+from core.workflow.graph_engine.event_channel import TaskEventChannel
+from core.workflow.graph_engine.scheduler import WorkflowTaskGroup
 from core.workflow.nodes import NodeType
 from core.workflow.nodes.agent.agent_node import AgentNode
 from core.workflow.nodes.agent.entities import AgentNodeData
@@ -59,35 +60,8 @@ from models.workflow import WorkflowType
 logger = logging.getLogger(__name__)
 
 
-class GraphEngineThreadPool(ThreadPoolExecutor):
-    def __init__(
-        self,
-        max_workers=None,
-        thread_name_prefix="",
-        initializer=None,
-        initargs=(),
-        max_submit_count=dify_config.MAX_SUBMIT_COUNT,
-    ) -> None:
-        super().__init__(max_workers, thread_name_prefix, initializer, initargs)
-        self.max_submit_count = max_submit_count
-        self.submit_count = 0
-
-    def submit(self, fn, /, *args, **kwargs):
-        self.submit_count += 1
-        self.check_is_full()
-
-        return super().submit(fn, *args, **kwargs)
-
-    def task_done_callback(self, future):
-        self.submit_count -= 1
-
-    def check_is_full(self) -> None:
-        if self.submit_count > self.max_submit_count:
-            raise ValueError(f"Max submit count {self.max_submit_count} of workflow thread pool reached.")
-
-
 class GraphEngine:
-    workflow_thread_pool_mapping: dict[str, GraphEngineThreadPool] = {}
+    workflow_thread_pool_mapping: dict[str, WorkflowTaskGroup] = {}
 
     def __init__(
         self,
@@ -107,7 +81,7 @@ class GraphEngine:
         thread_pool_id: Optional[str] = None,
     ) -> None:
         thread_pool_max_submit_count = dify_config.MAX_SUBMIT_COUNT
-        thread_pool_max_workers = 10
+        thread_pool_max_workers = dify_config.WORKFLOW_PARALLEL_MAX_WORKERS
 
         # init thread pool
         if thread_pool_id:
@@ -118,8 +92,9 @@ class GraphEngine:
             self.thread_pool = GraphEngine.workflow_thread_pool_mapping[thread_pool_id]
             self.is_main_thread_pool = False
         else:
-            self.thread_pool = GraphEngineThreadPool(
-                max_workers=thread_pool_max_workers, max_submit_count=thread_pool_max_submit_count
+            # branches of every run are executed by the process-wide scheduler, the group only bounds this run
+            self.thread_pool = WorkflowTaskGroup(
+                tenant_id=tenant_id, max_workers=thread_pool_max_workers, max_submit_count=thread_pool_max_submit_count
             )
             self.thread_pool_id = str(uuid.uuid4())
             self.is_main_thread_pool = True
@@ -468,8 +443,8 @@ class GraphEngine:
         if not parallel:
             raise GraphRunFailedError(f"Parallel {parallel_id} not found.")
 
-        # run parallel nodes, run in new thread and use queue to get results
-        q: queue.Queue = queue.Queue()
+        # run parallel nodes in new threads, their events are joined with their completion in the channel
+        q = TaskEventChannel()
 
         # Create a list to store the threads
         futures = []
@@ -497,28 +472,19 @@ class GraphEngine:
             )
 
             future.add_done_callback(self.thread_pool.task_done_callback)
+            q.track(future)
 
             futures.append(future)
 
-        succeeded_count = 0
-        while True:
-            try:
-                event = q.get(timeout=1)
-                if event is None:
-                    break
-
-                yield event
-                if not isinstance(event, BaseAgentEvent) and event.parallel_id == parallel_id:
-                    if isinstance(event, ParallelBranchRunSucceededEvent):
-                        succeeded_count += 1
-                        if succeeded_count == len(futures):
-                            q.put(None)
-
-                        continue
-                    elif isinstance(event, ParallelBranchRunFailedEvent):
-                        raise GraphRunFailedError(event.error)
-            except queue.Empty:
-                continue
+        # ends once every branch has finished and its events have been yielded
+        for event in q:
+            yield event
+            if (
+                not isinstance(event, BaseAgentEvent)
+                and event.parallel_id == parallel_id
+                and isinstance(event, ParallelBranchRunFailedEvent)
+            ):
+                raise GraphRunFailedError(event.error)
 
         # wait all threads
         wait(futures)
@@ -532,7 +498,7 @@ class GraphEngine:
         self,
         flask_app: Flask,
         context: contextvars.Context,
-        q: queue.Queue,
+        q: TaskEventChannel,
         parallel_id: str,
         parallel_start_node_id: str,
         parent_parallel_id: Optional[str] = None,
@@ -882,7 +848,7 @@ class GraphEngine:
         """
         new_instance = copy(self)
         new_instance.graph_runtime_state = copy(self.graph_runtime_state)
-        new_instance.graph_runtime_state.variable_pool = deepcopy(self.graph_runtime_state.variable_pool)
+        new_instance.graph_runtime_state.variable_pool = self.graph_runtime_state.variable_pool.fork()
         new_instance.graph_runtime_state.total_tokens = 0
         return new_instance
 
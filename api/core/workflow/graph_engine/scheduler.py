@@ -0,0 +1,239 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from opentelemetry.metrics import CallbackOptions, Observation, get_meter
+
+from configs import dify_config
+
+logger = logging.getLogger(__name__)
+
+
+class WorkflowSchedulerSaturatedError(ValueError):
+    """Raised when the workflow task scheduler cannot accept more queued tasks."""
+
+
+class WorkflowTaskGroup:
+    """
+    Tasks of one workflow run or one parallel iteration.
+
+    A group runs at most `max_workers` tasks at the same time and accepts at most `max_submit_count`
+    unfinished tasks, the same limits the per-run thread pools used to have.
+    """
+
+    def __init__(
+        self,
+        tenant_id: str,
+        max_workers: int,
+        max_submit_count: int,
+        scheduler: Optional["WorkflowTaskScheduler"] = None,
+    ) -> None:
+        self.tenant_id = tenant_id
+        self.max_workers = max_workers
+        self.max_submit_count = max_submit_count
+        self.submit_count = 0
+        self.running_count = 0
+        self.queue: deque[tuple[Future, Callable[..., Any], tuple, dict]] = deque()
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> "WorkflowTaskScheduler":
+        return self._scheduler or get_scheduler()
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        self.submit_count += 1
+        self.check_is_full()
+        try:
+            return self.scheduler.submit(self, fn, *args, **kwargs)
+        except Exception:
+            self.submit_count -= 1
+            raise
+
+    def task_done_callback(self, future: Future) -> None:
+        self.submit_count -= 1
+
+    def check_is_full(self) -> None:
+        if self.submit_count > self.max_submit_count:
+            raise ValueError(f"Max submit count {self.max_submit_count} of workflow thread pool reached.")
+
+
+class WorkflowTaskScheduler:
+    """
+    Process-wide bounded scheduler for parallel branches and parallel iterations of workflow runs.
+
+    All runs share `max_workers` threads. Queued tasks are dispatched round robin over tenants and, within a
+    tenant, over task groups, so a single large run cannot starve the others. When `max_queued_tasks` tasks
+    are waiting, new submissions are rejected with `WorkflowSchedulerSaturatedError`.
+
+    A task submitted from a scheduler thread is queued when its group has a free slot and a thread is idle or can
+    still be started for it, and runs inline only when every thread is taken. The submitting task blocks until its
+    children finish, so queueing them without a thread to run them could deadlock once every thread waits on its
+    children.
+    """
+
+    def __init__(self, max_workers: int, max_queued_tasks: int) -> None:
+        self.max_workers = max_workers
+        self.max_queued_tasks = max_queued_tasks
+        self._condition = threading.Condition()
+        # tenant id -> task groups with queued tasks, both rotated for round robin dispatch
+        self._tenants: OrderedDict[str, OrderedDict[int, WorkflowTaskGroup]] = OrderedDict()
+        self._queued_count = 0
+        self._running_count = 0
+        self._worker_count = 0
+        self._idle_worker_count = 0
+        self._busy_worker_count = 0
+        self._rejected_count = 0
+        self._local = threading.local()
+
+    def submit(self, group: WorkflowTaskGroup, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        with self._condition:
+            if self._is_worker_thread() and not self._can_start(group):
+                run_inline = True
+            else:
+                run_inline = False
+                if self._queued_count >= self.max_queued_tasks:
+                    self._rejected_count += 1
+                    raise WorkflowSchedulerSaturatedError(
+                        f"Workflow task scheduler is saturated, {self._queued_count} tasks are waiting."
+                    )
+                group.queue.append((future, fn, args, kwargs))
+                self._tenants.setdefault(group.tenant_id, OrderedDict())[id(group)] = group
+                self._queued_count += 1
+                self._condition.notify()
+                # idle workers that were just notified are still counted, so only start a worker on a real shortage
+                if self._idle_worker_count < self._queued_count and self._worker_count < self.max_workers:
+                    self._start_worker()
+
+        if run_inline:
+            with self._condition:
+                group.running_count += 1
+                self._running_count += 1
+            self._run(group, future, fn, args, kwargs)
+        return future
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth and utilization, overall and per tenant."""
+        with self._condition:
+            return {
+                "workers": self._worker_count,
+                "idle_workers": self._idle_worker_count,
+                "running": self._running_count,
+                "queued": self._queued_count,
+                "rejected": self._rejected_count,
+                "queued_by_tenant": {
+                    tenant_id: sum(len(group.queue) for group in groups.values())
+                    for tenant_id, groups in self._tenants.items()
+                },
+            }
+
+    def _is_worker_thread(self) -> bool:
+        return getattr(self._local, "scheduler", None) is self
+
+    def _can_start(self, group: WorkflowTaskGroup) -> bool:
+        # threads not running a task, idle or not started yet, each queued task already claims one of them
+        free_worker_count = self.max_workers - self._busy_worker_count
+        return free_worker_count > self._queued_count and group.running_count + len(group.queue) < group.max_workers
+
+    def _start_worker(self) -> None:
+        self._worker_count += 1
+        thread = threading.Thread(target=self._work, name=f"WorkflowTaskScheduler-{self._worker_count}", daemon=True)
+        thread.start()
+
+    def _work(self) -> None:
+        self._local.scheduler = self
+        while True:
+            with self._condition:
+                task = self._next_task()
+                while task is None:
+                    self._idle_worker_count += 1
+                    self._condition.wait()
+                    self._idle_worker_count -= 1
+                    task = self._next_task()
+                self._busy_worker_count += 1
+            group, future, fn, args, kwargs = task
+            try:
+                self._run(group, future, fn, args, kwargs)
+            finally:
+                with self._condition:
+                    self._busy_worker_count -= 1
+
+    def _next_task(self) -> Optional[tuple[WorkflowTaskGroup, Future, Callable[..., Any], tuple, dict]]:
+        for tenant_id in list(self._tenants):
+            groups = self._tenants[tenant_id]
+            for group_id in list(groups):
+                group = groups[group_id]
+                if group.running_count >= group.max_workers:
+                    continue
+                future, fn, args, kwargs = group.queue.popleft()
+                self._queued_count -= 1
+                # rotate so that the next dispatch starts from another tenant and another group
+                if group.queue:
+                    groups.move_to_end(group_id)
+                else:
+                    del groups[group_id]
+                if groups:
+                    self._tenants.move_to_end(tenant_id)
+                else:
+                    del self._tenants[tenant_id]
+                group.running_count += 1
+                self._running_count += 1
+                return group, future, fn, args, kwargs
+        return None
+
+    def _run(self, group: WorkflowTaskGroup, future: Future, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            with self._condition:
+                group.running_count -= 1
+                self._running_count -= 1
+                # a task of this group may have been waiting for the concurrency slot
+                if group.queue and self._idle_worker_count:
+                    self._condition.notify()
+
+
+_scheduler: Optional[WorkflowTaskScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> WorkflowTaskScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = WorkflowTaskScheduler(
+                    max_workers=dify_config.WORKFLOW_SCHEDULER_MAX_WORKERS,
+                    max_queued_tasks=dify_config.WORKFLOW_SCHEDULER_MAX_QUEUED_TASKS,
+                )
+    return _scheduler
+
+
+def _observe(key: str) -> Callable[[CallbackOptions], Iterable[Observation]]:
+    def callback(options: CallbackOptions) -> Iterable[Observation]:
+        if _scheduler is not None:
+            yield Observation(_scheduler.stats()[key])
+
+    return callback
+
+
+_meter = get_meter("workflow_task_scheduler")
+_meter.create_observable_gauge(
+    "workflow.scheduler.queued", callbacks=[_observe("queued")], description="Queued workflow tasks", unit="{task}"
+)
+_meter.create_observable_gauge(
+    "workflow.scheduler.running", callbacks=[_observe("running")], description="Running workflow tasks", unit="{task}"
+)
+_meter.create_observable_counter(
+    "workflow.scheduler.rejected",
+    callbacks=[_observe("rejected")],
+    description="Workflow tasks rejected because the scheduler was saturated",
+    unit="{task}",
+)
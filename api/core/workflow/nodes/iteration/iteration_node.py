@@ -5,7 +5,6 @@ import uuid
 from collections.abc import Generator, Mapping, Sequence
 from concurrent.futures import Future, wait
 from datetime import UTC, datetime
-from queue import Empty, Queue
 from typing import TYPE_CHECKING, Any, Optional, cast
 
 from flask import Flask, current_app
@@ -35,6 +34,7 @@ from core.workflow.graph_engine.entities.event import (
     NodeRunSucceededEvent,
 )
 from core.workflow.graph_engine.entities.graph import Graph
+from core.workflow.graph_engine.event_channel import TaskEventChannel
 from core.workflow.nodes.base import BaseNode
 from core.workflow.nodes.base.entities import BaseNodeData, RetryConfig
 from core.workflow.nodes.enums import ErrorStrategy, NodeType
@@ -158,7 +158,8 @@ class IterationNode(BaseNode):
 
         # init graph engine
         from core.workflow.graph_engine.entities.graph_runtime_state import GraphRuntimeState
-        from core.workflow.graph_engine.graph_engine import GraphEngine, GraphEngineThreadPool
+        from core.workflow.graph_engine.graph_engine import GraphEngine
+        from core.workflow.graph_engine.scheduler import WorkflowTaskGroup
 
         graph_runtime_state = GraphRuntimeState(variable_pool=variable_pool, start_at=time.perf_counter())
 
@@ -206,9 +207,11 @@ class IterationNode(BaseNode):
         try:
             if self._node_data.is_parallel:
                 futures: list[Future] = []
-                q: Queue = Queue()
-                thread_pool = GraphEngineThreadPool(
-                    max_workers=self._node_data.parallel_nums, max_submit_count=dify_config.MAX_SUBMIT_COUNT
+                q = TaskEventChannel()
+                thread_pool = WorkflowTaskGroup(
+                    tenant_id=self.tenant_id,
+                    max_workers=self._node_data.parallel_nums,
+                    max_submit_count=dify_config.MAX_SUBMIT_COUNT,
                 )
                 for index, item in enumerate(iterator_list_value):
                     future: Future = thread_pool.submit(
@@ -227,29 +230,20 @@ class IterationNode(BaseNode):
                         iter_run_map=iter_run_map,
                     )
                     future.add_done_callback(thread_pool.task_done_callback)
+                    q.track(future)
                     futures.append(future)
-                succeeded_count = 0
-                while True:
-                    try:
-                        event = q.get(timeout=1)
-                        if event is None:
-                            break
-                        if isinstance(event, IterationRunNextEvent):
-                            succeeded_count += 1
-                            if succeeded_count == len(futures):
-                                q.put(None)
+                # ends once every item has finished and its events have been yielded
+                for event in q:
+                    yield event
+                    if isinstance(event, RunCompletedEvent):
+                        q.close()
+                        for f in futures:
+                            if not f.done():
+                                f.cancel()
+                        yield event
+                    if isinstance(event, IterationRunFailedEvent):
+                        q.close()
                         yield event
-                        if isinstance(event, RunCompletedEvent):
-                            q.put(None)
-                            for f in futures:
-                                if not f.done():
-                                    f.cancel()
-                            yield event
-                        if isinstance(event, IterationRunFailedEvent):
-                            q.put(None)
-                            yield event
-                    except Empty:
-                        continue
 
                 # wait all threads
                 wait(futures)
@@ -641,7 +635,7 @@ class IterationNode(BaseNode):
         *,
         flask_app: Flask,
         context: contextvars.Context,
-        q: Queue,
+        q: TaskEventChannel,
         iterator_list_value: Sequence[str],
         inputs: Mapping[str, list],
         outputs: list,
@@ -9,6 +9,7 @@ from configs import dify_config
 from core.app.entities.app_invoke_entities import ModelConfigWithCredentialsEntity
 from core.entities.provider_entities import QuotaUnit
 from core.file.models import File
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.memory.token_buffer_memory import TokenBufferMemory
 from core.model_manager import ModelInstance, ModelManager
 from core.model_runtime.entities.llm_entities import LLMUsage
@@ -154,3 +155,5 @@ def deduct_llm_quota(tenant_id: str, model_instance: ModelInstance, usage: LLMUs
             )
             session.execute(stmt)
             session.commit()
+        # the quota usage is part of the cached provider configurations, and bulk updates bypass the ORM events
+        ProviderConfigurationsCache.invalidate([tenant_id])
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from configs import dify_config
 from core.app.entities.app_invoke_entities import AgentChatAppGenerateEntity, ChatAppGenerateEntity
 from core.entities.provider_entities import QuotaUnit, SystemConfiguration
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
 from core.plugin.entities.plugin import ModelProviderID
 from events.message_event import message_was_created
 from extensions.ext_database import db
@@ -240,3 +241,8 @@ def _execute_provider_updates(updates_to_perform: list[_ProviderUpdateOperation]
                 )
 
         logger.debug("Successfully processed %s Provider updates", len(updates_to_perform))
+
+    # the quota usage is part of the cached provider configurations, and bulk updates bypass the ORM events
+    ProviderConfigurationsCache.invalidate(
+        operation.filters.tenant_id for operation in updates_to_perform if operation.values.quota_used is not None
+    )
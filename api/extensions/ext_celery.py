@@ -142,6 +142,40 @@ def init_app(app: DifyApp) -> Celery:
             "task": "schedule.update_account_monthly_used_quota_extend.update_account_monthly_used_quota_extend",
             "schedule": crontab(minute="0", hour="0", day_of_month="1"),
         }
+
+        # 每天00:00，快照并重置密钥日额度
+        imports.append("schedule.update_api_token_daily_used_quota_task_extend")
+        beat_schedule["update_api_token_daily_used_quota_task_extend"] = {
+            "task": "schedule.update_api_token_daily_used_quota_task_extend."
+            "update_api_token_daily_used_quota_task_extend",
+            "schedule": crontab(minute="0", hour="0"),
+        }
+
+        # 每月1号00:00，快照并重置密钥月额度
+        imports.append("schedule.update_api_token_monthly_used_quota_task_extend")
+        beat_schedule["update_api_token_monthly_used_quota_task_extend"] = {
+            "task": "schedule.update_api_token_monthly_used_quota_task_extend."
+            "update_api_token_monthly_used_quota_task_extend",
+            "schedule": crontab(minute="0", hour="0", day_of_month="1"),
+        }
+
+    if dify_config.BILLING_LEDGER_EXTEND_ENABLED:
+        # 定时聚合计费流水到账号额度、密钥额度
+        imports.append("schedule.flush_billing_ledger_extend")
+        beat_schedule["flush_billing_ledger_extend"] = {
+            "task": "schedule.flush_billing_ledger_extend.flush_billing_ledger_extend",
+            "schedule": timedelta(seconds=dify_config.BILLING_LEDGER_EXTEND_FLUSH_INTERVAL),
+        }
+
+    # 定时把应用使用次数合并写入数据库
+    imports.append("schedule.flush_app_usage_extend")
+    beat_schedule["flush_app_usage_extend"] = {
+        "task": "schedule.flush_app_usage_extend.flush_app_usage_extend",
+        "schedule": timedelta(seconds=dify_config.APP_USAGE_EXTEND_FLUSH_INTERVAL),
+    }
+
+    # 模型批量同步到工作区的任务按需派发，这里只负责注册
+    imports.append("tasks.extend.sync_model_to_tenants_task_extend")
    # ---------------------------- 二开部分 End ----------------------------
 
     celery_app.conf.update(beat_schedule=beat_schedule, imports=imports)
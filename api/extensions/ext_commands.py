@@ -13,6 +13,7 @@ def init_app(app: DifyApp):
         extract_unique_plugins,
         fix_app_site_missing,
         install_plugins,
+        keyword_store_migrate,
         migrate_data_for_plugin,
         old_metadata_migration,
         remove_orphaned_files_on_storage,
@@ -20,6 +21,7 @@ def init_app(app: DifyApp):
         reset_encrypt_key_pair,
         reset_password,
         setup_system_tool_oauth_client,
+        sync_all_models_extend,
         upgrade_db,
         vdb_migrate,
     )
@@ -44,6 +46,8 @@ def init_app(app: DifyApp):
         remove_orphaned_files_on_storage,
         setup_system_tool_oauth_client,
         extend_db,
+        keyword_store_migrate,
+        sync_all_models_extend,
     ]
     for cmd in cmds_to_register:
         app.cli.add_command(cmd)
@@ -0,0 +1,60 @@
+"""app_statistics_extend unique app_id
+
+Revision ID: 012_app_statistics_unique_app
+Revises: 011_system_integration_fields
+Create Date: 2026-10-18 00:01:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "012_app_statistics_unique_app"
+down_revision = "011_system_integration_fields"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if "app_statistics_extend" in tables:
+        # 并发计数可能为同一个应用插入了多行，合并到一行后再建唯一索引
+        conn.execute(
+            sa.text(
+                """
+            WITH ranked AS (
+                SELECT id,
+                       SUM(number) OVER (PARTITION BY app_id) AS total,
+                       ROW_NUMBER() OVER (PARTITION BY app_id ORDER BY number DESC, id) AS rn
+                FROM app_statistics_extend
+            )
+            UPDATE app_statistics_extend s SET number = ranked.total
+            FROM ranked WHERE s.id = ranked.id AND ranked.rn = 1
+            """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+            DELETE FROM app_statistics_extend s
+            USING (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY app_id ORDER BY number DESC, id) AS rn
+                FROM app_statistics_extend
+            ) ranked
+            WHERE s.id = ranked.id AND ranked.rn > 1
+            """
+            )
+        )
+        with op.batch_alter_table("app_statistics_extend", schema=None) as batch_op:
+            batch_op.drop_index("app_statistics_extend_app_id_idx")
+            batch_op.create_index("app_statistics_extend_app_id_idx", ["app_id"], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table("app_statistics_extend", schema=None) as batch_op:
+        batch_op.drop_index("app_statistics_extend_app_id_idx")
+        batch_op.create_index("app_statistics_extend_app_id_idx", ["app_id"], unique=False)
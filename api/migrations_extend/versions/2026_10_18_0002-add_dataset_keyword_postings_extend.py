@@ -0,0 +1,42 @@
+"""add dataset_keyword_postings_extend
+
+Revision ID: 013_dataset_keyword_postings
+Revises: 012_app_statistics_unique_app
+Create Date: 2026-10-18 00:02:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+import models
+
+# revision identifiers, used by Alembic.
+revision = "013_dataset_keyword_postings"
+down_revision = "012_app_statistics_unique_app"
+branch_labels: str | None = None
+depends_on: str | None = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if "dataset_keyword_postings_extend" not in tables:
+        op.create_table(
+            "dataset_keyword_postings_extend",
+            sa.Column("dataset_id", models.types.StringUUID(), nullable=False),
+            sa.Column("keyword", sa.Text(), nullable=False),
+            sa.Column("node_id", sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint("dataset_id", "keyword", "node_id", name="dataset_keyword_postings_extend_pkey"),
+        )
+        with op.batch_alter_table("dataset_keyword_postings_extend", schema=None) as batch_op:
+            batch_op.create_index("dataset_keyword_postings_extend_node_idx", ["dataset_id", "node_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("dataset_keyword_postings_extend", schema=None) as batch_op:
+        batch_op.drop_index("dataset_keyword_postings_extend_node_idx")
+
+    op.drop_table("dataset_keyword_postings_extend")
@@ -12,6 +12,7 @@ from datetime import datetime
 from json import JSONDecodeError
 from typing import Any, Optional, cast
 
+import numpy as np
 import sqlalchemy as sa
 from sqlalchemy import DateTime, String, func, select
 from sqlalchemy.dialects.postgresql import JSONB
@@ -935,11 +936,25 @@ class Embedding(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, server_default=func.current_timestamp())
     provider_name = mapped_column(String(255), nullable=False, server_default=sa.text("''::character varying"))
 
+    # Embeddings are stored as little-endian float32 arrays prefixed with this header.
+    # Rows written before the header was introduced are pickled lists and are still readable.
+    FLOAT32_HEADER = b"\x00f32"
+
     def set_embedding(self, embedding_data: list[float]):
-        self.embedding = pickle.dumps(embedding_data, protocol=pickle.HIGHEST_PROTOCOL)
+        self.embedding = self.encode_embedding(embedding_data)
 
     def get_embedding(self) -> list[float]:
-        return cast(list[float], pickle.loads(self.embedding))  # noqa: S301
+        return self.decode_embedding(self.embedding)
+
+    @classmethod
+    def encode_embedding(cls, embedding_data: list[float]) -> bytes:
+        return cls.FLOAT32_HEADER + np.asarray(embedding_data, dtype="<f4").tobytes()
+
+    @classmethod
+    def decode_embedding(cls, data: bytes) -> list[float]:
+        if data.startswith(cls.FLOAT32_HEADER):
+            return cast(list[float], np.frombuffer(data, dtype="<f4", offset=len(cls.FLOAT32_HEADER)).tolist())
+        return cast(list[float], pickle.loads(data))  # noqa: S301
 
 
 class DatasetCollectionBinding(Base):
@@ -0,0 +1,22 @@
+from extensions.ext_database import db
+
+from .types import StringUUID
+
+
+class DatasetKeywordPostingExtend(db.Model):
+    """
+    关键词倒排索引：每个 关键词 -> 分段节点ID 一行，替代整个数据集一份 JSON 的关键词表
+    """
+
+    __tablename__ = "dataset_keyword_postings_extend"
+    __table_args__ = (
+        db.PrimaryKeyConstraint("dataset_id", "keyword", "node_id", name="dataset_keyword_postings_extend_pkey"),
+        db.Index("dataset_keyword_postings_extend_node_idx", "dataset_id", "node_id"),
+    )
+
+    dataset_id = db.Column(StringUUID, nullable=False)
+    keyword = db.Column(db.Text, nullable=False)
+    node_id = db.Column(db.String(255), nullable=False)
+
+    def __repr__(self):
+        return f"<dataset_keyword_posting({self.dataset_id}, {self.keyword!r}, {self.node_id!r})>"
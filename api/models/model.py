@@ -304,7 +304,7 @@ class AppStatisticsExtend(db.Model):
     __tablename__ = "app_statistics_extend"
     __table_args__ = (
         db.PrimaryKeyConstraint("id", name="app_statistics_extend_pkey"),
-        db.Index("app_statistics_extend_app_id_idx", "app_id"),
+        db.Index("app_statistics_extend_app_id_idx", "app_id", unique=True),
     )
 
     id = db.Column(StringUUID, server_default=db.text("uuid_generate_v4()"))
@@ -0,0 +1,22 @@
+import time
+
+import click
+
+import app
+from services.app_generate_service_extend import AppGenerateServiceExtend
+
+
+@app.celery.task(queue="extend_low")
+def flush_app_usage_extend():
+    start_at = time.perf_counter()
+
+    flushed = AppGenerateServiceExtend.flush_cumulative_usage()
+
+    if flushed:
+        end_at = time.perf_counter()
+        click.echo(
+            click.style(
+                "合并应用使用次数：{} 个应用，success latency: {}".format(flushed, end_at - start_at),
+                fg="green",
+            )
+        )
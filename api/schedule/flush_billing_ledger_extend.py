@@ -0,0 +1,22 @@
+import time
+
+import click
+
+import app
+from services.billing_ledger_service_extend import BillingLedgerServiceExtend
+
+
+@app.celery.task(queue="extend_high")
+def flush_billing_ledger_extend():
+    start_at = time.perf_counter()
+
+    processed = BillingLedgerServiceExtend.flush()
+
+    if processed:
+        end_at = time.perf_counter()
+        click.echo(
+            click.style(
+                "聚合计费流水：{} 条，success latency: {}".format(processed, end_at - start_at),
+                fg="green",
+            )
+        )
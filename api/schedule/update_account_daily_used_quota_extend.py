@@ -1,12 +1,9 @@
-import datetime
 import time
 
 import click
 
 import app
-from extensions.ext_database import db
-from models.account_money_extend import AccountMoneyExtend
-from models.account_money_daily_stat_extend import AccountMoneyDailyStatExtend
+from services.quota_rollover_service_extend import ACCOUNT_DAILY_JOB, QuotaRolloverServiceExtend
 
 
 @app.celery.task(queue="extend_low")
@@ -14,26 +11,10 @@ def update_account_daily_used_quota_extend():
     click.echo(click.style("Start 重置账号日额度", fg="green"))
     start_at = time.perf_counter()
 
-    # 快照额度
-    account_money_daily_stats = []
-    account_money_extend = db.session.query(AccountMoneyExtend).all()
-    for account in account_money_extend:
-        account_money_daily_stats.append(
-            AccountMoneyDailyStatExtend(
-                account_id=account.account_id,
-                total_quota=account.total_quota,
-                used_quota=account.used_quota,
-                stat_at=datetime.datetime.now(),
-                updated_at=datetime.datetime.now(),
-                created_at=datetime.datetime.now(),
-            )
-        )
-    db.session.add_all(account_money_daily_stats)
-
-    # Note: For daily reset, we don't reset the used_quota as account quotas 
-    # are typically monthly. This task just creates daily snapshots.
-    
-    db.session.commit()
+    # 快照额度，账号额度按月计算，日任务不清零
+    snapshotted = QuotaRolloverServiceExtend.rollover(ACCOUNT_DAILY_JOB)
 
     end_at = time.perf_counter()
-    click.echo(click.style("重置账号日额度：success latency: {}".format(end_at - start_at), fg="green"))
\ No newline at end of file
+    click.echo(
+        click.style("重置账号日额度：{} 条，success latency: {}".format(snapshotted, end_at - start_at), fg="green")
+    )
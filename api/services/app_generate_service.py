@@ -15,9 +15,11 @@ from core.app.features.rate_limiting import RateLimit
 from libs.helper import RateLimiter
 from models.model import Account, App, AppMode, EndUser
 from models.workflow import Workflow
+from services.app_generate_service_extend import AppGenerateServiceExtend
 from services.billing_service import BillingService
 from services.errors.app import WorkflowIdFormatError, WorkflowNotFoundError
 from services.errors.llm import InvokeRateLimitError
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend
 from services.workflow_service import WorkflowService
 
 
@@ -42,6 +44,28 @@ class AppGenerateService:
         :param streaming: streaming
         :return:
         """
+        # ---------------------- 二开部分Begin - 额度准入 ----------------------
+        quota_ticket = AppGenerateServiceExtend.admit_quota(user=user, args=args, invoke_from=invoke_from)
+        try:
+            response = cls._generate(
+                app_model=app_model, user=user, args=args, invoke_from=invoke_from, streaming=streaming
+            )
+        except Exception:
+            if quota_ticket:
+                QuotaAdmissionServiceExtend.release(quota_ticket)
+            raise
+        return AppGenerateServiceExtend.release_quota_on_close(response, quota_ticket)
+        # ---------------------- 二开部分End - 额度准入 ----------------------
+
+    @classmethod
+    def _generate(
+        cls,
+        app_model: App,
+        user: Union[Account, EndUser],
+        args: Mapping[str, Any],
+        invoke_from: InvokeFrom,
+        streaming: bool = True,
+    ):
         # system level rate limiter
         if dify_config.BILLING_ENABLED:
             # check if it's free plan
@@ -1,25 +1,120 @@
-from typing import Any
+import logging
+from collections.abc import Generator, Mapping
+from typing import Any, Optional, Union
 
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects.postgresql import insert
+
+from configs import dify_config
+from core.app.entities.app_invoke_entities import InvokeFrom
 from extensions.ext_database import db
-from models.model import App, AppStatisticsExtend
+from extensions.ext_redis import redis_client
+from models.enums import CreatorUserRole
+from models.model import Account, App, AppStatisticsExtend, EndUser
+from services.payer_resolution_service_extend import PayerResolutionServiceExtend
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend, QuotaAdmissionTicket
+
+logger = logging.getLogger(__name__)
 
 
 class AppGenerateServiceExtend:
+    # 应用使用次数计数，app_id -> 自上次 flush 以来新增的会话数
+    USAGE_KEY = "app_usage_extend"
+    USAGE_FLUSHING_KEY = "app_usage_extend:flushing"
+    USAGE_FLUSH_LOCK_KEY = "app_usage_extend_flush_lock"
+
+    # 需要扣费的调用来源，与计费流水保持一致
+    QUOTA_ADMISSION_INVOKE_FROM = {InvokeFrom.WEB_APP, InvokeFrom.SERVICE_API}
+
+    @staticmethod
+    def admit_quota(
+        user: Union[Account, EndUser], args: Mapping[str, Any], invoke_from: InvokeFrom
+    ) -> Optional[QuotaAdmissionTicket]:
+        """
+        调用前的额度准入，在工作流、模型调用之前拒绝余额不足的请求。
+        付费账号的解析方式与计费流水相同，API调用额外判断密钥的日/月额度。
+        """
+        if invoke_from not in AppGenerateServiceExtend.QUOTA_ADMISSION_INVOKE_FROM:
+            return None
+
+        payer_role = CreatorUserRole.END_USER if isinstance(user, EndUser) else CreatorUserRole.ACCOUNT
+        account_id = PayerResolutionServiceExtend.resolve(user.id, payer_role)
+        api_token = args.get("api_token")
+        return QuotaAdmissionServiceExtend.admit(
+            account_id=account_id, app_token_id=api_token.id if api_token else None
+        )
+
+    @staticmethod
+    def release_quota_on_close(response: Any, ticket: Optional[QuotaAdmissionTicket]) -> Any:
+        """阻塞模式立即释放预占，流式模式在输出结束或连接关闭时释放"""
+        if ticket is None:
+            return response
+        if isinstance(response, Mapping):
+            QuotaAdmissionServiceExtend.release(ticket)
+            return response
+        return AppGenerateServiceExtend._release_after_stream(response, ticket)
+
+    @staticmethod
+    def _release_after_stream(response: Any, ticket: QuotaAdmissionTicket) -> Generator:
+        try:
+            yield from response
+        finally:
+            QuotaAdmissionServiceExtend.release(ticket)
+
     @staticmethod
     def calculate_cumulative_usage(app_model: App, args: Any):
+        """新会话时应用使用次数 +1，只在 Redis 中计数，由定时任务合并写入 AppStatisticsExtend"""
         if app_model is None:
             return
-        if "conversation_id" in args.keys():
+        if "conversation_id" in args:
             # determine if it's a new conversation
             if len(args["conversation_id"]) > 0:
                 return
         # app usage +1
         try:
-            statistics: AppStatisticsExtend = AppStatisticsExtend.query.filter_by(app_id=app_model.id).first()
-            if statistics is None:
-                db.session.add(AppStatisticsExtend(app_id=app_model.id, number=1))
-            else:
-                statistics.number += 1
-            db.session.commit()
-        except:
-            pass
+            redis_client.hincrby(AppGenerateServiceExtend.USAGE_KEY, app_model.id, 1)
+        except Exception:
+            logger.exception("Failed to count app usage %s", app_model.id)
+
+    @classmethod
+    def flush_cumulative_usage(cls) -> int:
+        """
+        把 Redis 中累计的应用使用次数合并写入 AppStatisticsExtend，返回本次写入的应用数。
+
+        先把计数 hash 原子地改名为待写入 hash，新的计数继续写入原 key；
+        待写入 hash 在数据库提交后才删除，崩溃后下次 flush 会先处理它。
+        """
+        lock = redis_client.lock(cls.USAGE_FLUSH_LOCK_KEY, timeout=dify_config.APP_USAGE_EXTEND_FLUSH_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return 0
+        try:
+            if not redis_client.exists(cls.USAGE_FLUSHING_KEY):
+                try:
+                    redis_client.rename(cls.USAGE_KEY, cls.USAGE_FLUSHING_KEY)
+                except ResponseError:
+                    # 没有新的计数
+                    return 0
+
+            counts = {
+                app_id.decode(): int(number)
+                for app_id, number in redis_client.hgetall(cls.USAGE_FLUSHING_KEY).items()
+                if int(number)
+            }
+            if counts:
+                stmt = insert(AppStatisticsExtend).values(
+                    [{"app_id": app_id, "number": number} for app_id, number in counts.items()]
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[AppStatisticsExtend.app_id],
+                    set_={"number": AppStatisticsExtend.number + stmt.excluded.number},
+                )
+                try:
+                    db.session.execute(stmt)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+            redis_client.delete(cls.USAGE_FLUSHING_KEY)
+            return len(counts)
+        finally:
+            lock.release()
@@ -0,0 +1,218 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel
+from redis.exceptions import ResponseError
+from sqlalchemy import Numeric, column, func, insert, update, values
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account_money_extend import AccountMoneyExtend
+from models.api_token_money_extend import ApiTokenMoneyExtend
+from models.enums import CreatorUserRole
+from models.types import StringUUID
+from services.payer_resolution_service_extend import PayerResolutionServiceExtend
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend
+
+logger = logging.getLogger(__name__)
+
+
+class BillingUsageEntry(BaseModel):
+    """一条计费流水：谁产生的费用、关联的记录ID（消息ID / 工作流运行ID）以及折算后的美元金额"""
+
+    payer_id: str
+    payer_role: CreatorUserRole
+    record_id: Optional[str] = None
+    price: Decimal
+
+    def to_stream_fields(self) -> dict[str, str]:
+        return {
+            "payer_id": self.payer_id,
+            "payer_role": self.payer_role.value,
+            "record_id": self.record_id or "",
+            "price": str(self.price),
+        }
+
+    @classmethod
+    def from_stream_fields(cls, fields: dict[bytes, bytes]) -> "BillingUsageEntry":
+        record_id = fields.get(b"record_id", b"").decode()
+        return cls(
+            payer_id=fields[b"payer_id"].decode(),
+            payer_role=CreatorUserRole(fields[b"payer_role"].decode()),
+            record_id=record_id or None,
+            price=Decimal(fields[b"price"].decode()),
+        )
+
+
+class BillingLedgerServiceExtend:
+    """
+    追加写的计费流水。
+
+    消息 / 大模型节点产生费用时只向 Redis Stream 追加一条流水，由定时任务批量聚合，
+    每次 flush 对 AccountMoneyExtend 和 ApiTokenMoneyExtend 各执行一条基于集合的 UPDATE，
+    付费方（账号、终端用户、API 密钥）通过 PayerResolutionServiceExtend 按批次一次性解析，
+    避免热点账号上的行锁竞争和丢失更新。
+    """
+
+    STREAM_KEY = "billing_ledger_extend"
+    GROUP_NAME = "billing_ledger_extend_aggregator"
+    CONSUMER_NAME = "aggregator"
+    FLUSH_LOCK_KEY = "billing_ledger_extend_flush_lock"
+
+    @staticmethod
+    def to_usd(total_price: Decimal | float | str, currency: Optional[str]) -> Decimal:
+        price = Decimal(str(total_price or 0))
+        if currency and currency != "USD":
+            price = price / Decimal(str(dify_config.RMB_TO_USD_RATE))
+        return price
+
+    @classmethod
+    def record_usage(cls, entry: BillingUsageEntry) -> None:
+        if entry.price == 0:
+            return
+        if not dify_config.BILLING_LEDGER_EXTEND_ENABLED:
+            # 未开启流水模式时，沿用同步扣费
+            cls.apply_usage([entry])
+            return
+        redis_client.xadd(cls.STREAM_KEY, entry.to_stream_fields())
+
+    @classmethod
+    def flush(cls, batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> int:
+        """
+        聚合流水并写入额度表，返回本次处理的流水条数。
+
+        先处理上次崩溃遗留的 pending 流水，再读取新流水；每批在数据库提交后才 ACK，
+        保证流水至少被处理一次。
+        """
+        batch_size = batch_size or dify_config.BILLING_LEDGER_EXTEND_BATCH_SIZE
+        max_batches = max_batches or dify_config.BILLING_LEDGER_EXTEND_MAX_BATCHES_PER_FLUSH
+
+        lock = redis_client.lock(cls.FLUSH_LOCK_KEY, timeout=dify_config.BILLING_LEDGER_EXTEND_FLUSH_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return 0
+        try:
+            cls._ensure_group()
+            processed = 0
+            read_from = "0"
+            for _ in range(max_batches):
+                stream_entries = cls._read_batch(read_from, batch_size)
+                if not stream_entries:
+                    if read_from == "0":
+                        # pending 流水已处理完，开始读取新流水
+                        read_from = ">"
+                        continue
+                    break
+
+                entry_ids = [entry_id for entry_id, _ in stream_entries]
+                entries = []
+                for entry_id, fields in stream_entries:
+                    try:
+                        entries.append(BillingUsageEntry.from_stream_fields(fields))
+                    except Exception:
+                        logger.exception("Skip malformed billing ledger entry %s", entry_id)
+
+                cls.apply_usage(entries)
+                redis_client.xack(cls.STREAM_KEY, cls.GROUP_NAME, *entry_ids)
+                redis_client.xdel(cls.STREAM_KEY, *entry_ids)
+                processed += len(entry_ids)
+            return processed
+        finally:
+            lock.release()
+
+    @classmethod
+    def apply_usage(cls, entries: Sequence[BillingUsageEntry]) -> None:
+        """在一个事务内把一批流水折叠进账号额度和密钥额度"""
+        if not entries:
+            return
+
+        payers = PayerResolutionServiceExtend.resolve_many((entry.payer_id, entry.payer_role) for entry in entries)
+        app_tokens = PayerResolutionServiceExtend.resolve_app_tokens(
+            entry.record_id for entry in entries if entry.record_id
+        )
+        account_deltas, app_token_deltas = fold_usage(entries, payers, app_tokens)
+
+        try:
+            cls._apply_account_deltas(account_deltas)
+            cls._apply_app_token_deltas(app_token_deltas)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # 同步扣减准入余额，避免余额 TTL 内超额放行
+        QuotaAdmissionServiceExtend.consume(account_deltas, app_token_deltas)
+
+    @classmethod
+    def _ensure_group(cls) -> None:
+        try:
+            redis_client.xgroup_create(cls.STREAM_KEY, cls.GROUP_NAME, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    @classmethod
+    def _read_batch(cls, read_from: str, batch_size: int) -> list[tuple[bytes, dict[bytes, bytes]]]:
+        response = redis_client.xreadgroup(
+            cls.GROUP_NAME, cls.CONSUMER_NAME, {cls.STREAM_KEY: read_from}, count=batch_size
+        )
+        if not response:
+            return []
+        _, stream_entries = response[0]
+        return list(stream_entries)
+
+    @staticmethod
+    def _apply_account_deltas(account_deltas: dict[str, Decimal]) -> None:
+        if not account_deltas:
+            return
+        deltas = values(
+            column("account_id", StringUUID()), column("delta", Numeric(16, 7)), name="account_deltas"
+        ).data(list(account_deltas.items()))
+        updated_ids = set(
+            db.session.scalars(
+                update(AccountMoneyExtend)
+                .where(AccountMoneyExtend.account_id == deltas.c.account_id)
+                .values(used_quota=func.coalesce(AccountMoneyExtend.used_quota, 0) + deltas.c.delta)
+                .returning(AccountMoneyExtend.account_id)
+            ).all()
+        )
+
+        missing = [
+            {"account_id": account_id, "used_quota": delta, "total_quota": dify_config.ACCOUNT_TOTAL_QUOTA}
+            for account_id, delta in account_deltas.items()
+            if account_id not in updated_ids
+        ]
+        if missing:
+            db.session.execute(insert(AccountMoneyExtend), missing)
+
+    @staticmethod
+    def _apply_app_token_deltas(app_token_deltas: dict[str, Decimal]) -> None:
+        if not app_token_deltas:
+            return
+        deltas = values(
+            column("app_token_id", StringUUID()), column("delta", Numeric(16, 7)), name="app_token_deltas"
+        ).data(list(app_token_deltas.items()))
+        db.session.execute(
+            update(ApiTokenMoneyExtend)
+            .where(ApiTokenMoneyExtend.app_token_id == deltas.c.app_token_id)
+            .values(
+                accumulated_quota=func.coalesce(ApiTokenMoneyExtend.accumulated_quota, 0) + deltas.c.delta,
+                day_used_quota=func.coalesce(ApiTokenMoneyExtend.day_used_quota, 0) + deltas.c.delta,
+                month_used_quota=func.coalesce(ApiTokenMoneyExtend.month_used_quota, 0) + deltas.c.delta,
+            )
+        )
+
+
+def fold_usage(
+    entries: Iterable[BillingUsageEntry], payers: dict[str, str], app_tokens: dict[str, str]
+) -> tuple[dict[str, Decimal], dict[str, Decimal]]:
+    """把一批流水按实际付费账号和API密钥累加，返回 (账号增量, 密钥增量)"""
+    account_deltas: dict[str, Decimal] = defaultdict(Decimal)
+    app_token_deltas: dict[str, Decimal] = defaultdict(Decimal)
+    for entry in entries:
+        account_deltas[payers.get(entry.payer_id, entry.payer_id)] += entry.price
+        if entry.record_id and entry.record_id in app_tokens:
+            app_token_deltas[app_tokens[entry.record_id]] += entry.price
+    return dict(account_deltas), dict(app_token_deltas)
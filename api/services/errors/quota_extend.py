@@ -0,0 +1,23 @@
+from services.errors.base import BaseServiceError
+
+
+class QuotaExceededErrorExtend(BaseServiceError):  # noqa: N818
+    description = "余额不足，调用失败！"
+
+    def __init__(self, description: str | None = None):
+        super().__init__(description or self.description)
+
+    def __str__(self):
+        return self.description or self.__class__.__name__
+
+
+class AccountQuotaExceededErrorExtend(QuotaExceededErrorExtend):
+    description = "余额不足，调用失败！"
+
+
+class ApiTokenDayQuotaExceededErrorExtend(QuotaExceededErrorExtend):
+    description = "该密钥每日调用额度已达上限，调用失败！"
+
+
+class ApiTokenMonthQuotaExceededErrorExtend(QuotaExceededErrorExtend):
+    description = "该密钥每月调用额度已达上限，调用失败！"
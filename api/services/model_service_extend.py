@@ -1,70 +1,356 @@
+import datetime
+import json
 import logging
+import uuid
+from collections.abc import Sequence
+from typing import Optional
 
-from models.account import *
+from pydantic import BaseModel
+from sqlalchemy import select
+
+from configs import dify_config
+from core.entities.provider_configuration import ProviderConfiguration, ProviderConfigurations
+from core.helper import encrypter
+from core.helper.model_provider_cache import ProviderCredentialsCache, ProviderCredentialsCacheType
+from core.model_runtime.entities.model_entities import ModelType
+from core.plugin.entities.plugin import ModelProviderID
+from core.provider_manager import ProviderManager
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account import Tenant, TenantStatus
+from models.provider import Provider, ProviderModel, ProviderType, TenantPreferredModelProvider
+from models.tenant_model_sync_extend import TenantModelSyncExtend
 from services.account_service_extend import TenantExtendService
-from services.model_provider_service_extend import ModelProviderExtendService
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSyncSource(BaseModel):
+    """
+    一个需要同步到所有工作区的模型或供应商凭证，credentials 为解密后的明文。
+
+    model_name 为空时表示只有供应商的凭证。
+    """
+
+    origin_id: str
+    provider_name: str
+    model_name: Optional[str] = None
+    model_type: Optional[str] = None
+    credentials: dict
+    secret_variables: list[str]
+
+    @property
+    def is_provider(self) -> bool:
+        return self.model_name is None
+
+
+class ModelSyncResult(BaseModel):
+    synced: int = 0
+    failed: int = 0
 
 
 class ModelExtendService:
+    PROGRESS_KEY = "model_sync_extend:progress:{job_id}"
+
     @staticmethod
     def sync_set_all_model_to_tenant(tenant_id: str) -> bool:
-        logging.info(f"开始同步所有模型到工作区: {tenant_id}")
-        model_provider_service_extend = ModelProviderExtendService()
-        # 同步供应商+模型名称的模型数据
-        provider_model_records = TenantExtendService.get_sync_all_model()
-        for provider_model_record in provider_model_records:
-            logging.info(f"{tenant_id} 同步的模型所在工作区: {provider_model_record.tenant_id}")
-            logging.info(f"{tenant_id} 同步的模型provider_name: {provider_model_record.provider_name}")
-            logging.info(f"{tenant_id} 同步的模型model_type {provider_model_record.model_type}")
-            logging.info(f"{tenant_id} 同步的模型model_name: {provider_model_record.model_name}")
-            origin_credentials = model_provider_service_extend.get_model_credentials_obfuscated(
-                tenant_id=provider_model_record.tenant_id,
-                provider=provider_model_record.provider_name,
-                model_type=provider_model_record.model_type,
-                model=provider_model_record.model_name,
+        logger.info("开始同步所有模型到工作区: %s", tenant_id)
+        result = ModelExtendService.sync_models_to_tenants([tenant_id], ModelExtendService.load_sync_sources())
+        return result.failed == 0
+
+    @staticmethod
+    def dispatch_sync_all_models(tenant_ids: Optional[Sequence[str]] = None) -> str:
+        """
+        把所有全量同步的模型按工作区分片，派发异步任务同步
+        :param tenant_ids: 工作区id，为空时同步到所有正常状态的工作区
+        :return: 同步任务id，用于查询进度
+        """
+        from tasks.extend.sync_model_to_tenants_task_extend import sync_model_to_tenants_task_extend
+
+        if tenant_ids is None:
+            tenant_ids = db.session.scalars(select(Tenant.id).where(Tenant.status == TenantStatus.NORMAL)).all()
+
+        job_id = str(uuid.uuid4())
+        key = ModelExtendService.PROGRESS_KEY.format(job_id=job_id)
+        redis_client.hset(key, mapping={"total": len(tenant_ids), "synced": 0, "failed": 0})
+        redis_client.expire(key, dify_config.MODEL_SYNC_EXTEND_PROGRESS_TTL)
+
+        chunk_size = dify_config.MODEL_SYNC_EXTEND_TASK_CHUNK_SIZE
+        for i in range(0, len(tenant_ids), chunk_size):
+            sync_model_to_tenants_task_extend.delay(job_id, list(tenant_ids[i : i + chunk_size]))
+
+        logger.info("模型同步任务 %s：共 %s 个工作区", job_id, len(tenant_ids))
+        return job_id
+
+    @staticmethod
+    def record_sync_progress(job_id: str, result: ModelSyncResult) -> None:
+        key = ModelExtendService.PROGRESS_KEY.format(job_id=job_id)
+        try:
+            with redis_client.pipeline() as pipe:
+                pipe.hincrby(key, "synced", result.synced)
+                pipe.hincrby(key, "failed", result.failed)
+                pipe.execute()
+        except Exception:
+            logger.exception("模型同步任务 %s：进度更新失败", job_id)
+
+    @staticmethod
+    def get_sync_progress(job_id: str) -> Optional[dict]:
+        """
+        查询同步任务进度
+        :param job_id: 同步任务id
+        :return: 进度，任务不存在或已过期时为 None
+        """
+        progress = {
+            (key.decode() if isinstance(key, bytes) else key): int(value)
+            for key, value in redis_client.hgetall(ModelExtendService.PROGRESS_KEY.format(job_id=job_id)).items()
+        }
+        if not progress:
+            return None
+
+        total, synced, failed = progress.get("total", 0), progress.get("synced", 0), progress.get("failed", 0)
+        return {
+            "job_id": job_id,
+            "status": "completed" if synced + failed >= total else "processing",
+            "total": total,
+            "synced": synced,
+            "failed": failed,
+        }
+
+    @staticmethod
+    def load_sync_sources() -> list[ModelSyncSource]:
+        """
+        加载所有全量同步的模型、供应商凭证，每个来源工作区的配置只加载一次
+        """
+        provider_manager = ProviderManager()
+        configurations: dict[str, ProviderConfigurations] = {}
+
+        def get_provider_configuration(tenant_id: str, provider: str) -> Optional[ProviderConfiguration]:
+            if tenant_id not in configurations:
+                configurations[tenant_id] = provider_manager.get_configurations(tenant_id)
+            return configurations[tenant_id].get(provider)
+
+        sources = []
+        # 供应商+模型名称的模型数据
+        for provider_model_record in TenantExtendService.get_sync_all_model():
+            provider_configuration = get_provider_configuration(
+                provider_model_record.tenant_id, provider_model_record.provider_name
             )
-            # 查不到相应的凭证
-            if origin_credentials is None:
-                logging.info(
-                    f"{tenant_id} 同步失败: {provider_model_record.provider_name}，{provider_model_record.model_name}"
+            model_type = ModelType.value_of(provider_model_record.model_type)
+            credentials = (
+                provider_configuration.get_custom_model_credentials(
+                    model_type=model_type, model=provider_model_record.model_name, obfuscated=False
                 )
+                if provider_configuration
+                else None
+            )
+            # 查不到相应的凭证
+            if provider_configuration is None or credentials is None:
+                logger.info("同步失败: %s，%s", provider_model_record.provider_name, provider_model_record.model_name)
                 continue
 
-            model_id = model_provider_service_extend.save_model_credentials_without_validate(
-                tenant_id=tenant_id,
-                provider=provider_model_record.provider_name,
-                model_type=provider_model_record.model_type,
-                model=provider_model_record.model_name,
-                credentials=origin_credentials,
+            model_credential_schema = provider_configuration.provider.model_credential_schema
+            sources.append(
+                ModelSyncSource(
+                    origin_id=provider_model_record.id,
+                    provider_name=provider_configuration.provider.provider,
+                    model_name=provider_model_record.model_name,
+                    model_type=model_type.to_origin_model_type(),
+                    credentials=credentials,
+                    secret_variables=provider_configuration.extract_secret_variables(
+                        model_credential_schema.credential_form_schemas if model_credential_schema else []
+                    ),
+                )
             )
 
-            model_provider_service_extend.create_tenant_model_sync_if_not_exist(
-                tenant_id=tenant_id, model_id=model_id, origin_model_id=provider_model_record.id, is_all=True
+        # 只有供应商的模型数据
+        for provider_record in TenantExtendService.get_sync_all_provider():
+            provider_configuration = get_provider_configuration(
+                provider_record.tenant_id, provider_record.provider_name
             )
-            logging.info(
-                f"{tenant_id} 同步成功: {provider_model_record.provider_name}，{provider_model_record.model_name}"
+            credentials = (
+                provider_configuration.get_custom_credentials(obfuscated=False) if provider_configuration else None
             )
+            # 查不到相应的凭证
+            if provider_configuration is None or credentials is None:
+                logger.info("同步失败: %s，%s", provider_record.tenant_id, provider_record.provider_name)
+                continue
 
-        # 同步只有供应商的模型数据
-        provider_records = TenantExtendService.get_sync_all_provider()
-        for provider_record in provider_records:
-            logging.info(f"{tenant_id} 同步的模型所在工作区: {provider_record.tenant_id}")
-            logging.info(f"{tenant_id} 同步的模型provider_name: {provider_record.provider_name}")
-            origin_provider_credentials = model_provider_service_extend.get_provider_credentials_obfuscated(
-                tenant_id=provider_record.tenant_id,
-                provider=provider_record.provider_name,
+            provider_credential_schema = provider_configuration.provider.provider_credential_schema
+            sources.append(
+                ModelSyncSource(
+                    origin_id=provider_record.id,
+                    provider_name=provider_configuration.provider.provider,
+                    credentials=credentials,
+                    secret_variables=provider_configuration.extract_secret_variables(
+                        provider_credential_schema.credential_form_schemas if provider_credential_schema else []
+                    ),
+                )
             )
 
-            # 查不到相应的凭证
-            if origin_provider_credentials is None:
-                logging.info(f"{tenant_id} 同步失败: {provider_record.tenant_id}，{provider_record.provider_name}")
-                continue
+        return sources
+
+    @staticmethod
+    def sync_models_to_tenants(tenant_ids: Sequence[str], sources: Sequence[ModelSyncSource]) -> ModelSyncResult:
+        """
+        把模型、供应商凭证同步到工作区，只写入还没有同步记录的部分，每批工作区一个事务
+        :param tenant_ids: 工作区id
+        :param sources: 需要同步的模型、供应商凭证
+        :return: 同步成功、失败的工作区数
+        """
+        result = ModelSyncResult()
+        batch_size = dify_config.MODEL_SYNC_EXTEND_BATCH_SIZE
+        for i in range(0, len(tenant_ids), batch_size):
+            batch = list(tenant_ids[i : i + batch_size])
+            try:
+                ModelExtendService._sync_batch(batch, sources)
+                result.synced += len(batch)
+            except Exception:
+                db.session.rollback()
+                logger.exception("同步失败，工作区: %s", batch)
+                result.failed += len(batch)
+
+        return result
 
-            provider_id = model_provider_service_extend.save_provider_credentials_without_validate(
-                tenant_id=tenant_id, provider=provider_record.provider_name, credentials=origin_provider_credentials
+    @staticmethod
+    def _sync_batch(tenant_ids: list[str], sources: Sequence[ModelSyncSource]) -> None:
+        # 已有同步记录的工作区-模型不再重复写入
+        synced_pairs = set(
+            db.session.execute(
+                select(TenantModelSyncExtend.tenant_id, TenantModelSyncExtend.origin_model_id).where(
+                    TenantModelSyncExtend.tenant_id.in_(tenant_ids),
+                    TenantModelSyncExtend.origin_model_id.in_([source.origin_id for source in sources]),
+                )
+            ).tuples()
+        )
+        pending = [
+            (tenant_id, source)
+            for tenant_id in tenant_ids
+            for source in sources
+            if (tenant_id, source.origin_id) not in synced_pairs
+        ]
+        if not pending:
+            return
+
+        pending_tenant_ids = {tenant_id for tenant_id, _ in pending}
+        public_keys = dict(
+            db.session.execute(
+                select(Tenant.id, Tenant.encrypt_public_key).where(Tenant.id.in_(pending_tenant_ids))
+            ).tuples()
+        )
+        provider_names = {name for source in sources for name in _provider_names(source.provider_name)}
+        provider_records = {
+            (record.tenant_id, str(ModelProviderID(record.provider_name))): record
+            for record in db.session.scalars(
+                select(Provider).where(
+                    Provider.tenant_id.in_(pending_tenant_ids),
+                    Provider.provider_type == ProviderType.CUSTOM.value,
+                    Provider.provider_name.in_(provider_names),
+                )
+            )
+        }
+        provider_model_records = {
+            (record.tenant_id, str(ModelProviderID(record.provider_name)), record.model_name, record.model_type): record
+            for record in db.session.scalars(
+                select(ProviderModel).where(
+                    ProviderModel.tenant_id.in_(pending_tenant_ids),
+                    ProviderModel.provider_name.in_(provider_names),
+                    ProviderModel.model_name.in_({source.model_name for source in sources if not source.is_provider}),
+                )
             )
-            model_provider_service_extend.create_tenant_model_sync_if_not_exist(
-                tenant_id=tenant_id, model_id=provider_id, origin_model_id=provider_record.id, is_all=True
+        }
+        preferred_records = {
+            (record.tenant_id, str(ModelProviderID(record.provider_name))): record
+            for record in db.session.scalars(
+                select(TenantPreferredModelProvider).where(
+                    TenantPreferredModelProvider.tenant_id.in_(pending_tenant_ids),
+                    TenantPreferredModelProvider.provider_name.in_(provider_names),
+                )
             )
-            logging.info(f"{tenant_id} 同步成功: {provider_record.tenant_id}，{provider_record.provider_name}")
-        return True
+        }
+
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        synced_records: list[tuple[str, str, Provider | ProviderModel]] = []
+        outdated_caches = []
+        for tenant_id, source in pending:
+            public_key = public_keys.get(tenant_id)
+            if not public_key:
+                raise ValueError(f"Tenant with id {tenant_id} not found")
+
+            encrypted_config = json.dumps(
+                {
+                    key: encrypter.encrypt_token_with_public_key(public_key, value)
+                    if key in source.secret_variables and value
+                    else value
+                    for key, value in source.credentials.items()
+                }
+            )
+
+            record: Provider | ProviderModel
+            if source.is_provider:
+                key = (tenant_id, source.provider_name)
+                provider_record = provider_records.get(key)
+                if provider_record is None:
+                    provider_record = provider_records[key] = Provider(
+                        tenant_id=tenant_id, provider_name=source.provider_name, provider_type=ProviderType.CUSTOM.value
+                    )
+                    db.session.add(provider_record)
+                record = provider_record
+                cache_type = ProviderCredentialsCacheType.PROVIDER
+
+                # 和页面保存供应商凭证一致，切换为优先使用自定义凭证
+                preferred_record = preferred_records.get(key)
+                if preferred_record is None:
+                    preferred_records[key] = TenantPreferredModelProvider(
+                        tenant_id=tenant_id,
+                        provider_name=source.provider_name,
+                        preferred_provider_type=ProviderType.CUSTOM.value,
+                    )
+                    db.session.add(preferred_records[key])
+                else:
+                    preferred_record.preferred_provider_type = ProviderType.CUSTOM.value
+            else:
+                # 不是供应商凭证时一定有模型名称和类型
+                assert source.model_name is not None
+                assert source.model_type is not None
+                model_key = (tenant_id, source.provider_name, source.model_name, source.model_type)
+                provider_model_record = provider_model_records.get(model_key)
+                if provider_model_record is None:
+                    provider_model_record = provider_model_records[model_key] = ProviderModel(
+                        tenant_id=tenant_id,
+                        provider_name=source.provider_name,
+                        model_name=source.model_name,
+                        model_type=source.model_type,
+                    )
+                    db.session.add(provider_model_record)
+                record = provider_model_record
+                cache_type = ProviderCredentialsCacheType.MODEL
+
+            # 新增的凭证还没有id，也没有缓存
+            if record.id:
+                outdated_caches.append(
+                    ProviderCredentialsCache(tenant_id=tenant_id, identity_id=record.id, cache_type=cache_type)
+                )
+
+            record.encrypted_config = encrypted_config
+            record.is_valid = True
+            record.updated_at = now
+            synced_records.append((tenant_id, source.origin_id, record))
+
+        # 新增的凭证写入后才有id
+        db.session.flush()
+        db.session.add_all(
+            TenantModelSyncExtend(tenant_id=tenant_id, model_id=record.id, origin_model_id=origin_id, is_all=True)
+            for tenant_id, origin_id, record in synced_records
+        )
+        db.session.commit()
+
+        for cache in outdated_caches:
+            cache.delete()
+
+
+def _provider_names(provider: str) -> list[str]:
+    model_provider_id = ModelProviderID(provider)
+    provider_names = [str(model_provider_id)]
+    if model_provider_id.is_langgenius():
+        provider_names.append(model_provider_id.provider_name)
+    return provider_names
@@ -0,0 +1,233 @@
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterable
+
+from cachetools import TTLCache
+from opentelemetry.metrics import get_meter
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account import Account
+from models.api_token_money_extend import ApiTokenMessageJoinsExtend
+from models.enums import CreatorUserRole
+from models.model_extend import EndUserAccountJoinsExtend
+
+logger = logging.getLogger(__name__)
+
+_meter = get_meter("payer_resolution_extend")
+_hit_counter = _meter.create_counter(
+    "extend.payer_resolution.cache.hit", description="Payer resolution cache hits", unit="{lookup}"
+)
+_miss_counter = _meter.create_counter(
+    "extend.payer_resolution.cache.miss", description="Payer resolution cache misses", unit="{lookup}"
+)
+
+_SESSION_INFO_KEY = "payer_resolution_extend_changed_end_user_ids"
+_APP_TOKENS_SESSION_INFO_KEY = "payer_resolution_extend_new_app_tokens"
+
+
+class PayerResolutionServiceExtend:
+    """
+    解析“谁付钱”的进程内缓存。
+
+    终端用户 -> 实际扣费账号、记录ID -> API密钥 两类映射都缓存在有界 TTL/LRU 缓存里，
+    EndUserAccountJoinsExtend 提交变更后本进程立即失效，并通过 Redis pub/sub 通知其他进程失效。
+    """
+
+    INVALIDATE_CHANNEL = "payer_resolution_extend_invalidate"
+
+    _lock = threading.Lock()
+    _payers: TTLCache[str, str] = TTLCache(
+        maxsize=dify_config.PAYER_RESOLUTION_CACHE_MAX_SIZE, ttl=dify_config.PAYER_RESOLUTION_CACHE_TTL
+    )
+    _app_tokens: TTLCache[str, str] = TTLCache(
+        maxsize=dify_config.PAYER_RESOLUTION_CACHE_MAX_SIZE, ttl=dify_config.PAYER_RESOLUTION_CACHE_TTL
+    )
+    _hits = 0
+    _misses = 0
+    _subscriber_started = False
+
+    @classmethod
+    def resolve(cls, payer_id: str, payer_role: CreatorUserRole) -> str:
+        return cls.resolve_many([(payer_id, payer_role)])[payer_id]
+
+    @classmethod
+    def resolve_many(cls, payers: Iterable[tuple[str, CreatorUserRole]]) -> dict[str, str]:
+        """
+        批量解析付费账号，返回 payer_id -> 实际扣费的账号ID。
+
+        web应用的请求，终端用户ID记录的是登录账号的ID，可以直接扣钱；
+        API调用，终端用户ID需要通过关联表EndUserAccountJoinsExtend找到最近绑定的账号；
+        都找不到时沿用终端用户ID本身。
+        """
+        cls._ensure_subscriber()
+
+        resolved: dict[str, str] = {}
+        end_user_ids: set[str] = set()
+        for payer_id, payer_role in payers:
+            if payer_role == CreatorUserRole.END_USER:
+                end_user_ids.add(payer_id)
+            else:
+                resolved[payer_id] = payer_id
+
+        missing = cls._get_cached(cls._payers, end_user_ids, resolved)
+        if not missing:
+            return resolved
+
+        found: dict[str, str] = {}
+        account_ids = set(db.session.scalars(select(Account.id).where(Account.id.in_(missing))).all())
+        for account_id in account_ids:
+            found[account_id] = account_id
+
+        unresolved = missing - account_ids
+        if unresolved:
+            joins = db.session.execute(
+                select(EndUserAccountJoinsExtend.end_user_id, EndUserAccountJoinsExtend.account_id)
+                .where(EndUserAccountJoinsExtend.end_user_id.in_(unresolved))
+                .order_by(EndUserAccountJoinsExtend.end_user_id, EndUserAccountJoinsExtend.created_at.desc())
+                .distinct(EndUserAccountJoinsExtend.end_user_id)
+            ).all()
+            for end_user_id, account_id in joins:
+                found[end_user_id] = account_id
+            for end_user_id in unresolved:
+                found.setdefault(end_user_id, end_user_id)
+
+        with cls._lock:
+            cls._payers.update(found)
+        resolved.update(found)
+        return resolved
+
+    @classmethod
+    def resolve_app_tokens(cls, record_ids: Iterable[str]) -> dict[str, str]:
+        """批量查询记录关联的API密钥，返回 record_id -> app_token_id，未关联密钥的记录不在结果中"""
+        resolved: dict[str, str] = {}
+        missing = cls._get_cached(cls._app_tokens, set(record_ids), resolved)
+        if not missing:
+            return resolved
+
+        rows = db.session.execute(
+            select(ApiTokenMessageJoinsExtend.record_id, ApiTokenMessageJoinsExtend.app_token_id).where(
+                ApiTokenMessageJoinsExtend.record_id.in_(missing)
+            )
+        ).all()
+        found = {record_id: app_token_id for record_id, app_token_id in rows if app_token_id}
+        # 关联记录可能晚于费用写入，只缓存命中的结果
+        with cls._lock:
+            cls._app_tokens.update(found)
+        resolved.update(found)
+        return resolved
+
+    @classmethod
+    def remember_app_token(cls, record_id: str, app_token_id: str) -> None:
+        with cls._lock:
+            cls._app_tokens[record_id] = app_token_id
+
+    @classmethod
+    def invalidate(cls, end_user_ids: Iterable[str]) -> None:
+        end_user_ids = list(end_user_ids)
+        if not end_user_ids:
+            return
+        cls._invalidate_local(end_user_ids)
+        try:
+            redis_client.publish(cls.INVALIDATE_CHANNEL, json.dumps(end_user_ids))
+        except Exception:
+            logger.exception("Failed to publish payer resolution invalidation")
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._lock:
+            cls._payers.clear()
+            cls._app_tokens.clear()
+
+    @classmethod
+    def get_stats(cls) -> dict[str, int]:
+        return {"hits": cls._hits, "misses": cls._misses, "size": len(cls._payers) + len(cls._app_tokens)}
+
+    @classmethod
+    def _get_cached(cls, cache: TTLCache, keys: set[str], resolved: dict[str, str]) -> set[str]:
+        missing: set[str] = set()
+        with cls._lock:
+            for key in keys:
+                value = cache.get(key)
+                if value is None:
+                    missing.add(key)
+                else:
+                    resolved[key] = value
+            hits = len(keys) - len(missing)
+            cls._hits += hits
+            cls._misses += len(missing)
+        if hits:
+            _hit_counter.add(hits)
+        if missing:
+            _miss_counter.add(len(missing))
+        return missing
+
+    @classmethod
+    def _invalidate_local(cls, end_user_ids: Iterable[str]) -> None:
+        with cls._lock:
+            for end_user_id in end_user_ids:
+                cls._payers.pop(end_user_id, None)
+
+    @classmethod
+    def _ensure_subscriber(cls) -> None:
+        if cls._subscriber_started:
+            return
+        with cls._lock:
+            if cls._subscriber_started:
+                return
+            cls._subscriber_started = True
+        threading.Thread(target=cls._listen_invalidation, name="payer-resolution-invalidation", daemon=True).start()
+
+    @classmethod
+    def _listen_invalidation(cls) -> None:
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(cls.INVALIDATE_CHANNEL)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        cls._invalidate_local(json.loads(message["data"]))
+            except Exception:
+                logger.exception("Payer resolution invalidation subscriber disconnected")
+            # 断线期间可能错过失效通知，清空缓存后重连
+            cls.clear()
+            time.sleep(1)
+
+
+@event.listens_for(EndUserAccountJoinsExtend, "after_insert")
+@event.listens_for(EndUserAccountJoinsExtend, "after_update")
+@event.listens_for(EndUserAccountJoinsExtend, "after_delete")
+def _on_end_user_account_join_changed(mapper, connection, target: EndUserAccountJoinsExtend):
+    session = Session.object_session(target)
+    if session is not None and target.end_user_id:
+        session.info.setdefault(_SESSION_INFO_KEY, set()).add(target.end_user_id)
+
+
+@event.listens_for(ApiTokenMessageJoinsExtend, "after_insert")
+def _on_api_token_message_join_inserted(mapper, connection, target: ApiTokenMessageJoinsExtend):
+    session = Session.object_session(target)
+    if session is not None and target.record_id and target.app_token_id:
+        session.info.setdefault(_APP_TOKENS_SESSION_INFO_KEY, {})[target.record_id] = target.app_token_id
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session):
+    end_user_ids = session.info.pop(_SESSION_INFO_KEY, None)
+    if end_user_ids:
+        PayerResolutionServiceExtend.invalidate(end_user_ids)
+    # 新写入的密钥关联直接放进缓存，扣费时不用再查关联表
+    app_tokens = session.info.pop(_APP_TOKENS_SESSION_INFO_KEY, None)
+    if app_tokens:
+        for record_id, app_token_id in app_tokens.items():
+            PayerResolutionServiceExtend.remember_app_token(record_id, app_token_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session):
+    session.info.pop(_SESSION_INFO_KEY, None)
+    session.info.pop(_APP_TOKENS_SESSION_INFO_KEY, None)
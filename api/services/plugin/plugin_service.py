@@ -9,6 +9,7 @@ from configs import dify_config
 from core.helper import marketplace
 from core.helper.download import download_with_size_limit
 from core.helper.marketplace import download_plugin_pkg
+from core.helper.plugin_model_cache import PluginModelCache
 from core.plugin.entities.bundle import PluginBundleDependency
 from core.plugin.entities.plugin import (
     GenericProviderID,
@@ -219,12 +220,16 @@ class PluginService:
         Fetch plugin installation tasks
         """
         manager = PluginInstaller()
-        return manager.fetch_plugin_installation_tasks(tenant_id, page, page_size)
+        tasks = manager.fetch_plugin_installation_tasks(tenant_id, page, page_size)
+        PluginModelCache.invalidate_installed(tenant_id, tasks)
+        return tasks
 
     @staticmethod
     def fetch_install_task(tenant_id: str, task_id: str) -> PluginInstallTask:
         manager = PluginInstaller()
-        return manager.fetch_plugin_installation_task(tenant_id, task_id)
+        task = manager.fetch_plugin_installation_task(tenant_id, task_id)
+        PluginModelCache.invalidate_installed(tenant_id, [task])
+        return task
 
     @staticmethod
     def delete_install_task(tenant_id: str, task_id: str) -> bool:
@@ -286,7 +291,7 @@ class PluginService:
             # check if the plugin is available to install
             PluginService._check_plugin_installation_scope(response.verification)
 
-        return manager.upgrade_plugin(
+        task_start_response = manager.upgrade_plugin(
             tenant_id,
             original_plugin_unique_identifier,
             new_plugin_unique_identifier,
@@ -295,6 +300,8 @@ class PluginService:
                 "plugin_unique_identifier": new_plugin_unique_identifier,
             },
         )
+        PluginModelCache.invalidate(tenant_id)
+        return task_start_response
 
     @staticmethod
     def upgrade_plugin_with_github(
@@ -310,7 +317,7 @@ class PluginService:
         """
         PluginService._check_marketplace_only_permission()
         manager = PluginInstaller()
-        return manager.upgrade_plugin(
+        task_start_response = manager.upgrade_plugin(
             tenant_id,
             original_plugin_unique_identifier,
             new_plugin_unique_identifier,
@@ -321,6 +328,8 @@ class PluginService:
                 "package": package,
             },
         )
+        PluginModelCache.invalidate(tenant_id)
+        return task_start_response
 
     @staticmethod
     def upload_pkg(tenant_id: str, pkg: bytes, verify_signature: bool = False) -> PluginDecodeResponse:
@@ -378,12 +387,14 @@ class PluginService:
 
         manager = PluginInstaller()
 
-        return manager.install_from_identifiers(
+        task_start_response = manager.install_from_identifiers(
             tenant_id,
             plugin_unique_identifiers,
             PluginInstallationSource.Package,
             [{}],
         )
+        PluginModelCache.invalidate(tenant_id)
+        return task_start_response
 
     @staticmethod
     def install_from_github(tenant_id: str, plugin_unique_identifier: str, repo: str, version: str, package: str):
@@ -394,7 +405,7 @@ class PluginService:
         PluginService._check_marketplace_only_permission()
 
         manager = PluginInstaller()
-        return manager.install_from_identifiers(
+        task_start_response = manager.install_from_identifiers(
             tenant_id,
             [plugin_unique_identifier],
             PluginInstallationSource.Github,
@@ -406,6 +417,8 @@ class PluginService:
                 }
             ],
         )
+        PluginModelCache.invalidate(tenant_id)
+        return task_start_response
 
     @staticmethod
     def fetch_marketplace_pkg(tenant_id: str, plugin_unique_identifier: str) -> PluginDeclaration:
@@ -473,17 +486,21 @@ class PluginService:
                 actual_plugin_unique_identifiers.append(response.unique_identifier)
                 metas.append({"plugin_unique_identifier": response.unique_identifier})
 
-        return manager.install_from_identifiers(
+        task_start_response = manager.install_from_identifiers(
             tenant_id,
             actual_plugin_unique_identifiers,
             PluginInstallationSource.Marketplace,
             metas,
         )
+        PluginModelCache.invalidate(tenant_id)
+        return task_start_response
 
     @staticmethod
     def uninstall(tenant_id: str, plugin_installation_id: str) -> bool:
         manager = PluginInstaller()
-        return manager.uninstall(tenant_id, plugin_installation_id)
+        result = manager.uninstall(tenant_id, plugin_installation_id)
+        PluginModelCache.invalidate(tenant_id)
+        return result
 
     @staticmethod
     def check_tools_existence(tenant_id: str, provider_ids: Sequence[GenericProviderID]) -> Sequence[bool]:
@@ -0,0 +1,246 @@
+import logging
+import time
+import uuid
+from collections.abc import Iterable
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import BaseModel
+from redis.commands.core import Script
+from sqlalchemy import select
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account_money_extend import AccountMoneyExtend
+from models.api_token_money_extend import ApiTokenMoneyExtend
+from services.errors.quota_extend import (
+    AccountQuotaExceededErrorExtend,
+    ApiTokenDayQuotaExceededErrorExtend,
+    ApiTokenMonthQuotaExceededErrorExtend,
+    QuotaExceededErrorExtend,
+)
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] 余额 hash，KEYS[2] 预占 zset；ARGV: 当前毫秒时间、预占过期毫秒时间、预占ID、单次预占金额、是否预占（1/0）
+# 返回 -1 表示余额未加载，1 表示额度不足，0 表示放行
+_ADMIT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+  return -1
+end
+local remaining = redis.call('HGET', KEYS[1], 'remaining')
+if not remaining then
+  return 0
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+local reservation = tonumber(ARGV[4])
+if tonumber(remaining) - redis.call('ZCARD', KEYS[2]) * reservation <= 0 then
+  return 1
+end
+if ARGV[5] == '1' and reservation > 0 then
+  redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+  redis.call('PEXPIREAT', KEYS[2], ARGV[2])
+end
+return 0
+"""
+
+# KEYS[1] 余额 hash；ARGV[1] 余额变化量。只更新已加载的余额，未加载的下次从数据库读取
+_CONSUME_SCRIPT = """
+if redis.call('HEXISTS', KEYS[1], 'remaining') == 1 then
+  return redis.call('HINCRBYFLOAT', KEYS[1], 'remaining', ARGV[1])
+end
+return false
+"""
+
+_scripts: dict[str, Script] = {}
+
+
+def _script(source: str) -> Script:
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = redis_client.register_script(source)
+    return script
+
+
+class QuotaAdmissionTicket(BaseModel):
+    """一次调用在额度上的预占，调用结束后释放"""
+
+    ticket_id: str
+    reservation_keys: list[str] = []
+
+
+class _BalanceKey(BaseModel):
+    kind: str
+    entity_id: str
+
+    @property
+    def key(self) -> str:
+        # 余额与预占使用同一个 hash tag，兼容 Redis Cluster
+        return f"{QuotaAdmissionServiceExtend.KEY_PREFIX}:{{{self.kind}:{self.entity_id}}}"
+
+    @property
+    def reservation_key(self) -> str:
+        return f"{self.key}:reservations"
+
+
+class QuotaAdmissionServiceExtend:
+    """
+    调用前的额度准入。
+
+    账号、API密钥日额度、API密钥月额度的剩余额度常驻 Redis，准入判断是一次 Lua 原子操作，
+    不访问数据库；每次放行预占一小笔额度，避免同一账号的并发请求在扣费前集中超支。
+    余额在 TTL 到期后从数据库重新加载，计费流水落库后同步扣减，额度重置后主动失效。
+    """
+
+    KEY_PREFIX = "quota_admission_extend"
+
+    ACCOUNT = "account"
+    API_TOKEN_DAY = "api_token_day"
+    API_TOKEN_MONTH = "api_token_month"
+
+    _ERRORS: dict[str, type[QuotaExceededErrorExtend]] = {
+        ACCOUNT: AccountQuotaExceededErrorExtend,
+        API_TOKEN_DAY: ApiTokenDayQuotaExceededErrorExtend,
+        API_TOKEN_MONTH: ApiTokenMonthQuotaExceededErrorExtend,
+    }
+
+    @classmethod
+    def check(cls, account_id: Optional[str] = None, app_token_id: Optional[str] = None) -> None:
+        """与 admit 的判断相同，已有的预占也计入，但不预占"""
+        cls._admit(cls._balance_keys(account_id, app_token_id), reserve=False)
+
+    @classmethod
+    def admit(cls, account_id: Optional[str] = None, app_token_id: Optional[str] = None) -> QuotaAdmissionTicket:
+        """判断额度并预占，额度不足时抛出 QuotaExceededErrorExtend"""
+        return cls._admit(cls._balance_keys(account_id, app_token_id), reserve=True)
+
+    @classmethod
+    def release(cls, ticket: QuotaAdmissionTicket) -> None:
+        if not ticket.reservation_keys:
+            return
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for reservation_key in ticket.reservation_keys:
+                    pipe.zrem(reservation_key, ticket.ticket_id)
+                pipe.execute()
+        except Exception:
+            # 预占会自然过期，释放失败不影响调用
+            logger.exception("Failed to release quota reservation %s", ticket.ticket_id)
+
+    @classmethod
+    def consume(cls, account_deltas: dict[str, Decimal], app_token_deltas: dict[str, Decimal]) -> None:
+        """费用落库后同步扣减已加载的余额"""
+        balances: list[tuple[_BalanceKey, Decimal]] = [
+            (_BalanceKey(kind=cls.ACCOUNT, entity_id=account_id), delta) for account_id, delta in account_deltas.items()
+        ]
+        for app_token_id, delta in app_token_deltas.items():
+            balances.append((_BalanceKey(kind=cls.API_TOKEN_DAY, entity_id=app_token_id), delta))
+            balances.append((_BalanceKey(kind=cls.API_TOKEN_MONTH, entity_id=app_token_id), delta))
+        if not balances:
+            return
+
+        consume_script = _script(_CONSUME_SCRIPT)
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for balance, delta in balances:
+                    consume_script(keys=[balance.key], args=[str(-delta)], client=pipe)
+                pipe.execute()
+        except Exception:
+            logger.exception("Failed to consume quota admission balances")
+
+    @classmethod
+    def invalidate(cls, kind: str, entity_ids: Iterable[str]) -> None:
+        """额度在数据库中被重置或修改后，删除缓存的余额，下次准入时重新加载"""
+        keys = [_BalanceKey(kind=kind, entity_id=entity_id).key for entity_id in entity_ids]
+        if not keys:
+            return
+        try:
+            with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.delete(key)
+                pipe.execute()
+        except Exception:
+            logger.exception("Failed to invalidate quota admission balances")
+
+    @classmethod
+    def _balance_keys(cls, account_id: Optional[str], app_token_id: Optional[str]) -> list[_BalanceKey]:
+        balances = []
+        if account_id:
+            balances.append(_BalanceKey(kind=cls.ACCOUNT, entity_id=account_id))
+        if app_token_id:
+            balances.append(_BalanceKey(kind=cls.API_TOKEN_DAY, entity_id=app_token_id))
+            balances.append(_BalanceKey(kind=cls.API_TOKEN_MONTH, entity_id=app_token_id))
+        return balances
+
+    @classmethod
+    def _admit(cls, balances: list[_BalanceKey], reserve: bool) -> QuotaAdmissionTicket:
+        ticket = QuotaAdmissionTicket(ticket_id=str(uuid.uuid4()))
+        reservation = Decimal(str(dify_config.QUOTA_ADMISSION_EXTEND_RESERVATION))
+        admit_script = _script(_ADMIT_SCRIPT)
+        now_ms = int(time.time() * 1000)
+        expire_at_ms = now_ms + dify_config.QUOTA_ADMISSION_EXTEND_RESERVATION_TTL * 1000
+
+        for balance in balances:
+            args: list[str | int] = [now_ms, expire_at_ms, ticket.ticket_id, str(reservation), 1 if reserve else 0]
+            result = admit_script(keys=[balance.key, balance.reservation_key], args=args)
+            if result == -1:
+                cls._load(balance)
+                result = admit_script(keys=[balance.key, balance.reservation_key], args=args)
+
+            if result == 1:
+                cls.release(ticket)
+                raise cls._ERRORS[balance.kind]()
+            if reserve and reservation > 0:
+                ticket.reservation_keys.append(balance.reservation_key)
+        return ticket
+
+    @classmethod
+    def _load(cls, balance: _BalanceKey) -> None:
+        remaining = cls._load_remaining(balance)
+        mapping: dict[str, str | int] = {"loaded_at": int(time.time())}
+        if remaining is not None:
+            mapping["remaining"] = str(remaining)
+
+        with redis_client.pipeline(transaction=True) as pipe:
+            pipe.delete(balance.key)
+            pipe.hset(balance.key, mapping=mapping)
+            pipe.expire(balance.key, dify_config.QUOTA_ADMISSION_EXTEND_BALANCE_TTL)
+            pipe.execute()
+
+    @classmethod
+    def _load_remaining(cls, balance: _BalanceKey) -> Optional[Decimal]:
+        """从数据库读取剩余额度，None 表示不限额"""
+        if balance.kind == cls.ACCOUNT:
+            account_money = db.session.execute(
+                select(AccountMoneyExtend.total_quota, AccountMoneyExtend.used_quota)
+                .where(AccountMoneyExtend.account_id == balance.entity_id)
+                .limit(1)
+            ).first()
+            if not account_money:
+                # 首次扣费时才会创建额度记录，初始总额度为 ACCOUNT_TOTAL_QUOTA
+                return Decimal(str(dify_config.ACCOUNT_TOTAL_QUOTA))
+            total_quota, used_quota = account_money
+            if total_quota is None:
+                return None
+            return Decimal(total_quota) - Decimal(used_quota or 0)
+
+        api_token_money = db.session.execute(
+            select(
+                ApiTokenMoneyExtend.day_limit_quota,
+                ApiTokenMoneyExtend.day_used_quota,
+                ApiTokenMoneyExtend.month_limit_quota,
+                ApiTokenMoneyExtend.month_used_quota,
+            )
+            .where(ApiTokenMoneyExtend.app_token_id == balance.entity_id)
+            .limit(1)
+        ).first()
+        if not api_token_money:
+            logger.warning("数据异常，该密钥没有额度数据: %s", balance.entity_id)
+            return None
+        day_limit, day_used, month_limit, month_used = api_token_money
+        limit, used = (day_limit, day_used) if balance.kind == cls.API_TOKEN_DAY else (month_limit, month_used)
+        # -1 表示不限额
+        if limit is None or limit == -1:
+            return None
+        return Decimal(limit) - Decimal(used or 0)
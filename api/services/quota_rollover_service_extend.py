@@ -0,0 +1,185 @@
+import datetime
+import logging
+from typing import Optional
+
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import exists, insert, literal, select, update
+
+from configs import dify_config
+from extensions.ext_database import db
+from extensions.ext_redis import redis_client
+from models.account_money_daily_stat_extend import AccountMoneyDailyStatExtend
+from models.account_money_extend import AccountMoneyExtend
+from models.account_money_monthly_stat_extend import AccountMoneyMonthlyStatExtend
+from models.api_token_money_extend import (
+    ApiTokenMoneyDailyStatExtend,
+    ApiTokenMoneyExtend,
+    ApiTokenMoneyMonthlyStatExtend,
+)
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaRolloverJob(BaseModel):
+    """
+    一个额度快照 / 重置任务的定义。
+
+    source_model 中每一行按 key_column 快照到 stat_model，copy_columns 原样复制，
+    reset_column 不为空时在同一事务内清零。
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str
+    source_model: type[AccountMoneyExtend] | type[ApiTokenMoneyExtend]
+    stat_model: (
+        type[AccountMoneyDailyStatExtend]
+        | type[AccountMoneyMonthlyStatExtend]
+        | type[ApiTokenMoneyDailyStatExtend]
+        | type[ApiTokenMoneyMonthlyStatExtend]
+    )
+    key_column: str
+    copy_columns: list[str]
+    reset_column: Optional[str] = None
+    monthly: bool = False
+    # 清零后需要失效的准入余额类型
+    admission_kind: Optional[str] = None
+
+
+ACCOUNT_MONTHLY_JOB = QuotaRolloverJob(
+    name="account_monthly",
+    source_model=AccountMoneyExtend,
+    stat_model=AccountMoneyMonthlyStatExtend,
+    key_column="account_id",
+    copy_columns=["total_quota", "used_quota"],
+    reset_column="used_quota",
+    monthly=True,
+    admission_kind=QuotaAdmissionServiceExtend.ACCOUNT,
+)
+
+# 账号额度按月计算，日任务只做快照不清零
+ACCOUNT_DAILY_JOB = QuotaRolloverJob(
+    name="account_daily",
+    source_model=AccountMoneyExtend,
+    stat_model=AccountMoneyDailyStatExtend,
+    key_column="account_id",
+    copy_columns=["total_quota", "used_quota"],
+)
+
+API_TOKEN_DAILY_JOB = QuotaRolloverJob(
+    name="api_token_daily",
+    source_model=ApiTokenMoneyExtend,
+    stat_model=ApiTokenMoneyDailyStatExtend,
+    key_column="app_token_id",
+    copy_columns=["accumulated_quota", "day_used_quota", "day_limit_quota"],
+    reset_column="day_used_quota",
+    admission_kind=QuotaAdmissionServiceExtend.API_TOKEN_DAY,
+)
+
+API_TOKEN_MONTHLY_JOB = QuotaRolloverJob(
+    name="api_token_monthly",
+    source_model=ApiTokenMoneyExtend,
+    stat_model=ApiTokenMoneyMonthlyStatExtend,
+    key_column="app_token_id",
+    copy_columns=["accumulated_quota", "month_used_quota", "month_limit_quota"],
+    reset_column="month_used_quota",
+    monthly=True,
+    admission_kind=QuotaAdmissionServiceExtend.API_TOKEN_MONTH,
+)
+
+
+class QuotaRolloverServiceExtend:
+    """
+    基于集合的额度快照与重置。
+
+    按主键分块（keyset 分页），每块在一个事务内执行 INSERT ... SELECT 快照，
+    并只清零本块中本周期刚快照的行：同一周期重复执行不会重复快照或重复清零，
+    崩溃后从 Redis 中记录的游标继续执行。
+    """
+
+    @staticmethod
+    def period_start(job: QuotaRolloverJob, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        now = now or datetime.datetime.now()
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if job.monthly:
+            start = start.replace(day=1)
+        return start
+
+    @classmethod
+    def rollover(
+        cls, job: QuotaRolloverJob, now: Optional[datetime.datetime] = None, chunk_size: Optional[int] = None
+    ) -> int:
+        """执行一次快照 / 重置，返回本次新快照的行数"""
+        now = now or datetime.datetime.now()
+        chunk_size = chunk_size or dify_config.QUOTA_ROLLOVER_EXTEND_CHUNK_SIZE
+        stat_at = cls.period_start(job, now)
+
+        cursor_key = f"quota_rollover_extend:{job.name}:{stat_at.strftime('%Y%m%d')}"
+        lock = redis_client.lock(f"{cursor_key}:lock", timeout=dify_config.QUOTA_ROLLOVER_EXTEND_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            logger.info("Quota rollover %s is already running, skip", job.name)
+            return 0
+
+        try:
+            cursor = redis_client.get(cursor_key)
+            last_id: Optional[str] = cursor.decode() if cursor else None
+            snapshotted = 0
+            while True:
+                ids = cls._next_chunk(job, last_id, chunk_size)
+                if not ids:
+                    break
+                snapshotted += cls._rollover_chunk(job, ids, stat_at, now)
+                last_id = ids[-1]
+                # 游标只用于跳过已处理的块，保留到周期结束之后
+                redis_client.setex(cursor_key, datetime.timedelta(days=32 if job.monthly else 2), last_id)
+            return snapshotted
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _next_chunk(job: QuotaRolloverJob, last_id: Optional[str], chunk_size: int) -> list[str]:
+        source = job.source_model
+        stmt = select(source.id).order_by(source.id).limit(chunk_size)
+        if last_id:
+            stmt = stmt.where(source.id > last_id)
+        return list(db.session.scalars(stmt).all())
+
+    @staticmethod
+    def _rollover_chunk(
+        job: QuotaRolloverJob, ids: list[str], stat_at: datetime.datetime, now: datetime.datetime
+    ) -> int:
+        source, stat = job.source_model, job.stat_model
+        source_key = getattr(source, job.key_column)
+        stat_key = getattr(stat, job.key_column)
+
+        already_snapshotted = exists().where(stat_key == source_key, stat.stat_at == stat_at)
+        snapshot = select(
+            source_key,
+            *[getattr(source, column) for column in job.copy_columns],
+            literal(stat_at, stat.stat_at.type),
+            literal(now, stat.created_at.type),
+            literal(now, stat.updated_at.type),
+        ).where(source.id.in_(ids), source_key.is_not(None), ~already_snapshotted)
+
+        try:
+            snapshotted_keys = db.session.scalars(
+                insert(stat)
+                .from_select([job.key_column, *job.copy_columns, "stat_at", "created_at", "updated_at"], snapshot)
+                .returning(stat_key)
+            ).all()
+
+            if job.reset_column and snapshotted_keys:
+                db.session.execute(
+                    update(source)
+                    .where(source.id.in_(ids), source_key.in_(snapshotted_keys))
+                    .values({job.reset_column: 0, "updated_at": now})
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if job.reset_column and job.admission_kind and snapshotted_keys:
+            QuotaAdmissionServiceExtend.invalidate(job.admission_kind, snapshotted_keys)
+        return len(snapshotted_keys)
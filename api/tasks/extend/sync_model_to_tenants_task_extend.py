@@ -0,0 +1,41 @@
+import logging
+import time
+
+import click
+from celery import shared_task  # type: ignore
+
+from services.model_service_extend import ModelExtendService, ModelSyncResult
+
+
+@shared_task(queue="extend_low", bind=True, max_retries=3)
+def sync_model_to_tenants_task_extend(self, job_id: str, tenant_ids: list[str]):
+    """
+    把全量同步的模型同步到一批工作区
+    :param job_id: 同步任务id
+    :param tenant_ids: 工作区id
+
+    Usage: sync_model_to_tenants_task_extend.delay(job_id, tenant_ids)
+    """
+    logging.info(click.style(f"模型同步任务 {job_id}：开始同步 {len(tenant_ids)} 个工作区", fg="cyan"))
+    start_at = time.perf_counter()
+
+    try:
+        sources = ModelExtendService.load_sync_sources()
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            logging.exception(click.style(f"模型同步任务 {job_id}：加载同步模型失败", fg="red"))
+            ModelExtendService.record_sync_progress(job_id, ModelSyncResult(failed=len(tenant_ids)))
+            return
+        logging.exception(click.style(f"模型同步任务 {job_id}：加载同步模型失败，60秒后进行重试", fg="red"))
+        raise self.retry(exc=e, countdown=60)
+
+    result = ModelExtendService.sync_models_to_tenants(tenant_ids, sources)
+    ModelExtendService.record_sync_progress(job_id, result)
+
+    end_at = time.perf_counter()
+    logging.info(
+        click.style(
+            f"模型同步任务 {job_id}：成功 {result.synced}，失败 {result.failed}，耗时 {end_at - start_at:.2f}s",
+            fg="green",
+        )
+    )
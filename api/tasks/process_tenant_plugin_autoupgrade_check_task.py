@@ -1,3 +1,4 @@
+import time
 import traceback
 import typing
 
@@ -6,11 +7,15 @@ from celery import shared_task  # type: ignore
 
 from core.helper import marketplace
 from core.helper.marketplace import MarketplacePluginDeclaration
+from core.helper.plugin_model_cache import PluginModelCache
 from core.plugin.entities.plugin import PluginInstallationSource
+from core.plugin.entities.plugin_daemon import PluginInstallTaskStartResponse, PluginInstallTaskStatus
 from core.plugin.impl.plugin import PluginInstaller
 from models.account import TenantPluginAutoUpgradeStrategy
 
 RETRY_TIMES_OF_ONE_PLUGIN_IN_ONE_TENANT = 3
+UPGRADE_TASK_POLL_INTERVAL = 3
+UPGRADE_TASK_WAIT_TIMEOUT = 120
 
 
 cached_plugin_manifests: dict[str, typing.Union[MarketplacePluginDeclaration, None]] = {}
@@ -44,6 +49,36 @@ def marketplace_batch_fetch_plugin_manifests(
     return result
 
 
+def invalidate_plugin_model_cache_after_upgrades(
+    manager: PluginInstaller, tenant_id: str, task_start_responses: list[PluginInstallTaskStartResponse]
+) -> None:
+    """
+    Upgrades run asynchronously in the plugin daemon, wait for their install tasks and drop the cached model
+    providers of the tenant once the upgraded plugins are installed.
+    """
+    if any(response.all_installed for response in task_start_responses):
+        PluginModelCache.invalidate(tenant_id)
+
+    pending_task_ids = {response.task_id for response in task_start_responses if not response.all_installed}
+    deadline = time.monotonic() + UPGRADE_TASK_WAIT_TIMEOUT
+    while pending_task_ids and time.monotonic() < deadline:
+        time.sleep(UPGRADE_TASK_POLL_INTERVAL)
+        for task_id in list(pending_task_ids):
+            try:
+                task = manager.fetch_plugin_installation_task(tenant_id, task_id)
+            except Exception as e:
+                click.echo(click.style(f"Error when fetching upgrade task {task_id}: {e}", fg="red"))
+                continue
+            if task.status in {PluginInstallTaskStatus.Pending, PluginInstallTaskStatus.Running}:
+                continue
+            pending_task_ids.discard(task_id)
+            PluginModelCache.invalidate_installed(tenant_id, [task])
+
+    if pending_task_ids:
+        click.echo(click.style(f"Upgrade tasks still running after {UPGRADE_TASK_WAIT_TIMEOUT}s", fg="yellow"))
+        PluginModelCache.invalidate(tenant_id)
+
+
 @shared_task(queue="plugin")
 def process_tenant_plugin_autoupgrade_check_task(
     tenant_id: str,
@@ -109,6 +144,7 @@ def process_tenant_plugin_autoupgrade_check_task(
         if not manifests:
             return
 
+        task_start_responses: list[PluginInstallTaskStartResponse] = []
         for manifest in manifests:
             for plugin_id, version, original_unique_identifier in plugin_ids:
                 if manifest.plugin_id != plugin_id:
@@ -155,11 +191,14 @@ def process_tenant_plugin_autoupgrade_check_task(
                                 "plugin_unique_identifier": new_unique_identifier,
                             },
                         )
+                        task_start_responses.append(task_start_resp)
                 except Exception as e:
                     click.echo(click.style(f"Error when upgrading plugin: {e}", fg="red"))
                     traceback.print_exc()
                 break
 
+        invalidate_plugin_model_cache_after_upgrades(manager, tenant_id, task_start_responses)
+
     except Exception as e:
         click.echo(click.style(f"Error when checking upgradable plugin: {e}", fg="red"))
         traceback.print_exc()
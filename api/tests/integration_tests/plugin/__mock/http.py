@@ -55,7 +55,11 @@ MOCK_SWITCH = os.getenv("MOCK_SWITCH", "false").lower() == "true"
 @pytest.fixture
 def setup_http_mock(request, monkeypatch: MonkeyPatch):
     if MOCK_SWITCH:
-        monkeypatch.setattr(requests, "request", MockedHttp.requests_request)
+        monkeypatch.setattr(
+            requests.Session,
+            "request",
+            lambda session, method, url, **kwargs: MockedHttp.requests_request(method, url, **kwargs),
+        )
 
         def unpatch():
             monkeypatch.undo()
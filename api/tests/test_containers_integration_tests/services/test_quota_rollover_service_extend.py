@@ -0,0 +1,84 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, func, insert, select
+
+from extensions.ext_redis import redis_client
+from models.account_money_extend import AccountMoneyExtend
+from models.account_money_monthly_stat_extend import AccountMoneyMonthlyStatExtend
+from services.quota_rollover_service_extend import ACCOUNT_MONTHLY_JOB, QuotaRolloverServiceExtend
+
+
+def _seed_accounts(session, count: int) -> None:
+    session.execute(delete(AccountMoneyMonthlyStatExtend))
+    session.execute(delete(AccountMoneyExtend))
+    session.execute(
+        insert(AccountMoneyExtend),
+        [
+            {"account_id": str(uuid.uuid4()), "total_quota": Decimal(15), "used_quota": Decimal("1.5")}
+            for _ in range(count)
+        ],
+    )
+    session.commit()
+
+
+def _legacy_rollover(session) -> None:
+    """改造前的实现：逐行加载 ORM 对象再 add_all，用于基准对比"""
+    stats = []
+    for account in session.query(AccountMoneyExtend).all():
+        stats.append(
+            AccountMoneyMonthlyStatExtend(
+                account_id=account.account_id,
+                total_quota=account.total_quota,
+                used_quota=account.used_quota,
+                stat_at=datetime.datetime.now(),
+                updated_at=datetime.datetime.now(),
+                created_at=datetime.datetime.now(),
+            )
+        )
+    session.add_all(stats)
+    session.query(AccountMoneyExtend).update({AccountMoneyExtend.used_quota: 0})
+    session.commit()
+
+
+class TestQuotaRolloverServiceExtend:
+    def test_rollover_is_idempotent_per_period(self, db_session_with_containers):
+        _seed_accounts(db_session_with_containers, 250)
+        now = datetime.datetime(2024, 8, 1, 0, 0, 3)
+
+        first = QuotaRolloverServiceExtend.rollover(ACCOUNT_MONTHLY_JOB, now=now, chunk_size=100)
+        # 模拟崩溃后重跑：清掉游标，依赖 NOT EXISTS 保证不重复快照
+        redis_client.delete("quota_rollover_extend:account_monthly:20240801")
+        second = QuotaRolloverServiceExtend.rollover(ACCOUNT_MONTHLY_JOB, now=now, chunk_size=100)
+
+        assert first == 250
+        assert second == 0
+        stats = db_session_with_containers.scalars(select(AccountMoneyMonthlyStatExtend)).all()
+        assert len(stats) == 250
+        assert all(stat.used_quota == Decimal("1.5") for stat in stats)
+        assert all(stat.stat_at == datetime.datetime(2024, 8, 1) for stat in stats)
+        assert db_session_with_containers.scalar(select(func.sum(AccountMoneyExtend.used_quota))) == 0
+
+    @pytest.mark.benchmark(group="quota_rollover")
+    @pytest.mark.parametrize("account_count", [1_000, 10_000, 50_000])
+    @pytest.mark.parametrize("implementation", ["legacy", "set_based"])
+    def test_rollover_benchmark(self, benchmark, db_session_with_containers, account_count, implementation):
+        def setup():
+            _seed_accounts(db_session_with_containers, account_count)
+            redis_client.delete("quota_rollover_extend:account_monthly:20240901")
+
+        def set_based_rollover():
+            QuotaRolloverServiceExtend.rollover(
+                ACCOUNT_MONTHLY_JOB, now=datetime.datetime(2024, 9, 1), chunk_size=5_000
+            )
+
+        def legacy_rollover():
+            _legacy_rollover(db_session_with_containers)
+
+        rollover = legacy_rollover if implementation == "legacy" else set_based_rollover
+        benchmark.pedantic(rollover, setup=setup, rounds=1)
+
+        stat_count = db_session_with_containers.scalar(select(func.count()).select_from(AccountMoneyMonthlyStatExtend))
+        assert stat_count == account_count
@@ -0,0 +1,93 @@
+import inspect
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+from flask import Flask
+from werkzeug.exceptions import Forbidden, NotFound
+
+from commands import sync_all_models_extend
+from controllers.console.workspace import model_sync_extend
+from controllers.console.workspace.model_sync_extend import ModelSyncApi, ModelSyncProgressApi
+
+PROGRESS = {"job_id": "job-1", "status": "processing", "total": 3, "synced": 1, "failed": 0}
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+@pytest.fixture
+def model_service():
+    with patch.object(model_sync_extend, "ModelExtendService") as service:
+        service.dispatch_sync_all_models.return_value = "job-1"
+        service.get_sync_progress.return_value = PROGRESS
+        yield service
+
+
+@pytest.fixture
+def super_admin():
+    with (
+        patch.object(model_sync_extend, "current_user", MagicMock(id="admin")),
+        patch.object(model_sync_extend, "TenantExtendService") as tenant_service,
+    ):
+        tenant_service.get_super_admin_id.return_value.id = "admin"
+        yield tenant_service
+
+
+def _call(resource, method, *args):
+    # 跳过 setup_required、login_required 等登录校验
+    return inspect.unwrap(getattr(resource, method))(resource(), *args)
+
+
+class TestModelSyncApi:
+    def test_start_sync(self, app, model_service, super_admin):
+        with app.test_request_context(method="POST", json={"tenant_ids": ["tenant-1", "tenant-2"]}):
+            assert _call(ModelSyncApi, "post") == ({"job_id": "job-1"}, 202)
+
+        model_service.dispatch_sync_all_models.assert_called_once_with(["tenant-1", "tenant-2"])
+
+    def test_start_sync_to_all_workspaces(self, app, model_service, super_admin):
+        with app.test_request_context(method="POST", json={}):
+            _call(ModelSyncApi, "post")
+
+        model_service.dispatch_sync_all_models.assert_called_once_with(None)
+
+    def test_only_super_admin(self, app, model_service, super_admin):
+        super_admin.get_super_admin_id.return_value.id = "another-account"
+
+        with app.test_request_context(method="POST", json={}), pytest.raises(Forbidden):
+            _call(ModelSyncApi, "post")
+
+        model_service.dispatch_sync_all_models.assert_not_called()
+
+    def test_query_progress(self, app, model_service, super_admin):
+        job_id = uuid.uuid4()
+
+        with app.test_request_context():
+            assert _call(ModelSyncProgressApi, "get", job_id) == (PROGRESS, 200)
+
+        model_service.get_sync_progress.assert_called_once_with(str(job_id))
+
+    def test_unknown_job(self, app, model_service, super_admin):
+        model_service.get_sync_progress.return_value = None
+
+        with app.test_request_context(), pytest.raises(NotFound):
+            _call(ModelSyncProgressApi, "get", uuid.uuid4())
+
+
+class TestSyncAllModelsCommand:
+    def test_start_and_query(self):
+        runner = CliRunner()
+        with patch("services.model_service_extend.ModelExtendService") as service:
+            service.dispatch_sync_all_models.return_value = "job-1"
+            service.get_sync_progress.return_value = PROGRESS
+
+            started = runner.invoke(sync_all_models_extend, ["--tenant-id", "tenant-1"])
+            queried = runner.invoke(sync_all_models_extend, ["--job-id", "job-1"])
+
+        service.dispatch_sync_all_models.assert_called_once_with(["tenant-1"])
+        assert "Model sync job job-1 started." in started.output
+        assert "processing: 1 synced, 0 failed, 3 workspaces in total." in queried.output
@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from flask import Flask
+from werkzeug.exceptions import HTTPException
+
+from controllers.service_api.app.completion import ChatApi
+from controllers.web.workflow import WorkflowRunApi
+from models.model import AppMode
+from services.errors.quota_extend import (
+    AccountQuotaExceededErrorExtend,
+    ApiTokenDayQuotaExceededErrorExtend,
+    ApiTokenMonthQuotaExceededErrorExtend,
+)
+
+
+@pytest.fixture
+def app():
+    return Flask(__name__)
+
+
+class TestQuotaExceededResponse:
+    """调用前的额度准入不足时返回 403，而不是参数错误的 400"""
+
+    @pytest.mark.parametrize(
+        ("error", "error_code"),
+        [
+            (AccountQuotaExceededErrorExtend, "Insufficient balance, call failed."),
+            (
+                ApiTokenDayQuotaExceededErrorExtend,
+                "The daily call limit for this key has been reached, the call failed!",
+            ),
+            (
+                ApiTokenMonthQuotaExceededErrorExtend,
+                "The monthly call limit for this key has been reached, the call failed!",
+            ),
+        ],
+    )
+    def test_service_api_chat(self, app, error, error_code):
+        app_model = MagicMock(mode=AppMode.CHAT.value)
+        with (
+            app.test_request_context(json={"inputs": {}, "query": "hi", "user": "user-1"}),
+            patch("controllers.service_api.app.completion.AppGenerateService.generate", side_effect=error()),
+            pytest.raises(HTTPException) as exc_info,
+        ):
+            # 跳过 validate_app_token 的密钥校验
+            ChatApi.post.__wrapped__(ChatApi(), app_model, MagicMock(), MagicMock())
+
+        assert exc_info.value.code == 403
+        assert exc_info.value.error_code == error_code
+
+    def test_web_workflow(self, app):
+        app_model = MagicMock(mode=AppMode.WORKFLOW.value)
+        with (
+            app.test_request_context(json={"inputs": {}}),
+            patch("controllers.web.workflow.is_end_login", return_value=MagicMock()),
+            patch("controllers.web.workflow.is_money_limit", return_value=False),
+            patch("controllers.web.workflow.AppGenerateServiceExtend"),
+            patch(
+                "controllers.web.workflow.AppGenerateService.generate",
+                side_effect=AccountQuotaExceededErrorExtend(),
+            ),
+            pytest.raises(HTTPException) as exc_info,
+        ):
+            WorkflowRunApi().post(app_model, MagicMock())
+
+        assert exc_info.value.code == 403
+        assert exc_info.value.error_code == "Insufficient balance, call failed."
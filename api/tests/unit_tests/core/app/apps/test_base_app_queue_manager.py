@@ -0,0 +1,157 @@
+import gc
+from typing import Optional
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+from pydantic import ConfigDict
+
+from core.app.apps.base_app_queue_manager import AppQueueManager, PublishFrom
+from core.app.apps.stop_signal import TaskStopSignal, task_stop_signal
+from core.app.entities.app_invoke_entities import InvokeFrom
+from core.app.entities.queue_entities import (
+    AppQueueEvent,
+    QueueEvent,
+    QueueTextChunkEvent,
+    QueueWorkflowSucceededEvent,
+)
+from models.model import Message
+
+
+class _QueueManager(AppQueueManager):
+    def _publish(self, event, pub_from):
+        pass
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("core.app.apps.base_app_queue_manager.redis_client") as mock_redis:
+        mock_redis.get.return_value = None
+        yield mock_redis
+
+
+class TestAppQueueManagerStopFlag:
+    def test_stop_flag_checked_at_most_once_per_interval(self, mock_redis):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+
+        with patch("core.app.apps.base_app_queue_manager.time.monotonic", side_effect=[10.0, 10.5, 11.2]):
+            assert [queue_manager._is_stopped() for _ in range(3)] == [False, False, False]
+
+        assert mock_redis.get.call_count == 2
+
+    def test_stopped_task_stays_stopped_without_redis(self, mock_redis):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+        mock_redis.get.return_value = b"1"
+
+        assert queue_manager._is_stopped() is True
+        mock_redis.get.reset_mock()
+
+        assert queue_manager._is_stopped() is True
+        mock_redis.get.assert_not_called()
+
+    def test_subscribed_stop_signal_skips_redis(self, mock_redis):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+
+        with patch.object(TaskStopSignal, "subscribed", new_callable=PropertyMock, return_value=True):
+            assert queue_manager._is_stopped() is False
+            queue_manager.on_stop_signal()
+            assert queue_manager._is_stopped() is True
+
+        mock_redis.get.assert_not_called()
+
+    def test_set_stop_flag_publishes_signal(self, mock_redis):
+        mock_redis.get.return_value = b"end-user-user-1"
+
+        with patch.object(task_stop_signal, "publish") as publish:
+            AppQueueManager.set_stop_flag("task-1", InvokeFrom.SERVICE_API, "user-1")
+
+        mock_redis.setex.assert_called_once_with("generate_task_stopped:task-1", 600, 1)
+        publish.assert_called_once_with("task-1")
+
+
+class TestTaskStopSignal:
+    def test_signal_reaches_registered_listener(self):
+        signal = TaskStopSignal()
+        listener = MagicMock()
+        with patch.object(signal, "_ensure_subscriber"):
+            signal.register("task-1", listener)
+
+        signal._notify("task-1")
+        signal._notify("task-2")
+
+        listener.on_stop_signal.assert_called_once()
+
+    def test_missed_signals_checked_after_subscribe(self):
+        signal = TaskStopSignal()
+        listeners = {task_id: MagicMock() for task_id in ("task-1", "task-2")}
+        with patch.object(signal, "_ensure_subscriber"):
+            for task_id, listener in listeners.items():
+                signal.register(task_id, listener)
+
+        with patch("core.app.apps.stop_signal.redis_client") as mock_redis:
+            mock_redis.mget.return_value = [None, b"1"]
+            signal._check_missed_signals()
+
+        mock_redis.mget.assert_called_once_with(["generate_task_stopped:task-1", "generate_task_stopped:task-2"])
+        listeners["task-1"].on_stop_signal.assert_not_called()
+        listeners["task-2"].on_stop_signal.assert_called_once()
+
+    def test_finished_tasks_are_dropped(self):
+        signal = TaskStopSignal()
+        with patch.object(signal, "_ensure_subscriber"):
+            signal.register("task-1", MagicMock())
+
+        gc.collect()
+
+        assert "task-1" not in signal._listeners
+
+
+class _ModelEvent(AppQueueEvent):
+    event: QueueEvent = QueueEvent.PING
+    message: Optional[Message] = None
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+class TestAppQueueManagerPublish:
+    def test_event_class_declaring_model_is_rejected(self, mock_redis):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+
+        with pytest.raises(TypeError, match="_ModelEvent.message is a SQLAlchemy model"):
+            queue_manager.publish(_ModelEvent(), PublishFrom.APPLICATION_MANAGER)
+
+    def test_values_scanned_only_in_debug_mode(self, mock_redis):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+        event = QueueWorkflowSucceededEvent(outputs={"message": Message()})
+
+        with patch("core.app.apps.base_app_queue_manager.dify_config") as config:
+            config.DEBUG = False
+            queue_manager.publish(event, PublishFrom.APPLICATION_MANAGER)
+
+            config.DEBUG = True
+            with pytest.raises(TypeError, match="Critical Error"):
+                queue_manager.publish(event, PublishFrom.APPLICATION_MANAGER)
+
+    @pytest.mark.benchmark(group="chunk_publish")
+    @pytest.mark.parametrize("output_size", [10, 1_000])
+    @pytest.mark.parametrize("implementation", ["legacy", "current"])
+    def test_chunk_publish_benchmark(self, benchmark, mock_redis, output_size, implementation):
+        queue_manager = _QueueManager(task_id="task-1", user_id="user-1", invoke_from=InvokeFrom.SERVICE_API)
+        chunk = QueueTextChunkEvent(text="token")
+        node_outputs = QueueWorkflowSucceededEvent(
+            outputs={f"key_{i}": {"text": "value " * 10} for i in range(output_size)}
+        )
+
+        def legacy_publish(event):
+            queue_manager._check_for_sqlalchemy_models(event.model_dump())
+            queue_manager._publish(event, PublishFrom.APPLICATION_MANAGER)
+
+        def current_publish(event):
+            queue_manager.publish(event, PublishFrom.APPLICATION_MANAGER)
+
+        publish = legacy_publish if implementation == "legacy" else current_publish
+
+        def publish_chunk_and_event():
+            publish(chunk)
+            publish(node_outputs)
+
+        benchmark(publish_chunk_and_event)
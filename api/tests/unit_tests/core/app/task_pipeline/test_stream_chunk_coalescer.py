@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+
+from core.app.entities.task_entities import (
+    MessageStreamResponse,
+    NodeStartStreamResponse,
+    PingStreamResponse,
+    StreamEvent,
+    TextChunkStreamResponse,
+)
+from core.app.task_pipeline.stream_chunk_coalescer import StreamChunkCoalescer
+
+
+def _message(answer: str, selector: list[str] | None = None) -> MessageStreamResponse:
+    return MessageStreamResponse(task_id="task-1", id="message-1", answer=answer, from_variable_selector=selector)
+
+
+def _text_chunk(text: str) -> TextChunkStreamResponse:
+    return TextChunkStreamResponse(task_id="task-1", data=TextChunkStreamResponse.Data(text=text))
+
+
+def _node_started() -> NodeStartStreamResponse:
+    return NodeStartStreamResponse(
+        task_id="task-1",
+        workflow_run_id="run-1",
+        data=NodeStartStreamResponse.Data(
+            id="execution-1",
+            node_id="node-1",
+            node_type="llm",
+            title="LLM",
+            index=1,
+            created_at=0,
+        ),
+    )
+
+
+def _answers(responses) -> list:
+    return [
+        response.answer if isinstance(response, MessageStreamResponse) else type(response).__name__
+        for response in responses
+    ]
+
+
+class TestStreamChunkCoalescer:
+    def test_merges_deltas_and_flushes_on_other_responses(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=1.0, max_bytes=1024)
+
+        responses = list(
+            coalescer.coalesce(
+                [
+                    _message("Hel"),
+                    _message("lo"),
+                    _node_started(),
+                    _message(", "),
+                    _message("world"),
+                    PingStreamResponse(task_id="task-1"),
+                    _message("!"),
+                ]
+            )
+        )
+
+        assert _answers(responses) == ["Hello", "NodeStartStreamResponse", ", world", "PingStreamResponse", "!"]
+        assert coalescer.events_saved == 2
+        assert coalescer.bytes_saved > 0
+
+    def test_flushes_when_size_reached(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=10.0, max_bytes=8)
+
+        responses = coalescer.coalesce([_message("a"), _message("b"), _message("12345678"), _message("c")])
+
+        assert _answers(responses) == ["ab12345678", "c"]
+
+    def test_flushes_when_window_ends_while_upstream_is_paused(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=0.05, max_bytes=1024)
+        resumed = threading.Event()
+
+        def deltas():
+            yield _message("a")
+            # the next delta only comes after the buffered one was sent
+            resumed.wait(timeout=10)
+            yield _message("b")
+
+        responses = coalescer.coalesce(deltas())
+        # without the window flush "a" would wait for "b" and both would be sent merged
+        first = next(responses)
+        resumed.set()
+
+        assert first.answer == "a"
+        assert _answers(responses) == ["b"]
+
+    def test_upstream_errors_are_raised(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=1.0, max_bytes=1024)
+
+        def deltas():
+            yield _message("a")
+            raise RuntimeError("boom")
+
+        responses = coalescer.coalesce(deltas())
+
+        with pytest.raises(RuntimeError, match="boom"):
+            list(responses)
+
+    def test_does_not_merge_different_selectors_or_message_files(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=1.0, max_bytes=1024)
+        message_file = _message("file")
+        message_file.event = StreamEvent.MESSAGE_FILE
+
+        responses = list(
+            coalescer.coalesce(
+                [
+                    _message("a", ["llm", "text"]),
+                    _message("b", ["llm", "text"]),
+                    _message("c", ["answer", "text"]),
+                    message_file,
+                    _message("d"),
+                ]
+            )
+        )
+
+        assert _answers(responses) == ["ab", "c", "file", "d"]
+        assert responses[2].event == StreamEvent.MESSAGE_FILE
+
+    def test_merges_workflow_text_chunks(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=1.0, max_bytes=1024)
+
+        responses = list(coalescer.coalesce([_text_chunk("foo"), _text_chunk("bar"), _node_started()]))
+
+        assert isinstance(responses[0], TextChunkStreamResponse)
+        assert responses[0].data.text == "foobar"
+        assert isinstance(responses[1], NodeStartStreamResponse)
+
+    def test_bytes_saved_matches_serialized_envelopes(self):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=1.0, max_bytes=1024)
+        deltas = [_message(token) for token in ["one ", "two ", "three"]]
+        legacy_bytes = sum(len(delta.model_dump_json()) for delta in deltas)
+
+        (merged,) = coalescer.coalesce(deltas)
+
+        assert legacy_bytes - len(merged.model_dump_json()) == coalescer.bytes_saved
+        assert coalescer.events_saved == 2
+
+    @pytest.mark.benchmark(group="stream_size")
+    @pytest.mark.parametrize("token_count", [100, 1_000])
+    @pytest.mark.parametrize("implementation", ["legacy", "coalesced"])
+    def test_stream_size_benchmark(self, benchmark, token_count, implementation):
+        coalescer = StreamChunkCoalescer(task_id="task-1", window=0.02, max_bytes=256)
+        deltas = [_message(f"token{i} ") for i in range(token_count)]
+
+        def stream() -> list[str]:
+            responses = deltas if implementation == "legacy" else coalescer.coalesce(deltas)
+            return [f"data: {response.model_dump_json()}\n\n" for response in responses]
+
+        events = benchmark(stream)
+
+        benchmark.extra_info["events"] = len(events)
+        benchmark.extra_info["bytes"] = sum(len(event) for event in events)
+        assert events
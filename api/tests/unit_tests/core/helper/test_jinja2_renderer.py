@@ -0,0 +1,106 @@
+from unittest.mock import patch
+
+import jinja2
+import pytest
+
+from core.helper.code_executor.code_executor import CodeExecutionError, CodeExecutor, CodeLanguage
+from core.helper.code_executor.jinja2.jinja2_renderer import Jinja2Renderer, Jinja2RenderError, Jinja2RenderLimitError
+
+NESTED_LOOPS_TEMPLATE = (
+    "{% set a=[1]*3000 %}{% set c=[1]*100 %}"
+    "{% for z in c %}{% for x in a %}{% for y in a %}{% endfor %}{% endfor %}{% endfor %}"
+)
+FILTER_CHAIN_TEMPLATE = "{% set a=['x']*20000 %}{% set b=[a]*5000 %}{{ b|map('join')|join|length }}"
+
+
+@pytest.fixture
+def limits():
+    Jinja2Renderer.shutdown()
+    with patch("core.helper.code_executor.jinja2.jinja2_renderer.dify_config") as config:
+        config.CODE_EXECUTION_JINJA2_LOCAL_CPU_TIME_LIMIT = 1.0
+        config.CODE_EXECUTION_JINJA2_LOCAL_MAX_OUTPUT_LENGTH = 100_000
+        config.CODE_EXECUTION_JINJA2_LOCAL_MAX_MEMORY = 256
+        config.CODE_EXECUTION_JINJA2_LOCAL_PROCESSES = 2
+        config.CODE_EXECUTION_READ_TIMEOUT = 30
+        yield config
+    Jinja2Renderer.shutdown()
+
+
+@pytest.mark.parametrize(
+    ("template", "inputs"),
+    [
+        ("Hello {{ name }}!", {"name": "World"}),
+        ("{% for item in items %}{{ loop.index }}. {{ item.title }}\n{% endfor %}", {"items": [{"title": "a"}] * 3}),
+        ("{{ missing }}|{{ value | default('none') }}|{{ '%.2f' | format(number) }}", {"value": None, "number": 1.5}),
+        ("{{ data['key'] | upper }} {{ data | tojson }}\n\n", {"data": {"key": "value", "text": "中文"}}),
+    ],
+)
+def test_renders_like_jinja2_template(limits, template, inputs):
+    assert Jinja2Renderer.render(template, inputs) == jinja2.Template(template).render(**inputs)
+
+
+def test_rejects_unsafe_access(limits):
+    with pytest.raises(Jinja2RenderError, match="SecurityError"):
+        Jinja2Renderer.render("{{ ''.__class__.__mro__ }}", {})
+
+    with pytest.raises(Jinja2RenderError, match="SecurityError"):
+        Jinja2Renderer.render("{{ items.append(1) }}", {"items": []})
+
+
+def test_limits_output_length(limits):
+    limits.CODE_EXECUTION_JINJA2_LOCAL_MAX_OUTPUT_LENGTH = 1000
+
+    with pytest.raises(Jinja2RenderLimitError, match="exceeds 1000 characters"):
+        Jinja2Renderer.render("{% for i in range(200) %}{{ text }}{% endfor %}", {"text": "0123456789"})
+
+    with pytest.raises(Jinja2RenderLimitError, match="exceeds 1000 characters"):
+        Jinja2Renderer.render("{{ 'a' * 100000000 }}", {})
+
+
+@pytest.mark.parametrize("template", [NESTED_LOOPS_TEMPLATE, FILTER_CHAIN_TEMPLATE])
+def test_limits_cpu_time_of_loops_and_filters(limits, template):
+    limits.CODE_EXECUTION_JINJA2_LOCAL_CPU_TIME_LIMIT = 0.5
+
+    # unlimited, the loops run for about 30s and the filters for about 7s
+    with pytest.raises(Jinja2RenderLimitError, match="CPU time limit"):
+        Jinja2Renderer.render(template, {})
+
+    assert Jinja2Renderer.render("{{ 1 + 1 }}", {}) == "2"
+
+
+def test_limits_memory(limits):
+    limits.CODE_EXECUTION_JINJA2_LOCAL_MAX_MEMORY = 64
+
+    with pytest.raises(Jinja2RenderLimitError, match="memory limit"):
+        Jinja2Renderer.render("{% set a=['x'*1000]*1000 %}{% set b=[a|join]*1000 %}{{ b|join|length }}", {})
+
+    assert Jinja2Renderer.render("{{ 1 + 1 }}", {}) == "2"
+
+
+def test_stuck_render_process_is_replaced(limits):
+    limits.CODE_EXECUTION_JINJA2_LOCAL_CPU_TIME_LIMIT = 60
+    limits.CODE_EXECUTION_READ_TIMEOUT = 0.5
+
+    with pytest.raises(Jinja2RenderLimitError, match="stopped"):
+        Jinja2Renderer.render(NESTED_LOOPS_TEMPLATE, {})
+
+    limits.CODE_EXECUTION_READ_TIMEOUT = 30
+    assert Jinja2Renderer.render("{{ 1 + 1 }}", {}) == "2"
+
+
+def test_code_executor_uses_configured_engine(limits):
+    with patch("core.helper.code_executor.code_executor.dify_config") as config:
+        config.CODE_EXECUTION_JINJA2_ENGINE = "local"
+        with patch.object(CodeExecutor, "execute_code") as execute_code:
+            result = CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a }}", {"a": 1})
+        assert result == {"result": "1"}
+        execute_code.assert_not_called()
+
+        with pytest.raises(CodeExecutionError, match="Failed to render template"):
+            CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a ", {})
+
+        config.CODE_EXECUTION_JINJA2_ENGINE = "sandbox"
+        with patch.object(CodeExecutor, "execute_code", return_value="<<RESULT>>1<<RESULT>>") as execute_code:
+            result = CodeExecutor.execute_workflow_code_template(CodeLanguage.JINJA2, "{{ a }}", {"a": 1})
+        assert result == {"result": "1"}
+        execute_code.assert_called_once()
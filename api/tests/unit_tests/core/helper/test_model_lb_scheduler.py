@@ -0,0 +1,88 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.entities.provider_entities import ModelLoadBalancingConfiguration
+from core.helper import model_lb_scheduler
+from core.helper.model_lb_scheduler import ModelLBScheduler
+from core.model_manager import LBModelManager
+from core.model_runtime.entities.model_entities import ModelType
+
+
+@pytest.fixture(autouse=True)
+def mock_redis():
+    redis = MagicMock()
+    ModelLBScheduler.clear()
+    with (
+        patch.object(model_lb_scheduler, "redis_client", redis),
+        patch("core.model_manager.redis_client", redis),
+        patch.object(ModelLBScheduler, "_ensure_subscriber"),
+    ):
+        yield redis
+    ModelLBScheduler.clear()
+
+
+def _lb_model_manager(config_count: int = 3) -> LBModelManager:
+    return LBModelManager(
+        tenant_id="tenant-1",
+        provider="openai",
+        model_type=ModelType.LLM,
+        model="gpt-4o",
+        load_balancing_configs=[
+            ModelLoadBalancingConfiguration(id=f"id{i}", name=f"config{i}", credentials={"openai_api_key": f"key{i}"})
+            for i in range(config_count)
+        ],
+    )
+
+
+class TestModelLBScheduler:
+    def test_round_robin_without_redis(self, mock_redis):
+        manager = _lb_model_manager()
+
+        assert [manager.fetch_next().id for _ in range(6)] == ["id0", "id1", "id2", "id0", "id1", "id2"]
+        assert mock_redis.mock_calls == []
+
+    def test_configs_in_cooldown_are_skipped_until_expired(self, mock_redis):
+        manager = _lb_model_manager()
+        config = manager._load_balancing_configs[1]
+
+        with patch.object(model_lb_scheduler, "time") as clock:
+            clock.monotonic.return_value = 100
+            manager.cooldown(config, expire=10)
+            assert [manager.fetch_next().id for _ in range(4)] == ["id0", "id2", "id0", "id2"]
+
+            clock.monotonic.return_value = 111
+            assert [manager.fetch_next().id for _ in range(3)] == ["id0", "id1", "id2"]
+
+        cooldown_key = "model_lb_index:cooldown:tenant-1:openai:llm:gpt-4o:id1"
+        mock_redis.setex.assert_called_once_with(cooldown_key, 10, "true")
+        mock_redis.publish.assert_called_once_with(
+            ModelLBScheduler.COOLDOWN_CHANNEL, json.dumps({"key": cooldown_key, "expire": 10})
+        )
+
+    def test_all_configs_in_cooldown(self):
+        manager = _lb_model_manager(2)
+        for config in manager._load_balancing_configs:
+            manager.cooldown(config, expire=60)
+
+        assert manager.fetch_next() is None
+
+    def test_cooldown_broadcast_by_another_process(self):
+        manager = _lb_model_manager(2)
+
+        ModelLBScheduler._on_cooldown_message(
+            json.dumps({"key": "model_lb_index:cooldown:tenant-1:openai:llm:gpt-4o:id0", "expire": 60}).encode()
+        )
+
+        assert [manager.fetch_next().id for _ in range(2)] == ["id1", "id1"]
+
+    def test_redis_used_when_disabled(self, mock_redis):
+        mock_redis.incr.side_effect = [1, 2]
+        mock_redis.exists.return_value = False
+        manager = _lb_model_manager()
+
+        with patch.object(model_lb_scheduler.dify_config, "MODEL_LB_LOCAL_SCHEDULER_ENABLED", False):
+            assert [manager.fetch_next().id for _ in range(2)] == ["id0", "id1"]
+
+        assert mock_redis.exists.call_count == 2
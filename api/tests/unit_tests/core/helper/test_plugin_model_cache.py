@@ -0,0 +1,327 @@
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+from yarl import URL
+
+from core.helper import plugin_model_cache
+from core.helper.plugin_model_cache import PluginModelCache
+from core.model_runtime.entities.model_entities import AIModelEntity, FetchFrom, ModelType
+from core.plugin.entities.plugin_daemon import (
+    PluginInstallTask,
+    PluginInstallTaskStartResponse,
+    PluginInstallTaskStatus,
+    PluginModelProviderEntity,
+)
+from core.plugin.impl import base
+from core.plugin.impl.model import PluginModelClient
+from tasks import process_tenant_plugin_autoupgrade_check_task as autoupgrade_task
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, bytes] = {}
+        self.published: list[tuple[str, str]] = []
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = str(value).encode()
+        return True
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    redis = _FakeRedis()
+    PluginModelCache.clear()
+    with (
+        patch.object(plugin_model_cache, "redis_client", redis),
+        patch.object(PluginModelCache, "_ensure_subscriber"),
+        patch.object(PluginModelCache, "_hits", 0),
+        patch.object(PluginModelCache, "_stale_hits", 0),
+        patch.object(PluginModelCache, "_misses", 0),
+    ):
+        yield redis
+    PluginModelCache.clear()
+
+
+@pytest.fixture
+def clock():
+    clock = _Clock()
+    with patch.object(plugin_model_cache, "time", clock):
+        yield clock
+
+
+def _provider_data(name: str, model_count: int = 3) -> dict:
+    return {
+        "id": f"{name}-id",
+        "created_at": "2025-01-01T00:00:00Z",
+        "updated_at": "2025-01-01T00:00:00Z",
+        "provider": name,
+        "tenant_id": "tenant-1",
+        "plugin_unique_identifier": f"langgenius/{name}:0.0.1@checksum",
+        "plugin_id": f"langgenius/{name}",
+        "declaration": {
+            "provider": name,
+            "label": {"en_US": name},
+            "supported_model_types": ["llm"],
+            "configurate_methods": ["predefined-model"],
+            "models": [
+                {
+                    "model": f"{name}-model-{i}",
+                    "label": {"en_US": f"{name} model {i}"},
+                    "model_type": "llm",
+                    "fetch_from": "predefined-model",
+                    "model_properties": {"mode": "chat", "context_size": 8192},
+                    "parameter_rules": [{"name": "temperature", "label": {"en_US": "Temperature"}, "type": "float"}],
+                }
+                for i in range(model_count)
+            ],
+        },
+    }
+
+
+def _provider(name: str) -> PluginModelProviderEntity:
+    return PluginModelProviderEntity.model_validate(_provider_data(name))
+
+
+def _schema(model: str) -> AIModelEntity:
+    return AIModelEntity(
+        model=model,
+        label={"en_US": model},
+        model_type=ModelType.LLM,
+        fetch_from=FetchFrom.CUSTOMIZABLE_MODEL,
+        model_properties={},
+    )
+
+
+def _get_schema(fetch, credentials=None, tenant_id="tenant-1"):
+    return PluginModelCache.get_model_schema(
+        tenant_id=tenant_id,
+        plugin_unique_identifier="langgenius/openai:0.0.1@checksum",
+        provider="openai",
+        model_type="llm",
+        model="gpt-4o",
+        credentials=credentials,
+        fetch=fetch,
+    )
+
+
+def _install_task(task_id: str, status: PluginInstallTaskStatus) -> PluginInstallTask:
+    return PluginInstallTask(
+        id=task_id,
+        created_at=datetime(2025, 1, 1),
+        updated_at=datetime(2025, 1, 1),
+        status=status,
+        total_plugins=1,
+        completed_plugins=1,
+        plugins=[
+            {
+                "plugin_unique_identifier": "langgenius/openai:0.0.2@checksum",
+                "plugin_id": "langgenius/openai",
+                "status": status,
+                "message": "",
+                "icon": "",
+                "labels": {"en_US": "OpenAI"},
+            }
+        ],
+    )
+
+
+class TestPluginModelCache:
+    def test_providers_cached_in_process_and_in_redis(self):
+        fetch = MagicMock(return_value=[_provider("openai")])
+
+        first = PluginModelCache.get_model_providers("tenant-1", fetch)
+        second = PluginModelCache.get_model_providers("tenant-1", fetch)
+        PluginModelCache.clear()
+        third = PluginModelCache.get_model_providers("tenant-1", fetch)
+
+        fetch.assert_called_once()
+        assert second is first
+        assert third == first
+        assert PluginModelCache.get_stats()["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_schemas_keyed_by_credentials_and_misses_not_cached(self):
+        fetch = MagicMock(side_effect=lambda: _schema("gpt-4o"))
+
+        _get_schema(fetch, {"api_key": "a", "base_url": "x"})
+        _get_schema(fetch, {"base_url": "x", "api_key": "a"})
+        _get_schema(fetch, {"api_key": "b", "base_url": "x"})
+        assert fetch.call_count == 2
+
+        missing = MagicMock(return_value=None)
+        assert _get_schema(missing, tenant_id="tenant-2") is None
+        assert _get_schema(missing, tenant_id="tenant-2") is None
+        assert missing.call_count == 2
+
+    def test_stale_entries_served_while_refreshing(self, clock):
+        fetch = MagicMock(side_effect=[[_provider("openai")], [_provider("anthropic")], [_provider("google")]])
+        with (
+            patch.object(plugin_model_cache.dify_config, "PLUGIN_MODEL_CACHE_TTL", 60),
+            patch.object(plugin_model_cache.dify_config, "PLUGIN_MODEL_CACHE_STALE_TTL", 60),
+            patch.object(PluginModelCache, "_refresh_executor") as executor,
+        ):
+            PluginModelCache.get_model_providers("tenant-1", fetch)
+            clock.now += 90
+
+            stale = PluginModelCache.get_model_providers("tenant-1", fetch)
+            PluginModelCache.get_model_providers("tenant-1", fetch)
+            assert stale[0].provider == "openai"
+            assert executor.submit.call_count == 1
+
+            # the background refresh
+            executor.submit.call_args.args[0]()
+            assert PluginModelCache.get_model_providers("tenant-1", fetch)[0].provider == "anthropic"
+
+            # expired entries are fetched synchronously
+            clock.now += 200
+            assert PluginModelCache.get_model_providers("tenant-1", fetch)[0].provider == "google"
+            assert executor.submit.call_count == 1
+
+        assert PluginModelCache.get_stats()["stale_hits"] == 2
+
+    def test_invalidate_drops_the_tenant_everywhere(self, fake_redis):
+        fetch = MagicMock(side_effect=lambda: [_provider("openai")])
+        PluginModelCache.get_model_providers("tenant-1", fetch)
+        PluginModelCache.get_model_providers("tenant-2", fetch)
+
+        PluginModelCache.invalidate("tenant-1")
+        PluginModelCache.get_model_providers("tenant-1", fetch)
+        PluginModelCache.get_model_providers("tenant-2", fetch)
+
+        # the shared entry of the old generation is not read either
+        assert fetch.call_count == 3
+        assert fake_redis.published == [(PluginModelCache.INVALIDATE_CHANNEL, "tenant-1")]
+
+    def test_fetch_racing_an_invalidation_is_not_cached(self):
+        def fetch():
+            PluginModelCache.invalidate("tenant-1")
+            return [_provider("openai")]
+
+        PluginModelCache.get_model_providers("tenant-1", fetch)
+
+        assert PluginModelCache.get_stats()["size"] == 0
+
+    def test_install_tasks_invalidate_once(self, fake_redis):
+        with patch.object(PluginModelCache, "invalidate") as invalidate:
+            PluginModelCache.invalidate_installed(
+                "tenant-1", [_install_task("task-1", PluginInstallTaskStatus.Running)]
+            )
+            invalidate.assert_not_called()
+
+            tasks = [_install_task("task-1", PluginInstallTaskStatus.Success)]
+            PluginModelCache.invalidate_installed("tenant-1", tasks)
+            PluginModelCache.invalidate_installed("tenant-1", tasks)
+            PluginModelCache.invalidate_installed("tenant-1", [_install_task("task-2", PluginInstallTaskStatus.Failed)])
+
+        invalidate.assert_called_once_with("tenant-1")
+
+    def test_autoupgrade_invalidates_after_the_upgrade_task_finishes(self, fake_redis):
+        manager = MagicMock()
+        manager.fetch_plugin_installation_task.side_effect = [
+            _install_task("task-1", PluginInstallTaskStatus.Running),
+            _install_task("task-1", PluginInstallTaskStatus.Success),
+        ]
+        responses = [PluginInstallTaskStartResponse(all_installed=False, task_id="task-1")]
+
+        with (
+            patch.object(autoupgrade_task, "UPGRADE_TASK_POLL_INTERVAL", 0),
+            patch.object(PluginModelCache, "invalidate") as invalidate,
+        ):
+            autoupgrade_task.invalidate_plugin_model_cache_after_upgrades(manager, "tenant-1", responses)
+
+        assert manager.fetch_plugin_installation_task.call_count == 2
+        invalidate.assert_called_once_with("tenant-1")
+
+    def test_autoupgrade_invalidates_when_the_upgrade_task_is_not_done_in_time(self):
+        manager = MagicMock()
+        manager.fetch_plugin_installation_task.return_value = _install_task("task-1", PluginInstallTaskStatus.Running)
+        responses = [PluginInstallTaskStartResponse(all_installed=False, task_id="task-1")]
+
+        with (
+            patch.object(autoupgrade_task, "UPGRADE_TASK_POLL_INTERVAL", 0),
+            patch.object(autoupgrade_task, "UPGRADE_TASK_WAIT_TIMEOUT", 0.05),
+            patch.object(PluginModelCache, "invalidate") as invalidate,
+        ):
+            autoupgrade_task.invalidate_plugin_model_cache_after_upgrades(manager, "tenant-1", responses)
+
+        invalidate.assert_called_once_with("tenant-1")
+
+    def test_disabled_cache_always_fetches(self):
+        fetch = MagicMock(return_value=[_provider("openai")])
+
+        with patch.object(plugin_model_cache.dify_config, "PLUGIN_MODEL_CACHE_ENABLED", False):
+            PluginModelCache.get_model_providers("tenant-1", fetch)
+            PluginModelCache.get_model_providers("tenant-1", fetch)
+
+        assert fetch.call_count == 2
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = b""
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.mark.benchmark(group="fetch_model_providers")
+@pytest.mark.parametrize("provider_count", [5, 50])
+@pytest.mark.parametrize("implementation", ["daemon", "cached"])
+def test_fetch_model_providers_benchmark(benchmark, provider_count, implementation):
+    _DaemonHandler.body = json.dumps(
+        {"code": 0, "message": "", "data": [_provider_data(f"provider{i}", 10) for i in range(provider_count)]}
+    ).encode()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DaemonHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = PluginModelClient()
+
+    def fetch_from_daemon():
+        return client.fetch_model_providers("tenant-1")
+
+    def fetch_cached():
+        return PluginModelCache.get_model_providers("tenant-1", fetch_from_daemon)
+
+    try:
+        with (
+            patch.object(base, "plugin_daemon_inner_api_baseurl", URL(f"http://127.0.0.1:{server.server_address[1]}")),
+            patch.object(base, "_session", None),
+        ):
+            providers = benchmark(fetch_from_daemon if implementation == "daemon" else fetch_cached)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(providers) == provider_count
@@ -0,0 +1,120 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.entities.provider_configuration import ProviderConfigurations
+from core.helper import provider_configurations_cache
+from core.helper.provider_configurations_cache import ProviderConfigurationsCache
+from core.provider_manager import ProviderManager
+from models.provider import Provider
+
+
+class _FakeRedis:
+    def __init__(self) -> None:
+        self.values: dict[str, bytes] = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+
+@pytest.fixture(autouse=True)
+def fake_redis():
+    redis = _FakeRedis()
+    ProviderConfigurationsCache.clear()
+    with patch.object(provider_configurations_cache, "redis_client", redis):
+        yield redis
+    ProviderConfigurationsCache.clear()
+
+
+class TestProviderConfigurationsCache:
+    def test_rebuilds_only_after_invalidation(self):
+        build = MagicMock(side_effect=lambda: ProviderConfigurations(tenant_id="tenant-1"))
+
+        first = ProviderConfigurationsCache.get("tenant-1", build)
+        assert ProviderConfigurationsCache.get("tenant-1", build) is first
+        assert build.call_count == 1
+
+        ProviderConfigurationsCache.invalidate(["tenant-1"])
+        assert ProviderConfigurationsCache.get("tenant-1", build) is not first
+        assert build.call_count == 2
+
+    def test_version_bumped_by_another_process(self, fake_redis):
+        build = MagicMock(side_effect=lambda: ProviderConfigurations(tenant_id="tenant-1"))
+        ProviderConfigurationsCache.get("tenant-1", build)
+
+        fake_redis.incr(ProviderConfigurationsCache._version_key("tenant-1"))
+        ProviderConfigurationsCache.get("tenant-1", build)
+
+        assert build.call_count == 2
+
+    def test_change_committed_while_building_is_not_missed(self):
+        def build():
+            configurations = ProviderConfigurations(tenant_id="tenant-1")
+            ProviderConfigurationsCache.invalidate(["tenant-1"])
+            return configurations
+
+        build_mock = MagicMock(side_effect=build)
+        ProviderConfigurationsCache.get("tenant-1", build_mock)
+        ProviderConfigurationsCache.get("tenant-1", build_mock)
+
+        assert build_mock.call_count == 2
+
+    def test_entries_expire(self):
+        build = MagicMock(side_effect=lambda: ProviderConfigurations(tenant_id="tenant-1"))
+
+        with patch.object(provider_configurations_cache, "time") as clock:
+            clock.monotonic.side_effect = [0, 10, 500, 500]
+            ProviderConfigurationsCache.get("tenant-1", build)
+            ProviderConfigurationsCache.get("tenant-1", build)
+            ProviderConfigurationsCache.get("tenant-1", build)
+
+        assert build.call_count == 2
+
+    def test_builds_every_time_without_redis_or_when_disabled(self, fake_redis):
+        build = MagicMock(side_effect=lambda: ProviderConfigurations(tenant_id="tenant-1"))
+
+        with patch.object(fake_redis, "get", side_effect=ConnectionError):
+            ProviderConfigurationsCache.get("tenant-1", build)
+            ProviderConfigurationsCache.get("tenant-1", build)
+        with patch.object(provider_configurations_cache.dify_config, "PROVIDER_CONFIGURATIONS_CACHE_ENABLED", False):
+            ProviderConfigurationsCache.get("tenant-1", build)
+            ProviderConfigurationsCache.get("tenant-1", build)
+
+        assert build.call_count == 4
+
+    def test_committed_row_changes_invalidate_their_tenants(self):
+        session = MagicMock(info={})
+
+        with patch.object(provider_configurations_cache.Session, "object_session", return_value=session):
+            provider_configurations_cache._on_provider_row_changed(None, None, Provider(tenant_id="tenant-1"))
+            provider_configurations_cache._on_provider_row_changed(None, None, Provider(tenant_id="tenant-2"))
+
+        with patch.object(ProviderConfigurationsCache, "invalidate") as invalidate:
+            provider_configurations_cache._invalidate_after_commit(session)
+            provider_configurations_cache._invalidate_after_commit(session)
+
+        invalidate.assert_called_once_with({"tenant-1", "tenant-2"})
+
+    def test_rolled_back_row_changes_are_discarded(self):
+        session = MagicMock(info={})
+
+        with patch.object(provider_configurations_cache.Session, "object_session", return_value=session):
+            provider_configurations_cache._on_provider_row_changed(None, None, Provider(tenant_id="tenant-1"))
+        provider_configurations_cache._discard_after_rollback(session)
+
+        with patch.object(ProviderConfigurationsCache, "invalidate") as invalidate:
+            provider_configurations_cache._invalidate_after_commit(session)
+
+        invalidate.assert_not_called()
+
+    def test_provider_manager_uses_the_cache(self):
+        with patch.object(
+            ProviderManager, "_build_configurations", return_value=ProviderConfigurations(tenant_id="tenant-1")
+        ) as build:
+            manager = ProviderManager()
+            assert manager.get_configurations("tenant-1") is ProviderManager().get_configurations("tenant-1")
+
+        build.assert_called_once_with("tenant-1")
@@ -1,9 +1,13 @@
+import asyncio
 import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from core.helper.ssrf_proxy import SSRF_DEFAULT_MAX_RETRIES, STATUS_FORCELIST, make_request
+from core.helper import ssrf_proxy
+from core.helper.ssrf_proxy import SSRF_DEFAULT_MAX_RETRIES, STATUS_FORCELIST, make_request, make_request_async
 
 
 @patch("httpx.Client.request")
@@ -50,3 +54,66 @@ def test_retry_logic_success(mock_request):
     assert response.status_code == 200
     assert mock_request.call_count == SSRF_DEFAULT_MAX_RETRIES + 1
     assert mock_request.call_args_list[0][1].get("method") == "GET"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # noqa: N802
+        body = (self.headers.get("Cookie") or "").encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=secret; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def request_counter():
+    with (
+        patch.dict(ssrf_proxy._clients, clear=True),
+        patch.object(ssrf_proxy, "_request_counter") as request_counter,
+    ):
+        yield request_counter
+
+
+def test_clients_are_pooled_by_ssl_verify(request_counter):
+    assert ssrf_proxy._get_client(True) is ssrf_proxy._get_client(True)
+    assert ssrf_proxy._get_client(True) is not ssrf_proxy._get_client(False)
+
+
+def test_connection_is_reused_and_recorded(server_url, request_counter):
+    for _ in range(3):
+        assert make_request("GET", server_url, max_retries=0).status_code == 200
+
+    reused = [call.args[1]["connection.reused"] for call in request_counter.add.call_args_list]
+    assert reused == [False, True, True]
+
+
+def test_response_cookies_are_not_shared(server_url, request_counter):
+    make_request("GET", server_url, max_retries=0)
+
+    assert make_request("GET", server_url, max_retries=0).text == ""
+    assert make_request("GET", server_url, max_retries=0, cookies={"user": "1"}).text == "user=1"
+
+
+def test_async_request_reuses_connection(server_url, request_counter):
+    async def run():
+        return [(await make_request_async("GET", server_url, max_retries=0)).status_code for _ in range(2)]
+
+    assert asyncio.run(run()) == [200, 200]
+    reused = [call.args[1]["connection.reused"] for call in request_counter.add.call_args_list]
+    assert reused == [False, True]
@@ -0,0 +1,189 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.memory import token_buffer_memory
+from core.memory.token_buffer_memory import TokenBufferMemory
+from core.model_runtime.entities import AssistantPromptMessage, UserPromptMessage
+from models.model import AppMode
+from models.workflow import Workflow
+
+
+def _message(index: int) -> MagicMock:
+    message = MagicMock()
+    message.id = f"message-{index}"
+    message.query = f"query {index}"
+    message.answer = f"answer {index}"
+    message.answer_tokens = 1
+    return message
+
+
+@pytest.fixture
+def mock_db():
+    with (
+        patch("core.memory.token_buffer_memory.db") as mock_db,
+        patch("core.memory.token_buffer_memory.extract_thread_messages", side_effect=list),
+    ):
+        # newest first like the query ordered by created_at desc, then the files of all messages
+        mock_db.session.scalars.return_value.all.side_effect = [[_message(i) for i in reversed(range(5))], []]
+        yield mock_db
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("core.memory.token_buffer_memory.redis_client") as mock_redis:
+        mock_redis.mget.side_effect = lambda keys: [None] * len(keys)
+        yield mock_redis
+
+
+def _memory() -> TokenBufferMemory:
+    model_instance = MagicMock()
+    model_instance.provider = "openai"
+    model_instance.model = "gpt-4o"
+    model_instance.get_llm_num_tokens.side_effect = lambda prompt_messages: 10 * len(prompt_messages)
+    return TokenBufferMemory(conversation=MagicMock(), model_instance=model_instance)
+
+
+class TestTokenBufferMemoryPruning:
+    def test_prunes_to_longest_suffix_within_limit(self, mock_db, mock_redis):
+        memory = _memory()
+        with patch("core.memory.token_buffer_memory.dify_config") as config:
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = True
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=35)
+
+        assert prompt_messages == [
+            AssistantPromptMessage(content="answer 3"),
+            UserPromptMessage(content="query 4"),
+            AssistantPromptMessage(content="answer 4"),
+        ]
+        # the whole list is counted once, then each prompt message once instead of recounting after every pop
+        assert memory.model_instance.get_llm_num_tokens.call_count == 11
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        assert pipe.setex.call_count == 10
+        assert pipe.setex.call_args_list[0].args[0] == "token_buffer_memory:token_count:openai:gpt-4o:message-0:query"
+
+    def test_cold_cache_history_within_limit_counted_at_once(self, mock_db, mock_redis):
+        memory = _memory()
+        with patch("core.memory.token_buffer_memory.dify_config") as config:
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = True
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=100)
+
+        assert len(prompt_messages) == 10
+        memory.model_instance.get_llm_num_tokens.assert_called_once_with(prompt_messages)
+        mock_redis.pipeline.assert_not_called()
+
+    def test_cached_token_counts_skip_counting(self, mock_db, mock_redis):
+        mock_redis.mget.side_effect = lambda keys: [b"10"] * (len(keys) - 1) + [None]
+        memory = _memory()
+        with patch("core.memory.token_buffer_memory.dify_config") as config:
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = True
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=100)
+
+        assert len(prompt_messages) == 10
+        memory.model_instance.get_llm_num_tokens.assert_called_once_with([AssistantPromptMessage(content="answer 4")])
+
+    def test_keeps_last_message_when_over_limit(self, mock_db, mock_redis):
+        memory = _memory()
+        with patch("core.memory.token_buffer_memory.dify_config") as config:
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = True
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=5)
+
+        assert prompt_messages == [AssistantPromptMessage(content="answer 4")]
+
+    def test_local_tokenizer_fallback(self, mock_db, mock_redis):
+        memory = _memory()
+        with (
+            patch("core.memory.token_buffer_memory.dify_config") as config,
+            patch("core.memory.token_buffer_memory.GPT2Tokenizer.get_num_tokens", return_value=10) as get_num_tokens,
+        ):
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = False
+            config.LOCAL_TOKEN_COUNTING_FALLBACK_ENABLED = True
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=40)
+
+        assert len(prompt_messages) == 4
+        assert get_num_tokens.call_count == 10
+        memory.model_instance.get_llm_num_tokens.assert_not_called()
+
+    def test_no_token_counting_keeps_all_messages(self, mock_db, mock_redis):
+        memory = _memory()
+        with patch("core.memory.token_buffer_memory.dify_config") as config:
+            config.PLUGIN_BASED_TOKEN_COUNTING_ENABLED = False
+            config.LOCAL_TOKEN_COUNTING_FALLBACK_ENABLED = False
+
+            prompt_messages = memory.get_history_prompt_messages(max_token_limit=1)
+
+        assert len(prompt_messages) == 10
+        mock_redis.mget.assert_not_called()
+
+
+class TestTokenBufferMemoryHistoryLoading:
+    @pytest.fixture(autouse=True)
+    def _clear_workflow_configs(self):
+        token_buffer_memory._workflow_file_upload_configs.clear()
+        yield
+        token_buffer_memory._workflow_file_upload_configs.clear()
+
+    def test_files_and_workflows_loaded_in_batches(self):
+        messages = [_message(i) for i in range(3)]
+        for message in messages:
+            message.workflow_run_id = f"run-{message.id}"
+        files = [MagicMock(message_id="message-0"), MagicMock(message_id="message-2")]
+        workflow = MagicMock(id="workflow-1", version="2025-01-01", features_dict={})
+        memory = _memory()
+        memory.conversation.mode = AppMode.ADVANCED_CHAT
+
+        with (
+            patch("core.memory.token_buffer_memory.db") as mock_db,
+            patch("core.memory.token_buffer_memory.FileUploadConfigManager.convert", return_value=None) as convert,
+        ):
+            mock_db.session.scalars.return_value.all.side_effect = [files, [workflow]]
+            mock_db.session.execute.return_value.tuples.return_value.all.return_value = [
+                ("run-message-0", "workflow-1"),
+                ("run-message-2", "workflow-1"),
+            ]
+
+            message_files = memory._get_message_files(messages)
+            configs = memory._get_file_extra_configs([messages[0], messages[2]])
+            # published workflow configs are reused by later turns
+            memory._get_file_extra_configs([messages[0]])
+
+        assert message_files == {"message-0": [files[0]], "message-2": [files[1]]}
+        assert configs == {"message-0": None, "message-2": None}
+        assert mock_db.session.scalars.call_count == 2
+        assert mock_db.session.execute.call_count == 2
+        convert.assert_called_once_with({}, is_vision=False)
+
+    def test_draft_workflow_config_not_cached(self):
+        message = _message(0)
+        message.workflow_run_id = "run-1"
+        memory = _memory()
+        memory.conversation.mode = AppMode.WORKFLOW
+        workflow = MagicMock(id="workflow-1", version=Workflow.VERSION_DRAFT, features_dict={})
+
+        with (
+            patch("core.memory.token_buffer_memory.db") as mock_db,
+            patch("core.memory.token_buffer_memory.FileUploadConfigManager.convert", return_value=None),
+        ):
+            mock_db.session.scalars.return_value.all.return_value = [workflow]
+            mock_db.session.execute.return_value.tuples.return_value.all.return_value = [("run-1", "workflow-1")]
+
+            memory._get_file_extra_configs([message])
+
+        assert "workflow-1" not in token_buffer_memory._workflow_file_upload_configs
+
+    def test_missing_workflow_run_raises(self):
+        message = _message(0)
+        message.workflow_run_id = "run-1"
+        memory = _memory()
+        memory.conversation.mode = AppMode.ADVANCED_CHAT
+
+        with patch("core.memory.token_buffer_memory.db") as mock_db:
+            mock_db.session.execute.return_value.tuples.return_value.all.return_value = []
+
+            with pytest.raises(ValueError, match="Workflow run not found: run-1"):
+                memory._get_file_extra_configs([message])
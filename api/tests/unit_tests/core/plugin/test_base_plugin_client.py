@@ -0,0 +1,176 @@
+import json
+import os
+import socketserver
+import tempfile
+import threading
+from datetime import datetime
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+from yarl import URL
+
+from core.model_runtime.entities.message_entities import (
+    AssistantPromptMessage,
+    PromptMessageTool,
+    SystemPromptMessage,
+    UserPromptMessage,
+)
+from core.model_runtime.entities.model_entities import ModelType
+from core.model_runtime.utils.encoders import jsonable_encoder
+from core.plugin.entities.plugin_daemon import PluginBasicBooleanResponse
+from core.plugin.impl import base
+from core.plugin.impl.base import BasePluginClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # the plugin daemon answers without Nagle's delay too
+    disable_nagle_algorithm = True
+    connections: set = set()
+
+    def do_POST(self):  # noqa: N802
+        type(self).connections.add(id(self.connection))
+        self.rfile.read(int(self.headers["Content-Length"]))
+        body = b'{"code": 0, "message": "", "data": {"result": true}}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixSocketHandler(_Handler):
+    disable_nagle_algorithm = False
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("local", 0)
+
+
+def _payload(message_count: int) -> dict:
+    return {
+        "user_id": "user-1",
+        "data": {
+            "provider": "openai",
+            "model_type": ModelType.LLM,
+            "model": "gpt-4o",
+            "credentials": {"api_key": "key"},
+            "prompt_messages": [SystemPromptMessage(content="You are a helpful assistant.")]
+            + [
+                UserPromptMessage(content=f"question {i} " * 20)
+                if i % 2
+                else AssistantPromptMessage(content=f"answer {i} " * 20)
+                for i in range(message_count)
+            ],
+            "model_parameters": {"temperature": Decimal("0.7"), "created_at": datetime(2025, 1, 1, 12, 30)},
+            "tools": [PromptMessageTool(name="search", description="Search the web", parameters={"type": "object"})],
+            "stop": None,
+            "stream": True,
+        },
+    }
+
+
+@pytest.fixture
+def daemon():
+    _Handler.connections = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    with (
+        patch.object(base, "plugin_daemon_inner_api_baseurl", URL(f"http://127.0.0.1:{server.server_address[1]}")),
+        patch.object(base, "_session", None),
+    ):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _request(client: BasePluginClient, data) -> bool:
+    return client._request_with_plugin_daemon_response(
+        "POST",
+        "plugin/tenant-1/dispatch/llm/num_tokens",
+        PluginBasicBooleanResponse,
+        data=data,
+        headers={"Content-Type": "application/json"},
+    ).result
+
+
+def test_request_body_matches_jsonable_encoder():
+    payload = _payload(5)
+
+    assert json.loads(base._dump_json(payload)) == json.loads(json.dumps(jsonable_encoder(payload)))
+
+
+def test_request_body_falls_back_for_big_integers():
+    assert json.loads(base._dump_json({"value": 2**70})) == {"value": 2**70}
+
+
+def test_connections_are_reused(daemon):
+    client = BasePluginClient()
+
+    assert all(_request(client, {"value": i}) for i in range(3))
+    assert len(_Handler.connections) == 1
+
+
+def test_requests_through_unix_socket():
+    _Handler.connections = set()
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "plugin_daemon.sock")
+        server = _UnixHTTPServer(socket_path, _UnixSocketHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with (
+                patch.object(base, "_session", None),
+                patch.object(base.dify_config, "PLUGIN_DAEMON_UNIX_SOCKET", socket_path),
+            ):
+                assert _request(BasePluginClient(), {"value": 1})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+def test_stream_lines_are_parsed_from_bytes():
+    response = MagicMock()
+    response.iter_lines.return_value = [
+        b'data: {"code": 0, "message": "", "data": {"result": true}}',
+        b"",
+        b'{"code": 0, "message": "", "data": {"result": false}}',
+    ]
+
+    with patch.object(BasePluginClient, "_request", return_value=response):
+        results = list(
+            BasePluginClient()._request_with_plugin_daemon_response_stream(
+                "POST", "plugin/tenant-1/dispatch/llm/invoke", PluginBasicBooleanResponse
+            )
+        )
+
+    assert [result.result for result in results] == [True, False]
+
+
+@pytest.mark.benchmark(group="plugin_request")
+@pytest.mark.parametrize("message_count", [10, 200])
+@pytest.mark.parametrize("implementation", ["legacy", "current"])
+def test_request_overhead_benchmark(benchmark, daemon, message_count, implementation):
+    payload = _payload(message_count)
+    url = f"{base.plugin_daemon_inner_api_baseurl}/plugin/tenant-1/dispatch/llm/num_tokens"
+    client = BasePluginClient()
+
+    def legacy_request():
+        response = requests.request(
+            method="POST",
+            url=url,
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(jsonable_encoder(payload)),
+        )
+        PluginBasicBooleanResponse(**response.json()["data"])
+
+    benchmark(legacy_request if implementation == "legacy" else lambda: _request(client, payload))
@@ -0,0 +1,22 @@
+from unittest.mock import MagicMock, patch
+
+from core.rag.datasource.keyword.jieba.jieba import Jieba
+
+
+class TestJiebaSearch:
+    def test_segments_fetched_in_one_query_in_rank_order(self):
+        segments = [
+            MagicMock(index_node_id=node_id, content=node_id, document_id="document-1", dataset_id="dataset-1")
+            for node_id in ("node-1", "node-2", "node-3")
+        ]
+        jieba = Jieba(MagicMock(id="dataset-1"))
+        with (
+            patch.object(Jieba, "_get_dataset_keyword_table", return_value={}),
+            patch.object(Jieba, "_retrieve_ids_by_query", return_value=["node-3", "node-1", "node-2"]),
+            patch("core.rag.datasource.keyword.jieba.jieba.db") as mock_db,
+        ):
+            mock_db.session.query.return_value.where.return_value.all.return_value = segments
+            documents = jieba.search("query", top_k=3)
+
+        assert [document.metadata["doc_id"] for document in documents] == ["node-3", "node-1", "node-2"]
+        mock_db.session.query.assert_called_once()
@@ -0,0 +1,88 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from core.rag.datasource.keyword.jieba.jieba_inverted_index_extend import JiebaInvertedIndexExtend
+from core.rag.datasource.keyword.keyword_factory import Keyword
+from core.rag.models.document import Document
+
+
+@pytest.fixture
+def mock_db():
+    with patch("core.rag.datasource.keyword.jieba.jieba_inverted_index_extend.db") as mock_db:
+        yield mock_db
+
+
+@pytest.fixture
+def keyword_handler():
+    with patch("core.rag.datasource.keyword.jieba.jieba_inverted_index_extend.JiebaKeywordTableHandler") as handler_cls:
+        yield handler_cls.return_value
+
+
+def _index() -> JiebaInvertedIndexExtend:
+    return JiebaInvertedIndexExtend(MagicMock(id="dataset-1", tenant_id="tenant-1"))
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+class TestJiebaInvertedIndexExtend:
+    def test_factory_returns_inverted_index(self):
+        assert Keyword.get_keyword_factory("jieba_inverted_index") is JiebaInvertedIndexExtend
+
+    def test_add_texts_writes_postings_per_keyword_and_node(self, mock_db, keyword_handler):
+        keyword_handler.extract_keywords.return_value = {"苹果", "香蕉"}
+        texts = [
+            Document(page_content="苹果 香蕉", metadata={"doc_id": "node-1"}),
+            Document(page_content="葡萄", metadata={"doc_id": "node-2"}),
+        ]
+
+        with patch.object(JiebaInvertedIndexExtend, "_insert_postings") as insert_postings:
+            _index().add_texts(texts, keywords_list=[None, ["葡萄"]])
+
+        rows = {(row["keyword"], row["node_id"]) for row in insert_postings.call_args.args[0]}
+        assert rows == {("苹果", "node-1"), ("香蕉", "node-1"), ("葡萄", "node-2")}
+        keyword_handler.extract_keywords.assert_called_once()
+
+    def test_postings_inserted_in_bulk_ignoring_existing(self, mock_db):
+        rows = [{"dataset_id": "dataset-1", "keyword": f"k{i}", "node_id": "node-1"} for i in range(1500)]
+
+        JiebaInvertedIndexExtend._insert_postings(rows)
+
+        statements = [call.args[0] for call in mock_db.session.execute.call_args_list]
+        assert len(statements) == 2
+        assert "ON CONFLICT DO NOTHING" in _sql(statements[0])
+        mock_db.session.commit.assert_called_once()
+
+    def test_delete_by_ids_deletes_only_given_nodes(self, mock_db):
+        _index().delete_by_ids(["node-1", "node-2"])
+
+        sql = _sql(mock_db.session.execute.call_args.args[0])
+        assert sql.startswith("DELETE FROM dataset_keyword_postings_extend")
+        assert "node_id IN" in sql
+        mock_db.session.commit.assert_called_once()
+
+    def test_search_ranks_in_database_and_hydrates_in_one_query(self, mock_db, keyword_handler):
+        keyword_handler.extract_keywords.return_value = {"苹果", "香蕉"}
+        mock_db.session.execute.return_value = [("node-2", 2), ("node-1", 1)]
+        segments = [
+            MagicMock(index_node_id=node_id, content=f"content {node_id}", dataset_id="dataset-1")
+            for node_id in ("node-1", "node-2")
+        ]
+        mock_db.session.scalars.return_value = segments
+
+        documents = _index().search("苹果香蕉", top_k=2, document_ids_filter=["document-1"])
+
+        assert [document.metadata["doc_id"] for document in documents] == ["node-2", "node-1"]
+        rank_sql = _sql(mock_db.session.execute.call_args.args[0])
+        assert "GROUP BY dataset_keyword_postings_extend.node_id" in rank_sql
+        assert "JOIN document_segments" in rank_sql
+        mock_db.session.scalars.assert_called_once()
+
+    def test_search_without_keywords_skips_database(self, mock_db, keyword_handler):
+        keyword_handler.extract_keywords.return_value = set()
+
+        assert _index().search("的") == []
+        mock_db.session.execute.assert_not_called()
@@ -0,0 +1,87 @@
+from unittest.mock import MagicMock, patch
+
+from core.rag.datasource.retrieval_service import RetrievalService
+from core.rag.index_processor.constant.index_type import IndexType
+from core.rag.models.document import Document
+from models.dataset import ChildChunk, DocumentSegment
+from models.dataset import Document as DatasetDocument
+
+
+class _FakeQuery:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def where(self, *args):
+        return self
+
+    def options(self, *args):
+        return self
+
+    def all(self):
+        return list(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class _FakeSession:
+    """Returns fixed rows per model; DocumentSegment rows are returned in order of the queries issued."""
+
+    def __init__(self, dataset_documents, child_chunks, segment_batches):
+        self._rows = {DatasetDocument: dataset_documents, ChildChunk: child_chunks}
+        self._segment_batches = list(segment_batches)
+        self.queried_models: list[type] = []
+
+    def rollback(self):
+        pass
+
+    def query(self, model):
+        self.queried_models.append(model)
+        if model is DocumentSegment:
+            return _FakeQuery(self._segment_batches.pop(0))
+        return _FakeQuery(self._rows[model])
+
+
+def _document(doc_id: str, document_id: str, score: float) -> Document:
+    return Document(page_content="", metadata={"doc_id": doc_id, "document_id": document_id, "score": score})
+
+
+class TestFormatRetrievalDocuments:
+    def test_constant_number_of_queries_and_rank_order_kept(self):
+        parent_child_document = MagicMock(id="doc-pc", doc_form=IndexType.PARENT_CHILD_INDEX, dataset_id="dataset-1")
+        paragraph_document = MagicMock(id="doc-p", doc_form=IndexType.PARAGRAPH_INDEX, dataset_id="dataset-2")
+        child_chunks = [
+            ChildChunk(index_node_id=f"child-{i}", segment_id="parent-1", id=f"cc-{i}", content="", position=i)
+            for i in range(3)
+        ]
+        parent_segment = DocumentSegment(id="parent-1", dataset_id="dataset-1")
+        paragraph_segments = [
+            DocumentSegment(id=f"segment-{i}", dataset_id="dataset-2", index_node_id=f"node-{i}") for i in range(10)
+        ]
+        session = _FakeSession(
+            [parent_child_document, paragraph_document], child_chunks, [[parent_segment], paragraph_segments]
+        )
+        documents = [_document(f"node-{i}", "doc-p", 1 - i / 10) for i in reversed(range(10))]
+        documents += [_document(f"child-{i}", "doc-pc", 0.5 + i / 10) for i in range(3)]
+
+        with patch("core.rag.datasource.retrieval_service.db") as mock_db:
+            mock_db.session = session
+            result = RetrievalService.format_retrieval_documents(documents)
+
+        assert session.queried_models == [DatasetDocument, ChildChunk, DocumentSegment, DocumentSegment]
+        assert [record.segment.id for record in result[:10]] == [f"segment-{i}" for i in reversed(range(10))]
+        parent_record = result[10]
+        assert parent_record.segment is parent_segment
+        assert [chunk.id for chunk in parent_record.child_chunks] == ["cc-0", "cc-1", "cc-2"]
+        assert parent_record.score == 0.7
+
+    def test_segments_of_other_datasets_ignored(self):
+        paragraph_document = MagicMock(id="doc-p", doc_form=IndexType.PARAGRAPH_INDEX, dataset_id="dataset-1")
+        other_dataset_segment = DocumentSegment(id="segment-1", dataset_id="dataset-2", index_node_id="node-1")
+        session = _FakeSession([paragraph_document], [], [[other_dataset_segment]])
+
+        with patch("core.rag.datasource.retrieval_service.db") as mock_db:
+            mock_db.session = session
+            result = RetrievalService.format_retrieval_documents([_document("node-1", "doc-p", 0.9)])
+
+        assert result == []
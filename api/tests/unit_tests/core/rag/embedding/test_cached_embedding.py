@@ -0,0 +1,100 @@
+import pickle
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from core.model_runtime.entities.model_entities import ModelPropertyKey
+from core.rag.embedding import cached_embedding
+from core.rag.embedding.cached_embedding import CacheEmbedding
+from libs import helper
+from models.dataset import Embedding
+
+
+@pytest.fixture(autouse=True)
+def _clear_local_cache():
+    cached_embedding._document_embedding_cache.clear()
+    yield
+    cached_embedding._document_embedding_cache.clear()
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("core.rag.embedding.cached_embedding.redis_client") as mock_redis:
+        mock_redis.mget.side_effect = lambda keys: [None] * len(keys)
+        yield mock_redis
+
+
+@pytest.fixture
+def mock_db():
+    with patch("core.rag.embedding.cached_embedding.db") as mock_db:
+        mock_db.session.execute.return_value.all.return_value = []
+        yield mock_db
+
+
+def _model_instance(max_chunks: int = 2) -> MagicMock:
+    model_instance = MagicMock()
+    model_instance.provider = "openai"
+    model_instance.model = "text-embedding-3-small"
+    model_instance.load_balancing_manager = None
+    model_instance.model_type_instance.get_model_schema.return_value.model_properties = {
+        ModelPropertyKey.MAX_CHUNKS: max_chunks
+    }
+    model_instance.invoke_text_embedding.side_effect = lambda texts, **kwargs: MagicMock(
+        embeddings=[[float(len(text)), 0.0] for text in texts]
+    )
+    return model_instance
+
+
+class TestEmbeddingBlob:
+    def test_float32_round_trip(self):
+        blob = Embedding.encode_embedding([0.6, 0.8])
+
+        assert blob.startswith(Embedding.FLOAT32_HEADER)
+        assert len(blob) == len(Embedding.FLOAT32_HEADER) + 2 * 4
+        assert np.allclose(Embedding.decode_embedding(blob), [0.6, 0.8])
+
+    def test_legacy_pickled_rows_still_readable(self):
+        embedding = Embedding(embedding=pickle.dumps([0.6, 0.8], protocol=pickle.HIGHEST_PROTOCOL))
+
+        assert embedding.get_embedding() == [0.6, 0.8]
+
+
+class TestCacheEmbeddingDocuments:
+    def test_lookup_is_batched_and_new_vectors_bulk_inserted(self, mock_redis, mock_db):
+        texts = ["a", "bb", "ccc"]
+        cached_hash = helper.generate_text_hash("bb")
+        mock_db.session.execute.return_value.all.return_value = [(cached_hash, Embedding.encode_embedding([0.0, 1.0]))]
+        model_instance = _model_instance()
+
+        result = CacheEmbedding(model_instance).embed_documents(texts)
+
+        assert np.allclose(result, [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]])
+        model_instance.invoke_text_embedding.assert_called_once()
+        assert model_instance.invoke_text_embedding.call_args.kwargs["texts"] == ["a", "ccc"]
+        # one SELECT for all hashes and one INSERT ... ON CONFLICT DO NOTHING for the new vectors
+        statements = [call.args[0] for call in mock_db.session.execute.call_args_list]
+        assert len(statements) == 2
+        insert_sql = str(statements[1].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (model_name, hash, provider_name) DO NOTHING" in insert_sql
+        mock_db.session.commit.assert_called_once()
+
+    def test_redis_and_local_cache_skip_the_database(self, mock_redis, mock_db):
+        mock_redis.mget.side_effect = lambda keys: [Embedding.encode_embedding([1.0, 0.0])] * len(keys)
+        model_instance = _model_instance()
+
+        first = CacheEmbedding(model_instance).embed_documents(["a"])
+        mock_redis.mget.reset_mock()
+        second = CacheEmbedding(model_instance).embed_documents(["a"])
+
+        assert first == second == [[1.0, 0.0]]
+        mock_db.session.execute.assert_not_called()
+        mock_redis.mget.assert_not_called()
+        model_instance.invoke_text_embedding.assert_not_called()
+
+    def test_duplicate_texts_stored_once(self, mock_redis, mock_db):
+        CacheEmbedding(_model_instance()).embed_documents(["a", "a"])
+
+        insert_stmt = mock_db.session.execute.call_args_list[-1].args[0]
+        assert len(insert_stmt.compile(dialect=postgresql.dialect()).params) == 4
@@ -0,0 +1,108 @@
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.model_runtime.errors.invoke import InvokeRateLimitError
+from core.rag.embedding import embedding_pipeline
+from core.rag.embedding.embedding_pipeline import AdaptiveConcurrencyLimiter, EmbeddingBatchPipeline, get_limiter
+
+
+@pytest.fixture(autouse=True)
+def _clear_limiters():
+    embedding_pipeline._limiters.clear()
+    with patch("core.rag.embedding.embedding_pipeline.time.sleep"):
+        yield
+    embedding_pipeline._limiters.clear()
+
+
+def _model_instance(config_count: int | None = None) -> MagicMock:
+    model_instance = MagicMock()
+    model_instance.provider = "openai"
+    model_instance.model = "text-embedding-3-small"
+    model_instance.provider_model_bundle.configuration.tenant_id = "tenant-1"
+    if config_count is None:
+        model_instance.load_balancing_manager = None
+    else:
+        model_instance.load_balancing_manager.config_count = config_count
+    return model_instance
+
+
+class TestAdaptiveConcurrencyLimiter:
+    def test_rate_limit_halves_and_successes_grow_back(self):
+        limiter = AdaptiveConcurrencyLimiter(max_limit=8)
+
+        limiter.acquire()
+        limiter.release(rate_limited=True)
+        assert limiter.limit == 4
+
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        assert limiter.limit == 5
+
+    def test_limit_never_below_one(self):
+        limiter = AdaptiveConcurrencyLimiter(max_limit=1)
+
+        limiter.acquire()
+        limiter.release(rate_limited=True)
+
+        assert limiter.limit == 1
+
+
+class TestGetLimiter:
+    def test_scaled_by_load_balancing_configs_and_shared(self):
+        with patch.object(embedding_pipeline.dify_config, "EMBEDDING_MAX_CONCURRENT_BATCHES", 4):
+            limiter = get_limiter(_model_instance(config_count=3))
+
+            assert limiter.max_limit == 12
+            assert get_limiter(_model_instance(config_count=3)) is limiter
+
+
+class TestEmbeddingBatchPipeline:
+    def test_results_in_batch_order_with_batches_in_flight(self):
+        in_flight = 0
+        max_in_flight = 0
+        lock = threading.Lock()
+
+        def invoke(texts, **kwargs):
+            nonlocal in_flight, max_in_flight
+            with lock:
+                in_flight += 1
+                max_in_flight = max(max_in_flight, in_flight)
+            # time.sleep is patched out, wait on an event to keep the batch in flight
+            threading.Event().wait(0.01 * (3 - int(texts[0]) % 3))
+            with lock:
+                in_flight -= 1
+            return MagicMock(embeddings=[[float(text)] for text in texts])
+
+        model_instance = _model_instance()
+        model_instance.invoke_text_embedding.side_effect = invoke
+        batches = [[str(i)] for i in range(12)]
+
+        with patch.object(embedding_pipeline.dify_config, "EMBEDDING_MAX_CONCURRENT_BATCHES", 4):
+            results = EmbeddingBatchPipeline(model_instance, dataset_id="dataset-1").run(batches)
+
+        assert [result.embeddings[0][0] for result in results] == [float(i) for i in range(12)]
+        assert 1 < max_in_flight <= 4
+
+    def test_rate_limited_batch_retried_and_limit_reduced(self):
+        model_instance = _model_instance()
+        model_instance.invoke_text_embedding.side_effect = [InvokeRateLimitError("429"), MagicMock(embeddings=[[1.0]])]
+
+        with patch.object(embedding_pipeline.dify_config, "EMBEDDING_MAX_CONCURRENT_BATCHES", 4):
+            results = EmbeddingBatchPipeline(model_instance).run([["a"]])
+
+            assert results[0].embeddings == [[1.0]]
+            assert get_limiter(model_instance).limit == 2
+        embedding_pipeline.time.sleep.assert_called_once()
+
+    def test_rate_limit_raised_after_max_retries(self):
+        model_instance = _model_instance()
+        model_instance.invoke_text_embedding.side_effect = InvokeRateLimitError("429")
+
+        with patch.object(embedding_pipeline.dify_config, "EMBEDDING_RATE_LIMIT_MAX_RETRIES", 2):
+            with pytest.raises(InvokeRateLimitError):
+                EmbeddingBatchPipeline(model_instance).run([["a"]])
+
+        assert model_instance.invoke_text_embedding.call_count == 3
@@ -0,0 +1,122 @@
+import math
+import random
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.rag.models.document import Document
+from core.rag.rerank import keyword_scorer
+from core.rag.rerank.keyword_scorer import get_documents_keywords, tfidf_cosine_scores
+
+
+def _legacy_scores(query_keywords, documents_keywords) -> list[float]:
+    """The previous pure-Python scoring kept here to check parity and compare latency"""
+    query_keyword_counts = Counter(query_keywords)
+    total_documents = len(documents_keywords)
+    all_keywords = set()
+    for document_keywords in documents_keywords:
+        all_keywords.update(document_keywords)
+
+    keyword_idf = {}
+    for keyword in all_keywords:
+        doc_count_containing_keyword = sum(1 for doc_keywords in documents_keywords if keyword in doc_keywords)
+        keyword_idf[keyword] = math.log((1 + total_documents) / (1 + doc_count_containing_keyword)) + 1
+
+    query_tfidf = {keyword: count * keyword_idf.get(keyword, 0) for keyword, count in query_keyword_counts.items()}
+    similarities = []
+    for document_keywords in documents_keywords:
+        document_tfidf = {
+            keyword: count * keyword_idf.get(keyword, 0) for keyword, count in Counter(document_keywords).items()
+        }
+        numerator = sum(query_tfidf[x] * document_tfidf[x] for x in set(query_tfidf) & set(document_tfidf))
+        denominator = math.sqrt(sum(v**2 for v in query_tfidf.values())) * math.sqrt(
+            sum(v**2 for v in document_tfidf.values())
+        )
+        similarities.append(float(numerator) / denominator if denominator else 0.0)
+    return similarities
+
+
+def _random_keywords(count: int, vocabulary_size: int = 1_000, keywords_per_document: int = 10):
+    rng = random.Random(count)  # noqa: S311
+    vocabulary = [f"keyword{i}" for i in range(vocabulary_size)]
+    return [rng.sample(vocabulary, keywords_per_document) for _ in range(count)]
+
+
+@pytest.fixture(autouse=True)
+def _clear_keywords_cache():
+    keyword_scorer._keywords_cache.clear()
+    yield
+    keyword_scorer._keywords_cache.clear()
+
+
+class TestTfidfCosineScores:
+    def test_matches_legacy_scores(self):
+        query_keywords = ["apple", "banana", "missing"]
+        documents_keywords = [["apple", "apple", "pear"], ["banana", "kiwi"], ["kiwi"], [], ["apple", "banana"]]
+
+        scores = tfidf_cosine_scores(query_keywords, documents_keywords)
+
+        assert scores == pytest.approx(_legacy_scores(query_keywords, documents_keywords))
+        assert scores[2] == scores[3] == 0.0
+
+    def test_query_without_known_keywords(self):
+        assert tfidf_cosine_scores(["missing"], [["apple"], ["banana"]]) == [0.0, 0.0]
+
+    def test_empty_documents(self):
+        assert tfidf_cosine_scores(["apple"], []) == []
+        assert tfidf_cosine_scores(["apple"], [[], []]) == [0.0, 0.0]
+
+    def test_matches_legacy_scores_of_many_documents(self):
+        documents_keywords = _random_keywords(1_000)
+        query_keywords = documents_keywords[0][:3] + ["missing"]
+
+        scores = tfidf_cosine_scores(query_keywords, documents_keywords)
+
+        assert scores == pytest.approx(_legacy_scores(query_keywords, documents_keywords))
+
+    @pytest.mark.benchmark(group="tfidf_cosine_scores")
+    @pytest.mark.parametrize("document_count", [100, 1_000, 10_000])
+    @pytest.mark.parametrize("implementation", ["legacy", "vectorized"])
+    def test_benchmark(self, benchmark, document_count, implementation):
+        documents_keywords = _random_keywords(document_count)
+        query_keywords = documents_keywords[0][:3] + ["missing"]
+        score = _legacy_scores if implementation == "legacy" else tfidf_cosine_scores
+
+        scores = benchmark(score, query_keywords, documents_keywords)
+
+        assert len(scores) == document_count
+
+
+class TestGetDocumentsKeywords:
+    def test_stored_segment_keywords_reused(self):
+        documents = [
+            Document(page_content="first", metadata={"doc_id": "node-1", "dataset_id": "dataset-1"}),
+            Document(page_content="second", metadata={"doc_id": "node-2", "dataset_id": "dataset-1"}),
+        ]
+        handler = MagicMock()
+        handler.extract_keywords.return_value = {"extracted"}
+        with (
+            patch("core.rag.rerank.keyword_scorer.db") as mock_db,
+            patch("core.rag.rerank.keyword_scorer.JiebaKeywordTableHandler", return_value=handler),
+        ):
+            mock_db.session.execute.return_value.all.return_value = [("dataset-1", "node-1", ["stored"])]
+
+            assert get_documents_keywords(documents) == [["stored"], ["extracted"]]
+            # extracted keywords are cached by text hash for the next query
+            assert get_documents_keywords(documents) == [["stored"], ["extracted"]]
+
+        assert mock_db.session.execute.call_count == 2
+        handler.extract_keywords.assert_called_once_with("second", None)
+
+    def test_database_failure_falls_back_to_extraction(self):
+        documents = [Document(page_content="first", metadata={"doc_id": "node-1", "dataset_id": "dataset-1"})]
+        handler = MagicMock()
+        handler.extract_keywords.return_value = {"extracted"}
+        with (
+            patch("core.rag.rerank.keyword_scorer.db") as mock_db,
+            patch("core.rag.rerank.keyword_scorer.JiebaKeywordTableHandler", return_value=handler),
+        ):
+            mock_db.session.execute.side_effect = Exception("database unavailable")
+
+            assert get_documents_keywords(documents) == [["extracted"]]
@@ -0,0 +1,59 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from core.workflow.graph_engine.event_channel import TaskEventChannel
+
+
+def _produce(channel: TaskEventChannel, name: str, count: int, start: threading.Event):
+    start.wait()
+    for i in range(count):
+        channel.put(f"{name}-{i}")
+
+
+class TestTaskEventChannel:
+    def test_ends_when_all_tasks_finished(self):
+        channel = TaskEventChannel()
+        start = threading.Event()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for name in ("a", "b"):
+                channel.track(executor.submit(_produce, channel, name, 3, start))
+            start.set()
+
+            events = list(channel)
+
+        assert sorted(events) == ["a-0", "a-1", "a-2", "b-0", "b-1", "b-2"]
+        # events of one task keep their order
+        assert [e for e in events if e.startswith("a")] == ["a-0", "a-1", "a-2"]
+
+    def test_task_exception_is_raised_after_its_events(self):
+        channel = TaskEventChannel()
+
+        def fail():
+            channel.put("before failure")
+            raise RuntimeError("boom")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            channel.track(executor.submit(fail))
+            iterator = iter(channel)
+
+            assert next(iterator) == "before failure"
+            with pytest.raises(RuntimeError, match="boom"):
+                next(iterator)
+
+    def test_close_stops_after_buffered_events(self):
+        channel = TaskEventChannel()
+        release = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(release.wait)
+            channel.track(future)
+            channel.put("first")
+            channel.close()
+            channel.put("after close")
+
+            assert list(channel) == ["first"]
+            release.set()
+
+    def test_no_tasks(self):
+        assert list(TaskEventChannel()) == []
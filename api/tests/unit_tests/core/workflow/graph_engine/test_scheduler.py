@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from core.workflow.graph_engine.scheduler import (
+    WorkflowSchedulerSaturatedError,
+    WorkflowTaskGroup,
+    WorkflowTaskScheduler,
+)
+
+
+def _group(scheduler: WorkflowTaskScheduler, tenant_id: str = "tenant", max_workers: int = 10) -> WorkflowTaskGroup:
+    return WorkflowTaskGroup(tenant_id=tenant_id, max_workers=max_workers, max_submit_count=100, scheduler=scheduler)
+
+
+class TestWorkflowTaskScheduler:
+    def test_runs_tasks_and_returns_results(self):
+        scheduler = WorkflowTaskScheduler(max_workers=4, max_queued_tasks=100)
+        group = _group(scheduler)
+
+        futures = [group.submit(lambda x: x * 2, i) for i in range(20)]
+
+        assert [future.result(timeout=5) for future in futures] == [i * 2 for i in range(20)]
+
+    def test_exception_is_set_on_future(self):
+        scheduler = WorkflowTaskScheduler(max_workers=1, max_queued_tasks=10)
+
+        def fail():
+            raise RuntimeError("boom")
+
+        future = _group(scheduler).submit(fail)
+
+        with pytest.raises(RuntimeError, match="boom"):
+            future.result(timeout=5)
+
+    def test_group_concurrency_is_bounded(self):
+        scheduler = WorkflowTaskScheduler(max_workers=8, max_queued_tasks=100)
+        group = _group(scheduler, max_workers=2)
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def task():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            threading.Event().wait(0.02)
+            with lock:
+                running -= 1
+
+        futures = [group.submit(task) for _ in range(10)]
+        for future in futures:
+            future.result(timeout=5)
+
+        assert peak == 2
+
+    def test_tenants_are_dispatched_round_robin(self):
+        scheduler = WorkflowTaskScheduler(max_workers=1, max_queued_tasks=100)
+        release = threading.Event()
+        order = []
+        blocker = _group(scheduler, tenant_id="blocker").submit(release.wait)
+        busy_group = _group(scheduler, tenant_id="busy")
+        quiet_group = _group(scheduler, tenant_id="quiet")
+
+        futures = [busy_group.submit(order.append, f"busy-{i}") for i in range(3)]
+        futures.append(quiet_group.submit(order.append, "quiet-0"))
+        release.set()
+        for future in [blocker, *futures]:
+            future.result(timeout=5)
+
+        assert order == ["busy-0", "quiet-0", "busy-1", "busy-2"]
+
+    def test_rejects_when_saturated(self):
+        scheduler = WorkflowTaskScheduler(max_workers=1, max_queued_tasks=1)
+        release = threading.Event()
+        group = _group(scheduler)
+        running = group.submit(release.wait)
+        while scheduler.stats()["running"] != 1:
+            threading.Event().wait(0.01)
+        queued = group.submit(lambda: None)
+
+        with pytest.raises(WorkflowSchedulerSaturatedError):
+            group.submit(lambda: None)
+
+        stats = scheduler.stats()
+        assert stats["queued"] == 1
+        assert stats["queued_by_tenant"] == {"tenant": 1}
+        assert stats["rejected"] == 1
+        # a rejected task does not count against the run's max submit count
+        assert group.submit_count == 2
+        release.set()
+        running.result(timeout=5)
+        queued.result(timeout=5)
+
+    def test_max_submit_count(self):
+        scheduler = WorkflowTaskScheduler(max_workers=1, max_queued_tasks=10)
+        group = WorkflowTaskGroup(tenant_id="tenant", max_workers=1, max_submit_count=1, scheduler=scheduler)
+        release = threading.Event()
+        future = group.submit(release.wait)
+        future.add_done_callback(group.task_done_callback)
+
+        with pytest.raises(ValueError, match="Max submit count 1 of workflow thread pool reached."):
+            group.submit(lambda: None)
+        release.set()
+        future.result(timeout=5)
+
+    def test_nested_tasks_run_inline_when_all_workers_are_busy(self):
+        scheduler = WorkflowTaskScheduler(max_workers=1, max_queued_tasks=10)
+        group = _group(scheduler)
+
+        def parent():
+            # with a single worker a queued child would never run while the parent waits for it
+            child = group.submit(threading.get_ident)
+            return child.result(timeout=5) == threading.get_ident()
+
+        assert group.submit(parent).result(timeout=5) is True
+
+    def test_nested_tasks_run_concurrently_when_workers_are_available(self):
+        scheduler = WorkflowTaskScheduler(max_workers=3, max_queued_tasks=10)
+        group = _group(scheduler)
+        # both children must be running at the same time to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def child():
+            barrier.wait()
+            return threading.get_ident()
+
+        def parent():
+            children = [group.submit(child), group.submit(child)]
+            return threading.get_ident(), {future.result(timeout=5) for future in children}
+
+        parent_thread_id, child_thread_ids = group.submit(parent).result(timeout=5)
+
+        # the children ran on two other workers instead of inline on the parent's thread
+        assert len(child_thread_ids) == 2
+        assert parent_thread_id not in child_thread_ids
@@ -1,3 +1,5 @@
+import copy
+import tracemalloc
 import uuid
 from collections import defaultdict
 
@@ -436,3 +438,84 @@ class TestVariablePoolSerialization:
         loaded = VariablePool.model_validate(pool_dict)
         assert isinstance(loaded.variable_dictionary, defaultdict)
         loaded.add(["non_exist_node", "a"], 1)
+
+
+class TestVariablePoolFork:
+    def test_writes_are_isolated_in_both_directions(self, pool):
+        pool.add(("node_1", "a"), "parent")
+        pool.add(("node_2", "b"), "parent")
+
+        forked = pool.fork()
+        forked.add(("node_1", "a"), "child")
+        forked.add(("node_3", "c"), "child")
+        pool.add(("node_2", "b"), "parent updated")
+
+        assert pool.get(("node_1", "a")).value == "parent"
+        assert pool.get(("node_3", "c")) is None
+        assert forked.get(("node_1", "a")).value == "child"
+        assert forked.get(("node_2", "b")).value == "parent"
+        assert forked.get((SYSTEM_VARIABLE_NODE_ID, "user_id")).value == "test_user_id"
+
+    def test_remove_does_not_affect_other_pool(self, pool):
+        pool.add(("node_1", "a"), "value")
+        pool.add(("node_1", "b"), "value")
+
+        forked = pool.fork()
+        forked.remove(("node_1", "a"))
+        pool.remove(("node_1",))
+
+        assert forked.get(("node_1", "a")) is None
+        assert forked.get(("node_1", "b")).value == "value"
+        assert pool.get(("node_1", "b")) is None
+
+    def test_forks_of_forks(self, pool):
+        pool.add(("node_1", "a"), "root")
+        first = pool.fork()
+        second = first.fork()
+
+        second.add(("node_1", "a"), "second")
+        first.add(("node_1", "a"), "first")
+
+        assert [p.get(("node_1", "a")).value for p in (pool, first, second)] == ["root", "first", "second"]
+
+    def test_serialization_matches_deepcopy(self, pool):
+        pool.add(("node_1", "a"), {"key": [1, 2, 3]})
+
+        assert pool.fork().model_dump() == copy.deepcopy(pool).model_dump()
+
+    @pytest.mark.benchmark(group="variable_pool_copy")
+    @pytest.mark.parametrize(
+        ("implementation", "item_count"),
+        # deep copying 10k items takes tens of seconds, it is only measured up to 1k
+        [("deepcopy", 100), ("deepcopy", 1_000), ("fork", 100), ("fork", 1_000), ("fork", 10_000)],
+    )
+    def test_fork_benchmark(self, benchmark, pool, implementation, item_count):
+        # an upstream context of documents and LLM outputs shared by every iteration item
+        for node_index in range(10):
+            for variable_index in range(10):
+                pool.add(
+                    (f"node_{node_index}", f"var_{variable_index}"),
+                    {"text": "lorem ipsum " * 100, "metadata": {"index": variable_index, "tags": ["a", "b", "c"]}},
+                )
+        copy_pool = pool.fork if implementation == "fork" else lambda: copy.deepcopy(pool)
+
+        def run(count: int) -> list[VariablePool]:
+            copies = []
+            for index in range(count):
+                copied = copy_pool()
+                copied.add(("iteration", "index"), index)
+                copies.append(copied)
+            return copies
+
+        copies = benchmark.pedantic(run, args=(item_count,), rounds=3)
+
+        # memory is traced on a sample, tracing every allocation of the full run is too slow
+        sample_count = min(item_count, 100)
+        tracemalloc.start()
+        sample = run(sample_count)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        benchmark.extra_info["retained_kib_per_item"] = round(retained / len(sample) / 1024, 1)
+
+        assert len(copies) == item_count
+        assert pool.get(("iteration", "index")) is None
@@ -0,0 +1,76 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects import postgresql
+
+from services.app_generate_service_extend import AppGenerateServiceExtend
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("services.app_generate_service_extend.redis_client") as mock_redis:
+        mock_redis.lock.return_value.acquire.return_value = True
+        yield mock_redis
+
+
+@pytest.fixture
+def mock_db():
+    with patch("services.app_generate_service_extend.db") as mock_db:
+        yield mock_db
+
+
+class TestAppUsageCounter:
+    def test_new_conversation_increments_counter_without_db(self, mock_redis, mock_db):
+        AppGenerateServiceExtend.calculate_cumulative_usage(MagicMock(id="app-1"), {"conversation_id": ""})
+
+        mock_redis.hincrby.assert_called_once_with(AppGenerateServiceExtend.USAGE_KEY, "app-1", 1)
+        mock_db.session.commit.assert_not_called()
+
+    def test_existing_conversation_not_counted(self, mock_redis):
+        AppGenerateServiceExtend.calculate_cumulative_usage(MagicMock(id="app-1"), {"conversation_id": "conv-1"})
+
+        mock_redis.hincrby.assert_not_called()
+
+    def test_flush_upserts_counts_in_one_statement(self, mock_redis, mock_db):
+        mock_redis.exists.return_value = False
+        mock_redis.hgetall.return_value = {b"app-1": b"3", b"app-2": b"1", b"app-3": b"0"}
+
+        assert AppGenerateServiceExtend.flush_cumulative_usage() == 2
+
+        mock_redis.rename.assert_called_once_with(
+            AppGenerateServiceExtend.USAGE_KEY, AppGenerateServiceExtend.USAGE_FLUSHING_KEY
+        )
+        mock_db.session.execute.assert_called_once()
+        sql = str(mock_db.session.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+        assert "ON CONFLICT (app_id) DO UPDATE" in sql
+        mock_db.session.commit.assert_called_once()
+        mock_redis.delete.assert_called_once_with(AppGenerateServiceExtend.USAGE_FLUSHING_KEY)
+
+    def test_flush_resumes_leftover_batch_before_renaming(self, mock_redis, mock_db):
+        mock_redis.exists.return_value = True
+        mock_redis.hgetall.return_value = {b"app-1": b"2"}
+
+        assert AppGenerateServiceExtend.flush_cumulative_usage() == 1
+
+        mock_redis.rename.assert_not_called()
+
+    def test_flush_without_new_counts(self, mock_redis, mock_db):
+        mock_redis.exists.return_value = False
+        mock_redis.rename.side_effect = ResponseError("no such key")
+
+        assert AppGenerateServiceExtend.flush_cumulative_usage() == 0
+
+        mock_db.session.execute.assert_not_called()
+
+    def test_flush_keeps_batch_when_db_fails(self, mock_redis, mock_db):
+        mock_redis.exists.return_value = False
+        mock_redis.hgetall.return_value = {b"app-1": b"2"}
+        mock_db.session.commit.side_effect = RuntimeError("db down")
+
+        with pytest.raises(RuntimeError):
+            AppGenerateServiceExtend.flush_cumulative_usage()
+
+        mock_db.session.rollback.assert_called_once()
+        mock_redis.delete.assert_not_called()
+        mock_redis.lock.return_value.release.assert_called_once()
@@ -0,0 +1,112 @@
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from models.enums import CreatorUserRole
+from services.billing_ledger_service_extend import BillingLedgerServiceExtend, BillingUsageEntry, fold_usage
+
+
+def _entry(payer_id: str, price: str, record_id: str | None = None, role=CreatorUserRole.ACCOUNT):
+    return BillingUsageEntry(payer_id=payer_id, payer_role=role, record_id=record_id, price=Decimal(price))
+
+
+class TestBillingLedgerServiceExtend:
+    def test_stream_fields_round_trip(self):
+        entry = _entry("end-user-1", "0.0012345", record_id="message-1", role=CreatorUserRole.END_USER)
+
+        fields = {k.encode(): v.encode() for k, v in entry.to_stream_fields().items()}
+
+        assert BillingUsageEntry.from_stream_fields(fields) == entry
+
+    def test_stream_fields_without_record_id(self):
+        entry = _entry("account-1", "1")
+
+        fields = {k.encode(): v.encode() for k, v in entry.to_stream_fields().items()}
+
+        assert BillingUsageEntry.from_stream_fields(fields).record_id is None
+
+    def test_fold_usage_groups_by_resolved_payer_and_app_token(self):
+        entries = [
+            _entry("account-1", "0.1", record_id="message-1"),
+            _entry("end-user-1", "0.2", record_id="message-2", role=CreatorUserRole.END_USER),
+            _entry("end-user-2", "0.3", role=CreatorUserRole.END_USER),
+            _entry("account-1", "0.4", record_id="message-3"),
+        ]
+        payers = {"account-1": "account-1", "end-user-1": "account-1", "end-user-2": "end-user-2"}
+        app_tokens = {"message-2": "token-1", "message-3": "token-1"}
+
+        account_deltas, app_token_deltas = fold_usage(entries, payers, app_tokens)
+
+        assert account_deltas == {"account-1": Decimal("0.7"), "end-user-2": Decimal("0.3")}
+        assert app_token_deltas == {"token-1": Decimal("0.6")}
+
+    def test_to_usd_converts_rmb(self):
+        with patch("services.billing_ledger_service_extend.dify_config") as mock_config:
+            mock_config.RMB_TO_USD_RATE = Decimal("7.25")
+
+            assert BillingLedgerServiceExtend.to_usd("7.25", "RMB") == Decimal(1)
+            assert BillingLedgerServiceExtend.to_usd("0.5", "USD") == Decimal("0.5")
+
+    def test_record_usage_appends_to_stream(self):
+        entry = _entry("account-1", "0.1")
+        mock_redis = MagicMock()
+
+        with (
+            patch("services.billing_ledger_service_extend.dify_config") as mock_config,
+            patch("services.billing_ledger_service_extend.redis_client", mock_redis),
+            patch.object(BillingLedgerServiceExtend, "apply_usage") as mock_apply,
+        ):
+            mock_config.BILLING_LEDGER_EXTEND_ENABLED = True
+            BillingLedgerServiceExtend.record_usage(entry)
+
+        mock_redis.xadd.assert_called_once_with(BillingLedgerServiceExtend.STREAM_KEY, entry.to_stream_fields())
+        mock_apply.assert_not_called()
+
+    def test_record_usage_applies_synchronously_when_disabled(self):
+        entry = _entry("account-1", "0.1")
+        mock_redis = MagicMock()
+
+        with (
+            patch("services.billing_ledger_service_extend.dify_config") as mock_config,
+            patch("services.billing_ledger_service_extend.redis_client", mock_redis),
+            patch.object(BillingLedgerServiceExtend, "apply_usage") as mock_apply,
+        ):
+            mock_config.BILLING_LEDGER_EXTEND_ENABLED = False
+            BillingLedgerServiceExtend.record_usage(entry)
+
+        mock_redis.xadd.assert_not_called()
+        mock_apply.assert_called_once_with([entry])
+
+    def test_flush_acks_after_apply(self):
+        entry = _entry("account-1", "0.1")
+        fields = {k.encode(): v.encode() for k, v in entry.to_stream_fields().items()}
+        mock_redis = MagicMock()
+        mock_redis.lock.return_value.acquire.return_value = True
+        # pending 为空，新流水一批，然后读空
+        mock_redis.xreadgroup.side_effect = [
+            [],
+            [[BillingLedgerServiceExtend.STREAM_KEY.encode(), [(b"1-0", fields)]]],
+            [],
+        ]
+
+        with (
+            patch("services.billing_ledger_service_extend.redis_client", mock_redis),
+            patch.object(BillingLedgerServiceExtend, "apply_usage") as mock_apply,
+        ):
+            processed = BillingLedgerServiceExtend.flush(batch_size=10, max_batches=10)
+
+        assert processed == 1
+        mock_apply.assert_called_once_with([entry])
+        mock_redis.xack.assert_called_once_with(
+            BillingLedgerServiceExtend.STREAM_KEY, BillingLedgerServiceExtend.GROUP_NAME, b"1-0"
+        )
+        mock_redis.xdel.assert_called_once_with(BillingLedgerServiceExtend.STREAM_KEY, b"1-0")
+        mock_redis.lock.return_value.release.assert_called_once()
+
+    def test_flush_skips_when_locked(self):
+        mock_redis = MagicMock()
+        mock_redis.lock.return_value.acquire.return_value = False
+
+        with patch("services.billing_ledger_service_extend.redis_client", mock_redis):
+            assert BillingLedgerServiceExtend.flush(batch_size=10, max_batches=10) == 0
+
+        mock_redis.xreadgroup.assert_not_called()
@@ -0,0 +1,146 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.helper.model_provider_cache import ProviderCredentialsCacheType
+from models.provider import Provider, ProviderModel, TenantPreferredModelProvider
+from models.tenant_model_sync_extend import TenantModelSyncExtend
+from services import model_service_extend
+from services.model_service_extend import ModelExtendService, ModelSyncResult, ModelSyncSource
+
+MODEL_SOURCE = ModelSyncSource(
+    origin_id="origin-model",
+    provider_name="langgenius/openai/openai",
+    model_name="gpt-4o",
+    model_type="text-generation",
+    credentials={"api_key": "sk-model", "base_url": "https://api.openai.com"},
+    secret_variables=["api_key"],
+)
+PROVIDER_SOURCE = ModelSyncSource(
+    origin_id="origin-provider",
+    provider_name="langgenius/openai/openai",
+    credentials={"openai_api_key": "sk-provider"},
+    secret_variables=["openai_api_key"],
+)
+
+
+def _result(rows):
+    result = MagicMock()
+    result.tuples.return_value = rows
+    return result
+
+
+@pytest.fixture
+def mock_db():
+    with patch.object(model_service_extend, "db") as mock_db:
+        yield mock_db
+
+
+@pytest.fixture(autouse=True)
+def fake_encrypter():
+    with patch.object(model_service_extend, "encrypter") as encrypter:
+        encrypter.encrypt_token_with_public_key.side_effect = lambda public_key, token: f"{public_key}:{token}"
+        yield encrypter
+
+
+class TestModelExtendService:
+    def test_only_missing_records_are_written_in_one_transaction(self, mock_db):
+        existing_model = ProviderModel(
+            id="model-2",
+            tenant_id="tenant-2",
+            provider_name="openai",
+            model_name="gpt-4o",
+            model_type="text-generation",
+        )
+        mock_db.session.execute.side_effect = [
+            # tenant-1 已同步过供应商凭证
+            _result([("tenant-1", "origin-provider")]),
+            _result([("tenant-1", "key-1"), ("tenant-2", "key-2")]),
+        ]
+        mock_db.session.scalars.side_effect = [[], [existing_model], []]
+
+        with patch.object(model_service_extend, "ProviderCredentialsCache") as cache:
+            result = ModelExtendService.sync_models_to_tenants(
+                ["tenant-1", "tenant-2"], [MODEL_SOURCE, PROVIDER_SOURCE]
+            )
+
+        assert result == ModelSyncResult(synced=2)
+        mock_db.session.commit.assert_called_once()
+        assert json.loads(existing_model.encrypted_config) == {
+            "api_key": "key-2:sk-model",
+            "base_url": "https://api.openai.com",
+        }
+        cache.assert_called_once_with(
+            tenant_id="tenant-2", identity_id="model-2", cache_type=ProviderCredentialsCacheType.MODEL
+        )
+        cache.return_value.delete.assert_called_once()
+
+        added = [call.args[0] for call in mock_db.session.add.call_args_list]
+        assert {(type(record), record.tenant_id) for record in added} == {
+            (ProviderModel, "tenant-1"),
+            (Provider, "tenant-2"),
+            (TenantPreferredModelProvider, "tenant-2"),
+        }
+        sync_records = list(mock_db.session.add_all.call_args.args[0])
+        assert all(isinstance(record, TenantModelSyncExtend) for record in sync_records)
+        assert {(record.tenant_id, record.origin_model_id) for record in sync_records} == {
+            ("tenant-1", "origin-model"),
+            ("tenant-2", "origin-model"),
+            ("tenant-2", "origin-provider"),
+        }
+
+    def test_nothing_written_when_all_synced(self, mock_db):
+        mock_db.session.execute.return_value = _result([("tenant-1", "origin-model")])
+
+        result = ModelExtendService.sync_models_to_tenants(["tenant-1"], [MODEL_SOURCE])
+
+        assert result == ModelSyncResult(synced=1)
+        mock_db.session.commit.assert_not_called()
+
+    def test_failed_batch_is_rolled_back_and_counted(self, mock_db):
+        with (
+            patch.object(model_service_extend.dify_config, "MODEL_SYNC_EXTEND_BATCH_SIZE", 2),
+            patch.object(ModelExtendService, "_sync_batch", side_effect=[None, ValueError("boom"), None]) as sync,
+        ):
+            result = ModelExtendService.sync_models_to_tenants([f"tenant-{i}" for i in range(5)], [MODEL_SOURCE])
+
+        assert result == ModelSyncResult(synced=3, failed=2)
+        assert sync.call_count == 3
+        mock_db.session.rollback.assert_called_once()
+
+    def test_dispatch_in_chunks_and_report_progress(self, mock_db):
+        hashes: dict[str, dict[bytes, bytes]] = {}
+        redis = MagicMock()
+        redis.hset.side_effect = lambda key, mapping: hashes.setdefault(key, {}).update(
+            {k.encode(): str(v).encode() for k, v in mapping.items()}
+        )
+        redis.hgetall.side_effect = lambda key: hashes.get(key, {})
+        pipe = redis.pipeline.return_value.__enter__.return_value
+        pipe.hincrby.side_effect = lambda key, field, amount: hashes[key].update(
+            {field.encode(): str(int(hashes[key][field.encode()]) + amount).encode()}
+        )
+
+        with (
+            patch.object(model_service_extend, "redis_client", redis),
+            patch.object(model_service_extend.dify_config, "MODEL_SYNC_EXTEND_TASK_CHUNK_SIZE", 2),
+            patch("tasks.extend.sync_model_to_tenants_task_extend.sync_model_to_tenants_task_extend") as task,
+        ):
+            job_id = ModelExtendService.dispatch_sync_all_models(["tenant-1", "tenant-2", "tenant-3"])
+            assert [call.args for call in task.delay.call_args_list] == [
+                (job_id, ["tenant-1", "tenant-2"]),
+                (job_id, ["tenant-3"]),
+            ]
+            assert ModelExtendService.get_sync_progress(job_id)["status"] == "processing"
+
+            ModelExtendService.record_sync_progress(job_id, ModelSyncResult(synced=2))
+            ModelExtendService.record_sync_progress(job_id, ModelSyncResult(failed=1))
+
+            assert ModelExtendService.get_sync_progress(job_id) == {
+                "job_id": job_id,
+                "status": "completed",
+                "total": 3,
+                "synced": 2,
+                "failed": 1,
+            }
+            assert ModelExtendService.get_sync_progress("unknown") is None
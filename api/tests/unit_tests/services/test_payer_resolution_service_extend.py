@@ -0,0 +1,115 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from models.api_token_money_extend import ApiTokenMessageJoinsExtend
+from models.enums import CreatorUserRole
+from services import payer_resolution_service_extend
+from services.payer_resolution_service_extend import PayerResolutionServiceExtend
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache():
+    PayerResolutionServiceExtend.clear()
+    with patch.object(PayerResolutionServiceExtend, "_ensure_subscriber"):
+        yield
+    PayerResolutionServiceExtend.clear()
+
+
+@pytest.fixture
+def mock_db():
+    with patch("services.payer_resolution_service_extend.db") as mock_db:
+        yield mock_db
+
+
+class TestPayerResolutionServiceExtend:
+    def test_accounts_resolve_to_themselves_without_query(self, mock_db):
+        result = PayerResolutionServiceExtend.resolve_many([("account-1", CreatorUserRole.ACCOUNT)])
+
+        assert result == {"account-1": "account-1"}
+        mock_db.session.scalars.assert_not_called()
+        mock_db.session.execute.assert_not_called()
+
+    def test_end_users_resolved_in_one_batch_and_cached(self, mock_db):
+        # end-user-1 其实是登录账号ID，end-user-2 通过关联表找到账号，end-user-3 找不到
+        mock_db.session.scalars.return_value.all.return_value = ["end-user-1"]
+        mock_db.session.execute.return_value.all.return_value = [("end-user-2", "account-2")]
+        payers = [
+            ("end-user-1", CreatorUserRole.END_USER),
+            ("end-user-2", CreatorUserRole.END_USER),
+            ("end-user-3", CreatorUserRole.END_USER),
+        ]
+
+        first = PayerResolutionServiceExtend.resolve_many(payers)
+        second = PayerResolutionServiceExtend.resolve_many(payers)
+
+        expected = {"end-user-1": "end-user-1", "end-user-2": "account-2", "end-user-3": "end-user-3"}
+        assert first == expected
+        assert second == expected
+        assert mock_db.session.scalars.call_count == 1
+        assert mock_db.session.execute.call_count == 1
+
+    def test_invalidate_forces_lookup(self, mock_db):
+        mock_db.session.scalars.return_value.all.return_value = []
+        mock_db.session.execute.return_value.all.return_value = [("end-user-1", "account-1")]
+        PayerResolutionServiceExtend.resolve("end-user-1", CreatorUserRole.END_USER)
+
+        mock_db.session.execute.return_value.all.return_value = [("end-user-1", "account-2")]
+        with patch("services.payer_resolution_service_extend.redis_client") as mock_redis:
+            PayerResolutionServiceExtend.invalidate(["end-user-1"])
+
+        assert PayerResolutionServiceExtend.resolve("end-user-1", CreatorUserRole.END_USER) == "account-2"
+        mock_redis.publish.assert_called_once()
+
+    def test_app_tokens_cache_only_found_records(self, mock_db):
+        mock_db.session.execute.return_value.all.return_value = [("message-1", "token-1")]
+
+        result = PayerResolutionServiceExtend.resolve_app_tokens(["message-1", "message-2"])
+        assert result == {"message-1": "token-1"}
+
+        mock_db.session.execute.reset_mock()
+        mock_db.session.execute.return_value.all.return_value = []
+        PayerResolutionServiceExtend.resolve_app_tokens(["message-1", "message-2"])
+
+        # message-1 命中缓存，只查询 message-2
+        stmt = mock_db.session.execute.call_args[0][0]
+        assert list(stmt.compile().params.values()) == [["message-2"]]
+
+    def test_committed_app_token_joins_are_cached(self, mock_db):
+        session = MagicMock(info={})
+        join = ApiTokenMessageJoinsExtend(app_token_id="token-1", record_id="message-1", app_mode="chat")
+        with patch.object(payer_resolution_service_extend.Session, "object_session", return_value=session):
+            payer_resolution_service_extend._on_api_token_message_join_inserted(None, None, join)
+
+        # 提交前不缓存，回滚的关联不会进缓存
+        assert "message-1" not in PayerResolutionServiceExtend._app_tokens
+        payer_resolution_service_extend._invalidate_after_commit(session)
+
+        assert PayerResolutionServiceExtend.resolve_app_tokens(["message-1"]) == {"message-1": "token-1"}
+        mock_db.session.execute.assert_not_called()
+
+    def test_stats_count_hits_and_misses(self, mock_db):
+        mock_db.session.scalars.return_value.all.return_value = ["end-user-1"]
+        before = PayerResolutionServiceExtend.get_stats()
+
+        PayerResolutionServiceExtend.resolve("end-user-1", CreatorUserRole.END_USER)
+        PayerResolutionServiceExtend.resolve("end-user-1", CreatorUserRole.END_USER)
+
+        after = PayerResolutionServiceExtend.get_stats()
+        assert after["misses"] - before["misses"] == 1
+        assert after["hits"] - before["hits"] == 1
+
+    def test_listener_invalidates_on_message(self):
+        PayerResolutionServiceExtend._payers["end-user-1"] = "account-1"
+        pubsub = MagicMock()
+        pubsub.listen.return_value = iter([{"type": "message", "data": b'["end-user-1"]'}])
+
+        with (
+            patch("services.payer_resolution_service_extend.redis_client") as mock_redis,
+            patch("services.payer_resolution_service_extend.time.sleep", side_effect=StopIteration),
+        ):
+            mock_redis.pubsub.return_value = pubsub
+            with pytest.raises(StopIteration):
+                PayerResolutionServiceExtend._listen_invalidation()
+
+        assert "end-user-1" not in PayerResolutionServiceExtend._payers
@@ -0,0 +1,97 @@
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.errors.quota_extend import AccountQuotaExceededErrorExtend, ApiTokenDayQuotaExceededErrorExtend
+from services.quota_admission_service_extend import QuotaAdmissionServiceExtend, QuotaAdmissionTicket
+
+
+@pytest.fixture
+def mock_redis():
+    with patch("services.quota_admission_service_extend.redis_client") as mock_redis:
+        yield mock_redis
+
+
+@pytest.fixture
+def admit_script():
+    script = MagicMock(return_value=0)
+    with patch("services.quota_admission_service_extend._script", return_value=script):
+        yield script
+
+
+class TestQuotaAdmissionServiceExtend:
+    def test_admit_reserves_on_every_balance(self, mock_redis, admit_script):
+        ticket = QuotaAdmissionServiceExtend.admit(account_id="account-1", app_token_id="token-1")
+
+        assert admit_script.call_count == 3
+        assert ticket.reservation_keys == [
+            "quota_admission_extend:{account:account-1}:reservations",
+            "quota_admission_extend:{api_token_day:token-1}:reservations",
+            "quota_admission_extend:{api_token_month:token-1}:reservations",
+        ]
+
+    def test_check_counts_reservations_without_reserving(self, mock_redis, admit_script):
+        QuotaAdmissionServiceExtend.admit(account_id="account-1")
+        admit_args = admit_script.call_args.kwargs["args"]
+        ticket = QuotaAdmissionServiceExtend.check(account_id="account-1")
+        check_args = admit_script.call_args.kwargs["args"]
+
+        assert ticket is None
+        # 与 admit 使用相同的预占金额判断，只是不写入预占
+        assert check_args[3] == admit_args[3]
+        assert admit_args[4] == 1
+        assert check_args[4] == 0
+
+    def test_balance_loaded_from_db_when_missing(self, mock_redis, admit_script):
+        admit_script.side_effect = [-1, 0]
+        with patch.object(QuotaAdmissionServiceExtend, "_load_remaining", return_value=Decimal("1.5")) as load:
+            QuotaAdmissionServiceExtend.admit(account_id="account-1")
+
+        load.assert_called_once()
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.hset.assert_called_once()
+        assert pipe.hset.call_args.kwargs["mapping"]["remaining"] == "1.5"
+        assert admit_script.call_count == 2
+
+    def test_exceeded_raises_and_releases_earlier_reservations(self, mock_redis, admit_script):
+        # 账号余额充足，密钥日额度不足
+        admit_script.side_effect = [0, 1]
+
+        with pytest.raises(ApiTokenDayQuotaExceededErrorExtend):
+            QuotaAdmissionServiceExtend.admit(account_id="account-1", app_token_id="token-1")
+
+        pipe = mock_redis.pipeline.return_value.__enter__.return_value
+        pipe.zrem.assert_called_once()
+        assert pipe.zrem.call_args.args[0] == "quota_admission_extend:{account:account-1}:reservations"
+
+    def test_account_error_message_matches_legacy(self, mock_redis, admit_script):
+        admit_script.return_value = 1
+
+        with pytest.raises(AccountQuotaExceededErrorExtend) as exc_info:
+            QuotaAdmissionServiceExtend.check(account_id="account-1")
+
+        assert str(exc_info.value) == "余额不足，调用失败！"
+
+    def test_release_without_reservations_skips_redis(self, mock_redis):
+        QuotaAdmissionServiceExtend.release(QuotaAdmissionTicket(ticket_id="ticket-1"))
+
+        mock_redis.pipeline.assert_not_called()
+
+    def test_consume_updates_account_and_token_balances(self, mock_redis, admit_script):
+        QuotaAdmissionServiceExtend.consume({"account-1": Decimal("0.3")}, {"token-1": Decimal("0.1")})
+
+        calls = [(c.kwargs["keys"][0], c.kwargs["args"][0]) for c in admit_script.call_args_list]
+        assert calls == [
+            ("quota_admission_extend:{account:account-1}", "-0.3"),
+            ("quota_admission_extend:{api_token_day:token-1}", "-0.1"),
+            ("quota_admission_extend:{api_token_month:token-1}", "-0.1"),
+        ]
+
+    def test_load_remaining_unlimited_token(self):
+        with patch("services.quota_admission_service_extend.db") as mock_db:
+            mock_db.session.execute.return_value.first.return_value = (-1, 5, Decimal(10), Decimal(4))
+            balance_keys = QuotaAdmissionServiceExtend._balance_keys(None, "token-1")
+
+            assert QuotaAdmissionServiceExtend._load_remaining(balance_keys[0]) is None
+            assert QuotaAdmissionServiceExtend._load_remaining(balance_keys[1]) == Decimal(6)
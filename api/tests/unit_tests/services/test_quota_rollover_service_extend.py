@@ -0,0 +1,64 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.quota_rollover_service_extend import (
+    ACCOUNT_DAILY_JOB,
+    ACCOUNT_MONTHLY_JOB,
+    QuotaRolloverServiceExtend,
+)
+
+
+@pytest.fixture
+def mock_redis():
+    mock_redis = MagicMock()
+    mock_redis.lock.return_value.acquire.return_value = True
+    mock_redis.get.return_value = None
+    with patch("services.quota_rollover_service_extend.redis_client", mock_redis):
+        yield mock_redis
+
+
+class TestQuotaRolloverServiceExtend:
+    def test_period_start(self):
+        now = datetime.datetime(2024, 8, 15, 13, 45, 12)
+
+        assert QuotaRolloverServiceExtend.period_start(ACCOUNT_DAILY_JOB, now) == datetime.datetime(2024, 8, 15)
+        assert QuotaRolloverServiceExtend.period_start(ACCOUNT_MONTHLY_JOB, now) == datetime.datetime(2024, 8, 1)
+
+    def test_rollover_walks_chunks_and_saves_cursor(self, mock_redis):
+        chunks = [["id-1", "id-2"], ["id-3"], []]
+        now = datetime.datetime(2024, 8, 1, 0, 0, 5)
+
+        with (
+            patch.object(QuotaRolloverServiceExtend, "_next_chunk", side_effect=chunks) as mock_next_chunk,
+            patch.object(QuotaRolloverServiceExtend, "_rollover_chunk", side_effect=[2, 1]) as mock_rollover_chunk,
+        ):
+            snapshotted = QuotaRolloverServiceExtend.rollover(ACCOUNT_MONTHLY_JOB, now=now, chunk_size=2)
+
+        assert snapshotted == 3
+        assert [c.args[1] for c in mock_next_chunk.call_args_list] == [None, "id-2", "id-3"]
+        assert mock_rollover_chunk.call_args_list[0].args[2] == datetime.datetime(2024, 8, 1)
+        assert mock_redis.setex.call_args.args[0] == "quota_rollover_extend:account_monthly:20240801"
+        assert mock_redis.setex.call_args.args[2] == "id-3"
+        mock_redis.lock.return_value.release.assert_called_once()
+
+    def test_rollover_resumes_from_cursor(self, mock_redis):
+        mock_redis.get.return_value = b"id-2"
+
+        with (
+            patch.object(QuotaRolloverServiceExtend, "_next_chunk", return_value=[]) as mock_next_chunk,
+            patch.object(QuotaRolloverServiceExtend, "_rollover_chunk") as mock_rollover_chunk,
+        ):
+            assert QuotaRolloverServiceExtend.rollover(ACCOUNT_DAILY_JOB, chunk_size=2) == 0
+
+        assert mock_next_chunk.call_args.args[1] == "id-2"
+        mock_rollover_chunk.assert_not_called()
+
+    def test_rollover_skips_when_running(self, mock_redis):
+        mock_redis.lock.return_value.acquire.return_value = False
+
+        with patch.object(QuotaRolloverServiceExtend, "_next_chunk") as mock_next_chunk:
+            assert QuotaRolloverServiceExtend.rollover(ACCOUNT_DAILY_JOB) == 0
+
+        mock_next_chunk.assert_not_called()